@@ -0,0 +1,246 @@
+import importlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+ANALYSIS_SIZE = (320, 180)      # frames are downscaled to this before analysis
+ANALYSIS_FPS = 5.0              # at most this many frames per second are analysed
+ANALYSIS_MAX_AGE_S = 0.5        # results older than this (by capture time) aren't drawn
+
+
+# --- MODEL INTERFACE ---
+# A model is any class whose instances are callable as
+#     model(frame) -> [{"box": [x, y, w, h], "label": str, "score": float}, ...]
+# where `frame` is a BGR uint8 array of ANALYSIS_SIZE and the box is given
+# in fractions of the frame (so it can be drawn on the full-size frame).
+# It is referenced as "module:Class" (the module must be importable from
+# this folder) and constructed once per worker process with keyword
+# arguments, so heavy setup such as loading weights belongs in __init__.
+class DummyModel:
+    """
+    CPU-only stand-in for a detector: boxes the brightest regions of the
+    frame. `cost_ms` adds that much busy work per call to simulate a
+    heavier network.
+    """
+
+    def __init__(self, cost_ms=0.0, max_boxes=3):
+        self.cost_ms = float(cost_ms)
+        self.max_boxes = max_boxes
+
+    def __call__(self, frame):
+        deadline = time.perf_counter() + self.cost_ms / 1000
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 9), 0)
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        h, w = gray.shape
+        detections = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:self.max_boxes]:
+            x, y, bw, bh = cv2.boundingRect(contour)
+            detections.append({
+                "box": [x / w, y / h, bw / w, bh / h],
+                "label": "bright",
+                "score": round(min(1.0, 10 * cv2.contourArea(contour) / (w * h)), 2),
+            })
+        while time.perf_counter() < deadline:
+            pass  # burn CPU the way a real model would
+        return detections
+
+
+def load_model(spec, kwargs):
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(**kwargs)
+
+
+# --- WORKER PROCESS ---
+# Workers are plain subprocesses running this file with --worker rather than
+# a multiprocessing pool: the publisher's main.py is a top-level script, and
+# spawn-based pools (the default on Windows) would re-run it in every worker.
+# Protocol on stdin: one JSON header line {"t", "shape"} followed by the raw
+# frame bytes. On stdout: one JSON line per frame {"t", "detections", "ms"}.
+# Only the protocol may reach stdout, so before the model is loaded the
+# original stdout is kept for it and fd 1 / sys.stdout are pointed at stderr:
+# whatever the model or its libraries print ends up in the log instead.
+# Workers share the publisher's process group, so Ctrl+C reaches them too;
+# they ignore it and exit when AnalysisStage.stop() closes their stdin.
+def worker_main(spec, kwargs_json):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    model = load_model(spec, json.loads(kwargs_json))
+    stdin = sys.stdin.buffer
+    send({"ready": True})
+    while True:
+        header = stdin.readline()
+        if not header:
+            return
+        meta = json.loads(header)
+        shape = tuple(meta["shape"])
+        data = stdin.read(int(np.prod(shape)))
+        if len(data) < np.prod(shape):
+            return
+        frame = np.frombuffer(data, np.uint8).reshape(shape)
+        started = time.perf_counter()
+        try:
+            result = {"detections": model(frame)}
+        except Exception as e:
+            result = {"detections": [], "error": f"{type(e).__name__}: {e}"}
+        result.update(t=meta["t"], ms=(time.perf_counter() - started) * 1000)
+        send(result)
+
+
+class AnalysisStage:
+    """
+    Runs a model on a subsampled, downscaled copy of the stream in separate
+    worker processes, so inference never blocks capture or the FFmpeg feed.
+
+    `submit()` is called from the capture loop for every frame and never
+    waits: it drops the frame unless a worker is idle and the ANALYSIS_FPS
+    budget allows, and otherwise only downsizes it into a staging buffer.
+    A dispatcher thread ships staged frames to idle workers; reader threads
+    collect results. `overlay()` draws the newest result on the outgoing
+    frame as long as the frame it came from was captured less than
+    ANALYSIS_MAX_AGE_S ago.
+    """
+
+    def __init__(self, model_spec, model_kwargs=None, workers=1, max_fps=ANALYSIS_FPS,
+                 size=ANALYSIS_SIZE, max_age=ANALYSIS_MAX_AGE_S):
+        self.model_spec = model_spec
+        self.model_kwargs = model_kwargs or {}
+        self.worker_count = workers
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.max_age = max_age
+        width, height = size
+        self.staging = np.empty((height, width, 3), np.uint8)
+        self.staged_t = None
+        self.last_submit = 0.0
+        self.workers = []
+        self.idle = []
+        self.latest = None
+        self.submitted = 0
+        self.analysed = 0
+        self.total_ms = 0.0
+        self.error = None
+        self.cond = threading.Condition()
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self):
+        command = [sys.executable, os.path.abspath(__file__), "--worker",
+                   self.model_spec, json.dumps(self.model_kwargs)]
+        for _ in range(self.worker_count):
+            proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.workers.append(proc)
+            self.threads.append(threading.Thread(target=self._read_results, args=(proc,), daemon=True))
+        self.threads.append(threading.Thread(target=self._dispatch, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def submit(self, frame, t):
+        """Offers a captured frame (with its capture time) for analysis. Never blocks."""
+        if t - self.last_submit < self.interval:
+            return
+        with self.cond:
+            if not self.idle:
+                return  # every worker is busy: skip rather than queue up stale work
+            cv2.resize(frame, self.staging.shape[1::-1], dst=self.staging, interpolation=cv2.INTER_AREA)
+            self.staged_t = t
+            self.last_submit = t
+            self.cond.notify_all()
+
+    def _dispatch(self):
+        while not self.stopping.is_set():
+            with self.cond:
+                while not self.stopping.is_set() and (self.staged_t is None or not self.idle):
+                    self.cond.wait(0.5)
+                if self.stopping.is_set():
+                    return
+                proc = self.idle.pop()
+                header = json.dumps({"t": self.staged_t, "shape": self.staging.shape}).encode() + b"\n"
+                data = self.staging.tobytes()  # small (ANALYSIS_SIZE), so copying under the lock is cheap
+                self.staged_t = None
+                self.submitted += 1
+            try:
+                proc.stdin.write(header)
+                proc.stdin.write(data)
+                proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                pass  # worker died; its reader thread reports it
+
+    def _read_results(self, proc):
+        for line in proc.stdout:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[analysis] unexpected worker output: {line[:120]!r}", flush=True)
+                continue
+            with self.cond:
+                if "error" in result and self.error is None:
+                    self.error = result["error"]
+                    print(f"[analysis] model error: {self.error}", flush=True)
+                if "t" in result:
+                    self.analysed += 1
+                    self.total_ms += result["ms"]
+                    if self.latest is None or result["t"] > self.latest["t"]:
+                        self.latest = result
+                self.idle.append(proc)
+                self.cond.notify_all()
+        if not self.stopping.is_set():
+            print(f"[analysis] worker exited (code {proc.wait()})", flush=True)
+
+    def overlay(self, frame, now):
+        """Draws the newest result if it is fresh enough. Returns True if something was drawn."""
+        with self.cond:
+            latest = self.latest
+        if latest is None or now - latest["t"] > self.max_age:
+            return False
+        h, w = frame.shape[:2]
+        for detection in latest["detections"]:
+            x, y, bw, bh = detection["box"]
+            top_left = (int(x * w), int(y * h))
+            bottom_right = (int((x + bw) * w), int((y + bh) * h))
+            cv2.rectangle(frame, top_left, bottom_right, (0, 200, 255), 2)
+            cv2.putText(frame, f"{detection['label']} {detection['score']:.2f}",
+                        (top_left[0], max(top_left[1] - 6, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 255), 2)
+        cv2.putText(frame, f"analysis {1000 * (now - latest['t']):.0f} ms old", (20, h - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 255), 2)
+        return True
+
+    def mean_ms(self):
+        return self.total_ms / self.analysed if self.analysed else 0.0
+
+    def stop(self):
+        self.stopping.set()
+        with self.cond:
+            self.cond.notify_all()
+        for proc in self.workers:
+            try:
+                proc.stdin.close()
+            except Exception:
+                pass
+        for proc in self.workers:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        worker_main(sys.argv[2], sys.argv[3])
+    else:
+        print("Analysis worker for main.py; see analysis_bench.py for a benchmark.")
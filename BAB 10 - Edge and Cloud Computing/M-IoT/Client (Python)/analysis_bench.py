@@ -0,0 +1,108 @@
+import sys
+import time
+import cv2
+import numpy as np
+from analysis import ANALYSIS_FPS, ANALYSIS_SIZE, AnalysisStage, DummyModel
+from capture_stats import interval_stats
+from pipe_bench import RingWriter, SyntheticCapture
+
+# --- CONFIGURATION ---
+WIDTH = 1280
+HEIGHT = 720
+FPS = 30
+DURATION_S = 8.0
+COSTS_MS = [0, 50, 200, 1000]   # DummyModel busy work per analysed frame
+WORKERS = 1
+
+
+def run(mode, cost_ms, duration):
+    """
+    Capture -> (analysis) -> frame ring -> writer -> sink, like the publisher.
+    `inline` calls the model in the capture loop (the old placeholder);
+    `async` hands frames to AnalysisStage worker processes.
+    """
+    stage = None
+    model = None
+    if mode == "async":
+        stage = AnalysisStage("analysis:DummyModel", {"cost_ms": cost_ms}, workers=WORKERS).start()
+        time.sleep(1.0)  # let the workers import OpenCV before measuring
+    else:
+        model = DummyModel(cost_ms)
+        small = np.empty((ANALYSIS_SIZE[1], ANALYSIS_SIZE[0], 3), np.uint8)
+    writer = RingWriter((HEIGHT, WIDTH, 3))
+    ring = writer.ring
+
+    cap = SyntheticCapture(WIDTH, HEIGHT, FPS)
+    captured = inline_runs = 0
+    drawn = 0
+    last_inline = 0.0
+    intervals = []
+    slot = ring.acquire()
+    start = last_t = time.monotonic()
+    while time.monotonic() - start < duration:
+        ret, frame = cap.read(ring.buffers[slot])
+        now = time.monotonic()
+        intervals.append(now - last_t)
+        last_t = now
+        captured += 1
+        if stage is not None:
+            stage.submit(frame, now)
+            drawn += stage.overlay(frame, now)
+        elif now - last_inline >= 1.0 / ANALYSIS_FPS:
+            last_inline = now
+            cv2.resize(frame, ANALYSIS_SIZE, dst=small)
+            model(small)
+            inline_runs += 1
+        ring.publish(slot)
+        slot = ring.acquire()
+    wall = time.monotonic() - start
+    writer.stop()
+
+    if stage is not None:
+        stage.stop()
+        analysed, mean_ms = stage.analysed, stage.mean_ms()
+    else:
+        analysed, mean_ms = inline_runs, cost_ms
+    jitter = interval_stats(intervals[1:])[1]
+    print(f"{mode:>6} | {cost_ms:>7.0f} | {captured / wall:>7.1f} | {writer.written / wall:>7.1f} | "
+          f"{analysed / wall:>8.1f} | {mean_ms:>7.0f} | {jitter:>8.1f} | "
+          f"{100 * drawn / max(captured, 1):>6.0f}", flush=True)
+
+
+def main():
+    """
+    Shows that capture and publish FPS stay constant as inference cost
+    grows when the model runs in AnalysisStage workers, compared with
+    calling it inline in the capture loop.
+    Usage: python analysis_bench.py [--duration SECONDS] [--costs MS,MS,...] [--workers N]
+    """
+    global WORKERS
+    args = sys.argv[1:]
+    if args and args[0] in ['-h', '--help']:
+        print(main.__doc__)
+        return
+    duration, costs = DURATION_S, COSTS_MS
+    if "--duration" in args:
+        i = args.index("--duration")
+        duration = float(args[i + 1])
+        del args[i:i + 2]
+    if "--costs" in args:
+        i = args.index("--costs")
+        costs = [float(v) for v in args[i + 1].split(",")]
+        del args[i:i + 2]
+    if "--workers" in args:
+        i = args.index("--workers")
+        WORKERS = int(args[i + 1])
+        del args[i:i + 2]
+
+    print(f"{WIDTH}x{HEIGHT} @ {FPS} FPS, analysis at most {ANALYSIS_FPS:.0f} FPS on "
+          f"{ANALYSIS_SIZE[0]}x{ANALYSIS_SIZE[1]}, {WORKERS} worker(s), {duration:.0f} s per run")
+    print(f"{'mode':>6} | {'cost ms':>7} | {'capture':>7} | {'publish':>7} | {'analysed':>8} | "
+          f"{'model ms':>7} | {'p99 gap ms':>8} | {'boxed %':>6}")
+    for cost in costs:
+        for mode in ("inline", "async"):
+            run(mode, cost, duration)
+
+
+if __name__ == '__main__':
+    main()
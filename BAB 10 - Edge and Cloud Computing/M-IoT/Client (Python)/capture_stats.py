@@ -0,0 +1,9 @@
+import numpy as np
+
+
+def interval_stats(intervals):
+    """(p50, p99, max) in milliseconds of a list of capture-loop intervals in seconds."""
+    if not intervals:
+        return 0.0, 0.0, 0.0
+    ms = np.array(intervals) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99), ms.max()
@@ -0,0 +1,66 @@
+import threading
+import numpy as np
+
+
+class FrameRing:
+    """
+    A fixed pool of preallocated frame buffers handed between the capture
+    loop and the FFmpeg writer thread without copying.
+
+    The capture loop `acquire()`s a free buffer, reads into it (OpenCV's
+    `cap.read(buf)` decodes in place when the shape matches) and
+    `publish()`es it. The writer `take()`s the newest published buffer,
+    writes it to FFmpeg straight from the array's memory and `release()`s
+    it. Only one frame is ever pending: publishing while the writer is busy
+    replaces the pending frame (latest wins) and recycles the old buffer,
+    so latency stays bounded at one frame.
+
+    Three buffers are the minimum: one being filled, one pending and one
+    being written.
+    """
+
+    def __init__(self, shape, count=3, dtype=np.uint8):
+        if count < 3:
+            raise ValueError("FrameRing needs at least 3 buffers")
+        self.buffers = [np.empty(shape, dtype) for _ in range(count)]
+        self.free = list(range(count))
+        self.pending = None
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Index of a free buffer for the capture loop to fill."""
+        with self.cond:
+            return self.free.pop()
+
+    def publish(self, index):
+        """Hands a filled buffer to the writer. Returns True if an unsent frame was dropped."""
+        with self.cond:
+            dropped = self.pending is not None
+            if dropped:
+                self.free.append(self.pending)
+            self.pending = index
+            self.cond.notify()
+            return dropped
+
+    def take(self, timeout=None):
+        """Index of the newest published buffer, or None on timeout."""
+        with self.cond:
+            if self.pending is None:
+                self.cond.wait(timeout)
+            index, self.pending = self.pending, None
+            return index
+
+    def release(self, index):
+        """Returns a buffer taken by the writer to the pool."""
+        with self.cond:
+            self.free.append(index)
+
+
+def write_frame(stream, frame):
+    """
+    Writes a C-contiguous array to an unbuffered pipe from its own memory
+    (no `tobytes()` copy), looping over partial writes.
+    """
+    view = memoryview(frame.reshape(-1))
+    while view:
+        view = view[stream.write(view):]
@@ -1,13 +1,22 @@
+import collections
 import cv2
+import glob
+import os
 import subprocess
 import threading
-import queue
 import sys
 import time
 import re
+from frame_ring import FrameRing, write_frame
+from pipe_format import ENCODER_PIX_FMTS, PIPE_FORMATS, PipeFormatter
+from analysis import AnalysisStage
+from preview import PREVIEW_FPS, PREVIEW_SCALE, PreviewWindow
+from capture_stats import interval_stats
 
 # --- CONFIGURATION ---
-FFMPEG_PATH = r"C:\Users\hafid\AppData\Local\Microsoft\WinGet\Links\ffmpeg.exe"
+IS_WINDOWS = sys.platform == "win32"
+FFMPEG_PATH = (r"C:\Users\hafid\AppData\Local\Microsoft\WinGet\Links\ffmpeg.exe"
+               if IS_WINDOWS else "ffmpeg")
 
 # Replace with your VM's public IP
 SRT_URL = "srt://miot.profybandung.cloud:8890?mode=caller&latency=200000&streamid=publish:miotybhs"
@@ -16,21 +25,101 @@ HEIGHT = 720
 FPS = 30
 
 CAMERA_INDEX = 0
+# Linux only: a V4L2 node (/dev/videoN) or a video file to capture from
+# instead. None picks the first V4L2 node that can capture. A file is looped
+# in real time, so the publisher can be tested without a camera (or with a
+# v4l2loopback device fed by `ffmpeg -re -i clip.mp4 -f v4l2 /dev/video10`).
+CAMERA_DEVICE = None
+# Linux only: FFmpeg reads the camera itself (its MJPEG stream when offered)
+# instead of OpenCV decoding it and Python piping raw BGR back, so the whole
+# decode -> pipe round trip disappears. Python never sees the pixels, so
+# there is no overlay and no local preview in this mode.
+PASSTHROUGH = False
 WARMUP_TIMEOUT_S = 8.0          # max time to wait for the first frame
 NO_FRAMES_STALL_S = 5.0         # if main loop sees no frames for this long, bail
+FRAME_POOL_SIZE = 3             # preallocated frame buffers (fill / pending / write)
+# Pixel format on FFmpeg's stdin. "yuv420p" (I420) or "nv12" converts in
+# Python (OpenCV, multi-threaded) into a preallocated buffer: half the pipe
+# bandwidth of bgr24, and FFmpeg no longer runs swscale before libx264.
+PIPE_PIX_FMT = "bgr24"
+# Optional analysis model as "module:Class" (see analysis.py for the
+# interface), e.g. "analysis:DummyModel". It runs in ANALYSIS_WORKERS
+# separate processes on a subsampled, downscaled copy of the stream, so it
+# never blocks capture; its newest fresh result is drawn on outgoing frames.
+ANALYSIS_MODEL = None
+ANALYSIS_MODEL_KWARGS = {}
+ANALYSIS_WORKERS = 1
+# The local preview runs on its own thread and shows a PREVIEW_SCALE copy of
+# the stream at most PREVIEW_FPS times per second (see preview.py), so window
+# events and redraws are handled off the capture loop. HEADLESS makes no GUI calls at all, for edge
+# boxes without a display; on Linux it is switched on automatically when
+# neither DISPLAY nor WAYLAND_DISPLAY is set. Stop with Ctrl+C then.
+HEADLESS = False
 
 # Set to a specific device name (as listed by FFmpeg's -list_devices) to
 # override auto-detection. Leave as None to auto-pick the first DirectShow
 # audio device. Set to "" (empty string) to publish video only.
+# On Linux use an ALSA device ("hw:1,0") or a PulseAudio source
+# prefixed with "pulse:" ("pulse:alsa_input.usb-...").
 AUDIO_DEVICE_OVERRIDE = None
 
+# --- ADAPTIVE BITRATE ---
+# The encoder always runs CBR-constrained (bitrate == maxrate, half-second
+# VBV) so the configured bitrate actually bounds what goes onto the uplink.
+# With ABR enabled, a controller thread checks link health every
+# ABR_INTERVAL_S and moves to a new operating point when needed:
+#   - congestion: unsent frames replaced by newer ones, or FFmpeg encoding noticeably
+#     fewer frames than we hand it (SRT send blocking upstream)
+#     -> bitrate * ABR_DECREASE, stepping down the ladder below a rung's minimum
+#   - healthy for ABR_STABLE_S -> bitrate * ABR_INCREASE, stepping back up
+# FFmpeg can't change libx264's bitrate on the fly, so a change restarts the
+# encoder (a ~0.5 s SRT reconnect). Restarts are rate limited and small
+# adjustments are ignored.
+#
+# Testing against a local listener with a shaped uplink (Linux):
+#   ffmpeg -i "srt://0.0.0.0:9000?mode=listener" -f null -
+#   sudo tc qdisc add dev lo root tbf rate 1.5mbit burst 32kbit latency 400ms
+#   python main.py --url "srt://127.0.0.1:9000?mode=caller&latency=200000"
+#   sudo tc qdisc del dev lo root
+ABR_ENABLED = True              # --no-abr keeps ABR_START_KBPS fixed
+# Operating points as (width, height, fps, min_kbps, max_kbps). The pipe
+# always carries WIDTHxHEIGHT@FPS; lower rungs are scaled/decimated in FFmpeg.
+ABR_LADDER = [
+    (WIDTH, HEIGHT, FPS, 1500, 4000),
+    (960, 540, FPS, 800, 2000),
+    (640, 360, 15, 300, 1000),
+]
+ABR_START_KBPS = 2500
+ABR_INTERVAL_S = 2.0            # measurement window
+ABR_DECREASE = 0.7
+ABR_INCREASE = 1.2
+ABR_STABLE_S = 10.0             # healthy time required before stepping up
+ABR_MIN_RESTART_S = 6.0         # minimum time between encoder restarts
+ABR_MIN_CHANGE = 0.1            # ignore bitrate changes smaller than this
+ABR_MAX_DROP_RATIO = 0.05       # dropped frame ratio above this = congestion
+ABR_MIN_ENCODE_RATIO = 0.9      # encoded/expected frames below this = congestion
+# SRT sender options appended to SRT_URL when ABR is on: a send buffer of
+# roughly one second at the top rung and no sender-side too-late packet
+# drop, so a congested link backpressures FFmpeg (which we can measure)
+# instead of SRT silently discarding packets (which we can't).
+SRT_SNDBUF_BYTES = ABR_LADDER[0][4] * 1000 // 8
+
 # --- AUDIO DEVICE DETECTION ---
 # FFmpeg's dshow backend captures Windows audio. We enumerate available
 # DirectShow audio devices via `ffmpeg -list_devices true -f dshow -i dummy`
 # (which prints the device list to stderr), then pick the first one.
+# Returns (FFmpeg input format, device), or None to publish video only.
 def find_audio_device():
     if AUDIO_DEVICE_OVERRIDE is not None:
-        return AUDIO_DEVICE_OVERRIDE or None
+        if not AUDIO_DEVICE_OVERRIDE:
+            return None
+        if IS_WINDOWS:
+            return "dshow", AUDIO_DEVICE_OVERRIDE
+        if AUDIO_DEVICE_OVERRIDE.startswith("pulse:"):
+            return "pulse", AUDIO_DEVICE_OVERRIDE[len("pulse:"):]
+        return "alsa", AUDIO_DEVICE_OVERRIDE
+    if not IS_WINDOWS:
+        return find_linux_audio_device()
     try:
         result = subprocess.run(
             [FFMPEG_PATH, "-hide_banner", "-list_devices", "true",
@@ -68,7 +157,87 @@ def find_audio_device():
         return None
     print(f"[audio] available devices: {audio_devices}", flush=True)
     print(f"[audio] using: {audio_devices[0]}", flush=True)
-    return audio_devices[0]
+    return "dshow", audio_devices[0]
+
+
+# --- LINUX DEVICE DETECTION ---
+# Audio: PulseAudio/PipeWire sources from `pactl list short sources`
+# (".monitor" sources are speaker loopbacks and are skipped), falling back
+# to ALSA capture devices from `arecord -l`, addressed as hw:CARD,DEVICE.
+def find_linux_audio_device():
+    try:
+        result = subprocess.run(["pactl", "list", "short", "sources"],
+                                capture_output=True, text=True, timeout=5)
+        # Columns: index, name, module, sample spec, state
+        sources = [line.split("\t")[1] for line in result.stdout.splitlines()
+                   if line.count("\t") >= 1 and not line.split("\t")[1].endswith(".monitor")]
+    except Exception:
+        sources = []
+    if sources:
+        print(f"[audio] available PulseAudio sources: {sources}", flush=True)
+        print(f"[audio] using: pulse:{sources[0]}", flush=True)
+        return "pulse", sources[0]
+
+    try:
+        result = subprocess.run(["arecord", "-l"], capture_output=True, text=True, timeout=5)
+        # card 1: Webcam [USB Webcam], device 0: USB Audio [USB Audio]
+        cards = re.findall(r"^card (\d+):.*?, device (\d+):", result.stdout, re.MULTILINE)
+    except Exception:
+        cards = []
+    if not cards:
+        print("[audio] no PulseAudio or ALSA capture devices found", flush=True)
+        return None
+    devices = [f"hw:{card},{device}" for card, device in cards]
+    print(f"[audio] available ALSA devices: {devices}", flush=True)
+    print(f"[audio] using: {devices[0]}", flush=True)
+    return "alsa", devices[0]
+
+
+# Video: V4L2 nodes from /sys/class/video4linux. UVC webcams usually expose
+# a second, metadata-only node per camera, so each node's capture formats
+# are probed with `ffmpeg -f v4l2 -list_formats all` and empty ones skipped.
+def v4l2_formats(path):
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, "-hide_banner", "-f", "v4l2", "-list_formats", "all", "-i", path],
+            capture_output=True, text=True, timeout=10
+        )
+    except Exception:
+        return set()
+    # FFmpeg prints one line per pixel format to stderr:
+    #   [video4linux2,v4l2 @ 0x..] Compressed:       mjpeg :          Motion-JPEG : 1280x720 ...
+    #   [video4linux2,v4l2 @ 0x..] Raw       :     yuyv422 :           YUYV 4:2:2 : 640x480 ...
+    return set(re.findall(r"(?:Compressed|Raw)\s*:\s*(\S+)\s*:", result.stderr))
+
+
+def list_v4l2_devices():
+    devices = []
+    nodes = glob.glob("/sys/class/video4linux/video*")
+    for node in sorted(nodes, key=lambda n: int(re.sub(r"\D", "", os.path.basename(n)) or 0)):
+        path = "/dev/" + os.path.basename(node)
+        try:
+            with open(os.path.join(node, "name")) as f:
+                name = f.read().strip()
+        except OSError:
+            name = "?"
+        formats = v4l2_formats(path)
+        if formats:
+            devices.append((path, name, formats))
+    return devices
+
+
+def resolve_camera_device():
+    """Returns (device or file path, V4L2 formats), or (None, set()) if nothing can capture."""
+    if CAMERA_DEVICE and os.path.isfile(CAMERA_DEVICE):
+        return CAMERA_DEVICE, set()
+    if CAMERA_DEVICE:
+        return CAMERA_DEVICE, v4l2_formats(CAMERA_DEVICE)
+    devices = list_v4l2_devices()
+    if not devices:
+        return None, set()
+    for path, name, formats in devices:
+        print(f"[camera] found {path} ({name}): {', '.join(sorted(formats))}", flush=True)
+    return devices[0][0], devices[0][2]
 
 
 # --- WEBCAM OPEN HELPER ---
@@ -76,18 +245,30 @@ def find_audio_device():
 # strict about format negotiation. MSMF works on machines where DSHOW won't
 # enumerate the device. Try both, and force MJPG which essentially every
 # webcam supports natively at 720p30 (much better than the default which can
-# fall back to uncompressed YUY2 capped at 5–10 fps).
+# fall back to uncompressed YUY2 capped at 5–10 fps). On Linux the same
+# applies to V4L2; a file source goes through OpenCV's FFmpeg backend.
 def open_camera():
-    backends = [
-        ("CAP_DSHOW", cv2.CAP_DSHOW),
-        ("CAP_MSMF", cv2.CAP_MSMF),
-        ("CAP_ANY", cv2.CAP_ANY),
-    ]
+    if IS_WINDOWS:
+        source = CAMERA_INDEX
+        backends = [
+            ("CAP_DSHOW", cv2.CAP_DSHOW),
+            ("CAP_MSMF", cv2.CAP_MSMF),
+            ("CAP_ANY", cv2.CAP_ANY),
+        ]
+    elif camera_is_file:
+        source = camera_device
+        backends = [("CAP_FFMPEG", cv2.CAP_FFMPEG)]
+    else:
+        source = camera_device
+        backends = [
+            ("CAP_V4L2", cv2.CAP_V4L2),
+            ("CAP_ANY", cv2.CAP_ANY),
+        ]
     for name, backend in backends:
         print(f"[camera] trying {name}...", flush=True)
-        cap = cv2.VideoCapture(CAMERA_INDEX, backend)
+        cap = cv2.VideoCapture(source, backend)
         if not cap.isOpened():
-            print(f"[camera] {name} could not open device {CAMERA_INDEX}", flush=True)
+            print(f"[camera] {name} could not open device {source}", flush=True)
             cap.release()
             continue
 
@@ -124,8 +305,8 @@ def open_camera():
         h, w = first_frame.shape[:2]
         if (w, h) != (WIDTH, HEIGHT):
             print(f"[camera] WARNING: requested {WIDTH}x{HEIGHT} but got {w}x{h} — "
-                  f"FFmpeg expects exactly {WIDTH}x{HEIGHT} bgr24, output may break",
-                  flush=True)
+                  f"every frame will be resized into the {WIDTH}x{HEIGHT} pipe buffer "
+                  f"(extra CPU per frame)", flush=True)
 
         print(f"[camera] {name} delivered first frame OK", flush=True)
         return cap, name
@@ -133,17 +314,93 @@ def open_camera():
     return None, None
 
 
-cap, backend_name = open_camera()
-if cap is None:
-    print("[fatal] no working webcam backend — is the camera in use by another app?",
-          flush=True)
-    sys.exit(1)
+# --- COMMAND LINE ---
+# python main.py [--url SRT_URL] [--no-abr] [--device PATH] [--passthrough]
+#                [--pix-fmt bgr24|yuv420p|nv12] [--model MODULE:CLASS [--model-cost MS]]
+#                [--headless | --preview-fps N] [--list-devices]
+args = sys.argv[1:]
+if "--url" in args:
+    i = args.index("--url")
+    SRT_URL = args[i + 1]
+    del args[i:i + 2]
+if "--no-abr" in args:
+    ABR_ENABLED = False
+if "--device" in args:
+    i = args.index("--device")
+    CAMERA_DEVICE = args[i + 1]
+    del args[i:i + 2]
+if "--passthrough" in args:
+    PASSTHROUGH = True
+if "--pix-fmt" in args:
+    i = args.index("--pix-fmt")
+    PIPE_PIX_FMT = args[i + 1]
+    del args[i:i + 2]
+    if PIPE_PIX_FMT not in PIPE_FORMATS:
+        print(f"[fatal] --pix-fmt must be one of {', '.join(PIPE_FORMATS)}", flush=True)
+        sys.exit(1)
+if "--model" in args:
+    i = args.index("--model")
+    ANALYSIS_MODEL = args[i + 1]
+    del args[i:i + 2]
+if "--model-cost" in args:
+    # Simulated inference cost for analysis:DummyModel
+    i = args.index("--model-cost")
+    ANALYSIS_MODEL_KWARGS = dict(ANALYSIS_MODEL_KWARGS, cost_ms=float(args[i + 1]))
+    del args[i:i + 2]
+if "--headless" in args:
+    HEADLESS = True
+if "--preview-fps" in args:
+    i = args.index("--preview-fps")
+    PREVIEW_FPS = float(args[i + 1])
+    del args[i:i + 2]
+    if PREVIEW_FPS <= 0:
+        HEADLESS = True
+if "--list-devices" in args:
+    if IS_WINDOWS:
+        print(f'Run: "{FFMPEG_PATH}" -list_devices true -f dshow -i dummy')
+    else:
+        for path, name, formats in list_v4l2_devices():
+            print(f"{path}: {name} ({', '.join(sorted(formats))})")
+        find_linux_audio_device()
+    sys.exit(0)
+
+camera_device, camera_formats = None, set()
+if not IS_WINDOWS:
+    camera_device, camera_formats = resolve_camera_device()
+    if camera_device is None:
+        print("[fatal] no V4L2 capture device found (set CAMERA_DEVICE or --device)",
+              flush=True)
+        sys.exit(1)
+camera_is_file = camera_device is not None and os.path.isfile(camera_device)
+if (not HEADLESS and not PASSTHROUGH and sys.platform.startswith("linux")
+        and not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))):
+    print("[preview] no display found — running headless", flush=True)
+    HEADLESS = True
+
+if PASSTHROUGH:
+    if IS_WINDOWS:
+        print("[fatal] --passthrough needs the Linux V4L2 backend", flush=True)
+        sys.exit(1)
+    cap = None
+    if camera_is_file:
+        backend_name = "FFmpeg passthrough (file, real time)"
+    else:
+        input_format = "mjpeg" if "mjpeg" in camera_formats else "raw"
+        backend_name = f"FFmpeg v4l2 passthrough ({input_format})"
+else:
+    cap, backend_name = open_camera()
+    if cap is None:
+        print("[fatal] no working webcam backend — is the camera in use by another app?",
+              flush=True)
+        sys.exit(1)
 
 # --- FFMPEG ---
 # We use 'mpegts' format because SRT requires it. Two inputs are muxed into
 # one output stream:
-#   Input #0 : rawvideo on stdin (fed by Python / OpenCV)
-#   Input #1 : DirectShow microphone capture (if a device is available)
+#   Input #0 : rawvideo on stdin (fed by Python / OpenCV), or in passthrough
+#              mode the camera (or test file) read by FFmpeg directly
+#   Input #1 : microphone capture (if a device is available) — DirectShow
+#              on Windows, PulseAudio/ALSA on Linux
 # The audio track is encoded as AAC, which is what MPEG-TS/HLS expect.
 #
 # Codec tradeoff to be aware of:
@@ -153,94 +410,305 @@ if cap is None:
 #     of the SRT+AAC publishing path, not of this script.
 audio_device = find_audio_device()
 
-command = [
-    FFMPEG_PATH,
-    '-y',
-    # --- Video input: raw frames on stdin ---
-    '-f', 'rawvideo',
-    '-vcodec', 'rawvideo',
-    '-pix_fmt', 'bgr24',
-    '-s', f"{WIDTH}x{HEIGHT}",
-    '-r', str(FPS),
-    '-thread_queue_size', '1024',
-    '-i', '-',
-]
+srt_url = SRT_URL
+if ABR_ENABLED:
+    srt_url += ("&" if "?" in srt_url else "?") + f"sndbuf={SRT_SNDBUF_BYTES}&tlpktdrop=0"
+
+
+def passthrough_input():
+    if camera_is_file:
+        return ['-re', '-stream_loop', '-1', '-i', camera_device]
+    args = ['-f', 'v4l2']
+    if 'mjpeg' in camera_formats:
+        # The camera's own compressed stream: decoded once, inside FFmpeg.
+        args += ['-input_format', 'mjpeg']
+    return args + [
+        '-video_size', f"{WIDTH}x{HEIGHT}",
+        '-framerate', str(FPS),
+        '-thread_queue_size', '1024',
+        '-i', camera_device,
+    ]
+
+
+def build_command(rung, kbps):
+    width, height, fps = ABR_LADDER[rung][:3]
+    command = [
+        FFMPEG_PATH,
+        '-y',
+        # Machine-readable progress on stdout; the ABR controller counts
+        # encoded frames from it.
+        '-progress', 'pipe:1',
+    ]
+
+    if PASSTHROUGH:
+        # --- Video input: the camera, read by FFmpeg ---
+        command += passthrough_input()
+    else:
+        command += [
+            # --- Video input: raw frames on stdin ---
+            '-f', 'rawvideo',
+            '-vcodec', 'rawvideo',
+            '-pix_fmt', PIPE_PIX_FMT,
+            '-s', f"{WIDTH}x{HEIGHT}",
+            '-r', str(FPS),
+            '-thread_queue_size', '1024',
+            '-i', '-',
+        ]
+
+    # Explicitly map the video from input 0 (a test file may carry its own
+    # audio) and audio from input 1.
+    command += ['-map', '0:v']
+    if audio_device:
+        audio_format, audio_name = audio_device
+        command += [
+            # --- Audio input: DirectShow / PulseAudio / ALSA microphone ---
+            '-f', audio_format,
+            '-thread_queue_size', '1024',
+            '-i', f'audio={audio_name}' if audio_format == 'dshow' else audio_name,
+            '-map', '1:a',
+        ]
+
+    if PASSTHROUGH or (width, height, fps) != (WIDTH, HEIGHT, FPS):
+        # Lower ladder rung: drop frames first so only the kept ones get
+        # scaled. In passthrough mode this also pins whatever size/rate the
+        # camera actually negotiated to the rung.
+        command += ['-vf', f'fps={fps},scale={width}:{height}']
 
-if audio_device:
     command += [
-        # --- Audio input: DirectShow microphone ---
-        '-f', 'dshow',
-        '-thread_queue_size', '1024',
-        '-i', f'audio={audio_device}',
-        # Explicitly map the video from input 0 and audio from input 1.
-        '-map', '0:v',
-        '-map', '1:a',
+        '-c:v', 'libx264',
+        # An nv12 pipe is encoded as-is; camera passthrough input is converted to yuv420p
+        '-pix_fmt', 'yuv420p' if PASSTHROUGH else ENCODER_PIX_FMTS[PIPE_PIX_FMT],
+        '-preset', 'ultrafast',
+        '-tune', 'zerolatency',
+        # CBR with a half-second VBV: the uplink sees a bounded, steady rate
+        # instead of keyframe bursts.
+        '-b:v', f'{kbps}k',
+        '-maxrate', f'{kbps}k',
+        '-bufsize', f'{kbps // 2}k',
+        '-x264-params', 'nal-hrd=cbr',
+        '-g', str(fps * 2),
     ]
 
-command += [
-    '-c:v', 'libx264',
-    '-pix_fmt', 'yuv420p',
-    '-preset', 'ultrafast',
-    '-tune', 'zerolatency',
-    '-g', str(FPS * 2),
-]
+    if audio_device:
+        command += [
+            '-c:a', 'aac',
+            '-b:a', '128k',
+            '-ar', '48000',
+            '-ac', '2',
+        ]
 
-if audio_device:
     command += [
-        '-c:a', 'aac',
-        '-b:a', '128k',
-        '-ar', '48000',
-        '-ac', '2',
+        '-f', 'mpegts',
+        srt_url,
     ]
+    return command
+
+
+# Frames FFmpeg has encoded, summed across encoder restarts.
+encoded_frames = 0
+
+
+def read_progress(proc):
+    global encoded_frames
+    last_frame = 0
+    for raw in proc.stdout:
+        key, _, value = raw.decode(errors="replace").strip().partition("=")
+        if key == "frame" and value.isdigit():
+            frame = int(value)
+            if frame > last_frame:
+                encoded_frames += frame - last_frame
+            last_frame = frame
+
+
+def start_encoder(rung, kbps):
+    # bufsize=0: frames go from our buffers straight into the pipe, without
+    # passing through a Python-side write buffer.
+    proc = subprocess.Popen(build_command(rung, kbps), bufsize=0,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    threading.Thread(target=read_progress, args=(proc,), daemon=True).start()
+    return proc
+
+
+def stop_encoder(proc):
+    try:
+        if PASSTHROUGH:
+            # FFmpeg isn't reading frames from stdin, so EOF won't stop it;
+            # its interactive 'q' command will.
+            proc.stdin.write(b"q")
+        proc.stdin.close()
+    except Exception:
+        pass
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
 
-command += [
-    '-f', 'mpegts',
-    SRT_URL,
-]
 
 # Start FFmpeg process AFTER the camera warmup succeeds, so we don't leave
 # a dangling FFmpeg waiting on an empty pipe if camera init fails.
-process = subprocess.Popen(command, stdin=subprocess.PIPE)
+abr_rung = 0
+abr_kbps = ABR_START_KBPS
+process = start_encoder(abr_rung, abr_kbps)
 
-# Bounded queue decouples the webcam read loop from FFmpeg's stdin.
+# The frame ring decouples the webcam read loop from FFmpeg's stdin.
 # If the downstream SRT/MediaMTX pipeline backpressures (e.g. a WebRTC
 # subscriber attaches), the writer thread blocks on process.stdin.write()
 # instead of the capture loop — so the webcam keeps being serviced and
-# Windows Media Foundation doesn't time out the device.
-frame_q: "queue.Queue[bytes]" = queue.Queue(maxsize=4)
+# Windows Media Foundation doesn't time out the device. Frames are decoded
+# into preallocated buffers and written from them directly: no per-frame
+# allocation and no tobytes() copy (2.7 MB per 720p frame). Not needed in
+# passthrough mode, where no frames pass through Python.
+frame_ring = None if PASSTHROUGH else FrameRing((HEIGHT, WIDTH, 3), FRAME_POOL_SIZE)
+# Only the writer thread converts, so one output buffer is enough.
+pipe_formatter = PipeFormatter(PIPE_PIX_FMT, WIDTH, HEIGHT)
 stop_flag = threading.Event()
+# Set while the ABR controller swaps encoders, so the writer doesn't mistake
+# the old encoder's closed pipe for FFmpeg dying.
+restarting = threading.Event()
+frames_offered = 0
+frames_dropped = 0
 
 
 def writer():
     while not stop_flag.is_set():
-        try:
-            buf = frame_q.get(timeout=0.5)
-        except queue.Empty:
+        slot = frame_ring.take(timeout=0.5)
+        if slot is None:
             continue
+        proc = process
         try:
-            process.stdin.write(buf)
-        except (BrokenPipeError, OSError):
+            write_frame(proc.stdin, pipe_formatter.convert(frame_ring.buffers[slot]))
+        except (BrokenPipeError, OSError, ValueError):
+            if restarting.is_set() or proc is not process:
+                continue
             stop_flag.set()
             return
+        finally:
+            frame_ring.release(slot)
+
+
+def abr_controller():
+    global process, abr_rung, abr_kbps
+    last_restart = healthy_since = last_t = time.monotonic()
+    last_offered, last_dropped, last_encoded = frames_offered, frames_dropped, encoded_frames
+    while not stop_flag.wait(ABR_INTERVAL_S):
+        offered = frames_offered - last_offered
+        dropped = frames_dropped - last_dropped
+        encoded = encoded_frames - last_encoded
+        last_offered, last_dropped, last_encoded = frames_offered, frames_dropped, encoded_frames
+        now = time.monotonic()
+        if PASSTHROUGH:
+            # No frames pass through Python: expect the camera's nominal rate.
+            offered = round(FPS * (now - last_t))
+        last_t = now
+        if offered == 0 or now - last_restart < ABR_INTERVAL_S * 1.5:
+            # Camera stalled, or the window still covers an encoder restart.
+            continue
 
+        fps, min_kbps, max_kbps = ABR_LADDER[abr_rung][2:]
+        drop_ratio = dropped / offered
+        encode_ratio = encoded / (offered * fps / FPS)
+        rung = abr_rung
+        if drop_ratio > ABR_MAX_DROP_RATIO or encode_ratio < ABR_MIN_ENCODE_RATIO:
+            healthy_since = now
+            kbps = abr_kbps * ABR_DECREASE
+            if kbps < min_kbps and rung + 1 < len(ABR_LADDER):
+                rung += 1
+            reason = f"congestion (dropped {drop_ratio:.0%}, encoded {encode_ratio:.0%})"
+        elif now - healthy_since >= ABR_STABLE_S:
+            healthy_since = now
+            kbps = abr_kbps * ABR_INCREASE
+            if kbps > max_kbps and rung > 0:
+                rung -= 1
+            reason = f"link healthy for {ABR_STABLE_S:.0f}s"
+        else:
+            continue
 
-writer_thread = threading.Thread(target=writer, daemon=True)
-writer_thread.start()
+        min_kbps, max_kbps = ABR_LADDER[rung][3:]
+        kbps = int(min(max(kbps, min_kbps), max_kbps))
+        if rung == abr_rung and abs(kbps - abr_kbps) < ABR_MIN_CHANGE * abr_kbps:
+            continue  # already at the edge of the ladder, or too small to be worth a restart
+        if now - last_restart < ABR_MIN_RESTART_S:
+            continue
 
-print(f"Streaming to {SRT_URL}...", flush=True)
+        width, height, fps = ABR_LADDER[rung][:3]
+        print(f"[abr] {reason}: {abr_kbps} -> {kbps} kbps at {width}x{height}@{fps} "
+              f"(restarting encoder)", flush=True)
+        restarting.set()
+        stop_encoder(process)
+        abr_rung, abr_kbps = rung, kbps
+        process = start_encoder(rung, kbps)
+        restarting.clear()
+        last_restart = healthy_since = time.monotonic()
+
+
+writer_thread = None
+if not PASSTHROUGH:
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    writer_thread.start()
+if ABR_ENABLED:
+    threading.Thread(target=abr_controller, daemon=True).start()
+
+analysis = None
+if ANALYSIS_MODEL and PASSTHROUGH:
+    print("[analysis] disabled: passthrough mode never sees the frames", flush=True)
+elif ANALYSIS_MODEL:
+    analysis = AnalysisStage(ANALYSIS_MODEL, ANALYSIS_MODEL_KWARGS, ANALYSIS_WORKERS).start()
+    print(f"[analysis] {ANALYSIS_MODEL} on {ANALYSIS_WORKERS} worker process(es)", flush=True)
+
+print(f"Streaming to {srt_url}...", flush=True)
 print(f"Using camera backend: {backend_name}", flush=True)
 if audio_device:
-    print(f"Publishing audio from: {audio_device} (AAC 128k)", flush=True)
+    print(f"Publishing audio from: {audio_device[1]} ({audio_device[0]}, AAC 128k)", flush=True)
 else:
     print("Publishing video only (no audio device detected)", flush=True)
-print("Press 'q' to stop.", flush=True)
+print(f"Video: {abr_kbps} kbps CBR, adaptive bitrate "
+      f"{'on' if ABR_ENABLED else 'off'}", flush=True)
+if not PASSTHROUGH:
+    print(f"Pipe: {PIPE_PIX_FMT}, {pipe_formatter.frame_bytes * FPS / 1e6:.0f} MB/s "
+          f"at {FPS} fps", flush=True)
+
+# Passthrough mode never sees the frames, so it has no preview either.
+preview = None
+if not PASSTHROUGH and not HEADLESS:
+    preview = PreviewWindow('Local Preview', (WIDTH, HEIGHT), PREVIEW_FPS, PREVIEW_SCALE).start()
+    print(f"Preview: {preview.size[0]}x{preview.size[1]} at up to {PREVIEW_FPS:g} fps", flush=True)
+print("Press 'q' in the preview window or Ctrl+C to stop." if preview is not None
+      else "Press Ctrl+C to stop.", flush=True)
+
+
+def wait_passthrough():
+    # FFmpeg owns the camera: just wait until it exits on its own (the ABR
+    # controller may swap it for a new one meanwhile) or Ctrl+C.
+    while not stop_flag.wait(0.5):
+        proc = process
+        if proc.poll() is not None and not restarting.is_set() and proc is process:
+            print(f"[fatal] FFmpeg exited (code {proc.returncode})", flush=True)
+            return
+
 
 last_good_frame_t = time.monotonic()
 frame_count = 0
+# Time between consecutive frames leaving the capture loop (last 10 minutes),
+# reported at shutdown: anything the loop waits on shows up here as jitter.
+capture_gaps = collections.deque(maxlen=FPS * 600)
+next_frame_t = time.monotonic()
 
 try:
-    while cap.isOpened() and not stop_flag.is_set():
-        ret, frame = cap.read()
+    if PASSTHROUGH:
+        wait_passthrough()
+        frame_count = encoded_frames
+    slot = None if PASSTHROUGH else frame_ring.acquire()
+    while not PASSTHROUGH and cap.isOpened() and not stop_flag.is_set():
+        if camera_is_file:
+            # OpenCV decodes files as fast as it can; pace them like a camera.
+            next_frame_t = max(next_frame_t + 1.0 / FPS, time.monotonic() - 1.0)
+            time.sleep(max(0.0, next_frame_t - time.monotonic()))
+        buf = frame_ring.buffers[slot]
+        ret, frame = cap.read(buf)
+        if (not ret or frame is None) and camera_is_file:
+            # End of the test file: loop it like the passthrough input does.
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = cap.read(buf)
         if not ret or frame is None:
             # Transient grab failure — don't exit, but bail if we never
             # recover (so the user gets a clear error instead of a silent hang).
@@ -248,59 +716,67 @@ try:
                 print(f"[fatal] no frames from camera for {NO_FRAMES_STALL_S:.0f}s "
                       f"— exiting", flush=True)
                 break
-            cv2.waitKey(10)
+            time.sleep(0.01)
             continue
 
         # If the camera is producing a different size than configured (some
-        # drivers silently downgrade), force-resize so FFmpeg's rawvideo
-        # input stays consistent.
-        h, w = frame.shape[:2]
-        if (w, h) != (WIDTH, HEIGHT):
-            frame = cv2.resize(frame, (WIDTH, HEIGHT))
-
-        last_good_frame_t = time.monotonic()
+        # drivers silently downgrade), OpenCV allocates a new array instead of
+        # decoding into our buffer; force-resize into the buffer so FFmpeg's
+        # rawvideo input stays consistent.
+        if frame is not buf:
+            cv2.resize(frame, (WIDTH, HEIGHT), dst=buf)
+            frame = buf
+
+        now = time.monotonic()
+        if frame_count:
+            capture_gaps.append(now - last_good_frame_t)
+        last_good_frame_t = now
         frame_count += 1
 
         # --- AI / COMPUTER VISION SPACE ---
-        # Since you're an AI Engineer, this is where you'd put:
-        # results = model(frame)
-        # cv2.putText(frame, "Object Detected", (50, 50), ...)
+        # The model runs in AnalysisStage worker processes: submit() only
+        # hands over a downscaled copy when a worker is idle, and overlay()
+        # draws the newest result unless it is older than ANALYSIS_MAX_AGE_S.
+        if analysis is not None:
+            analysis.submit(frame, last_good_frame_t)
+            analysis.overlay(frame, last_good_frame_t)
 
         cv2.putText(frame, "M-IoT Live Stream", (20, 40),
                     cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
-        # Show local preview
-        cv2.imshow('Local Preview', frame)
+        # Local preview: a downscaled copy, only when the preview is due
+        if preview is not None:
+            preview.offer(frame, last_good_frame_t)
 
-        # Hand the frame off to the writer thread. If the queue is full
-        # (downstream is slow), drop the oldest frame and insert the newest
-        # so latency stays bounded.
-        buf = frame.tobytes()
-        try:
-            frame_q.put_nowait(buf)
-        except queue.Full:
-            try:
-                frame_q.get_nowait()
-            except queue.Empty:
-                pass
-            try:
-                frame_q.put_nowait(buf)
-            except queue.Full:
-                pass
-
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        # Hand the buffer off to the writer thread. If the previous frame
+        # hasn't been written yet (downstream is slow), it is replaced by this
+        # one so latency stays bounded.
+        frames_offered += 1
+        if frame_ring.publish(slot):
+            frames_dropped += 1
+        slot = frame_ring.acquire()
+
+        if preview is not None and preview.quit_requested.is_set():
             break
+except KeyboardInterrupt:
+    if PASSTHROUGH:
+        frame_count = encoded_frames
 finally:
-    print(f"[shutdown] streamed {frame_count} frames", flush=True)
+    print(f"[shutdown] streamed {frame_count} frames "
+          f"({frames_dropped} dropped, final bitrate {abr_kbps} kbps)", flush=True)
     stop_flag.set()
-    cap.release()
-    try:
-        process.stdin.close()
-    except Exception:
-        pass
-    try:
-        process.wait(timeout=5)
-    except subprocess.TimeoutExpired:
-        process.kill()
-    writer_thread.join(timeout=2)
-    cv2.destroyAllWindows()
+    if cap is not None:
+        cap.release()
+    stop_encoder(process)
+    if writer_thread is not None:
+        writer_thread.join(timeout=2)
+    if analysis is not None:
+        analysis.stop()
+        print(f"[shutdown] analysed {analysis.analysed} frames "
+              f"(mean {analysis.mean_ms():.0f} ms per frame)", flush=True)
+    if capture_gaps:
+        p50, p99, worst = interval_stats(capture_gaps)
+        print(f"[shutdown] capture loop gap p50 {p50:.1f} ms, p99 {p99:.1f} ms, "
+              f"max {worst:.1f} ms", flush=True)
+    if preview is not None:
+        preview.stop()
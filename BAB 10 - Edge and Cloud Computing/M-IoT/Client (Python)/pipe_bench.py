@@ -0,0 +1,248 @@
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+from frame_ring import FrameRing, write_frame
+from pipe_format import ENCODER_PIX_FMTS, PIPE_FORMATS, PipeFormatter
+
+try:
+    import resource  # minor page faults (Linux/macOS only)
+except ImportError:
+    resource = None
+
+# --- CONFIGURATION ---
+WIDTH = 1280
+HEIGHT = 720
+FPS = 30
+DURATION_S = 10.0
+
+# Stand-in for FFmpeg: drains stdin as fast as possible so only our side of
+# the pipe is measured.
+SINK = [sys.executable, "-c",
+        "import sys\n"
+        "r = sys.stdin.buffer.raw\n"
+        "b = bytearray(1 << 20)\n"
+        "while r.readinto(b): pass\n"]
+
+
+def encoder_sink(pix_fmt):
+    """With --encode: the publisher's real libx264 settings, output discarded (end-to-end)."""
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", pix_fmt, "-s", f"{WIDTH}x{HEIGHT}", "-r", str(FPS),
+            "-i", "-", "-c:v", "libx264", "-pix_fmt", ENCODER_PIX_FMTS[pix_fmt],
+            "-preset", "ultrafast", "-tune", "zerolatency", "-f", "null", "-"]
+
+
+class SyntheticCapture:
+    """
+    cv2.VideoCapture look-alike producing a moving test pattern at a fixed
+    rate. Like OpenCV, `read()` allocates a new frame unless it is given a
+    buffer of the right shape to decode into.
+    """
+
+    def __init__(self, width, height, fps):
+        self.interval = 1.0 / fps
+        self.next_t = time.monotonic()
+        base = np.indices((height, width)).sum(axis=0).astype(np.uint8)
+        self.patterns = [np.dstack([np.roll(base, 8 * i, axis=1)] * 3) for i in range(8)]
+        self.index = 0
+
+    def read(self, image=None):
+        self.next_t += self.interval
+        delay = self.next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        pattern = self.patterns[self.index % len(self.patterns)]
+        self.index += 1
+        if image is None or image.shape != pattern.shape:
+            return True, pattern.copy()
+        np.copyto(image, pattern)
+        return True, image
+
+
+def run_queue(cap, stdin, deadline):
+    """Original path: fresh array per read, tobytes() copy, bounded queue."""
+    frame_q = queue.Queue(maxsize=4)
+    stop = threading.Event()
+    written = 0
+
+    def writer():
+        nonlocal written
+        while not stop.is_set():
+            try:
+                buf = frame_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            stdin.write(buf)
+            written += 1
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    captured = dropped = 0
+    while time.monotonic() < deadline:
+        ret, frame = cap.read()
+        captured += 1
+        buf = frame.tobytes()
+        try:
+            frame_q.put_nowait(buf)
+        except queue.Full:
+            dropped += 1
+            try:
+                frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                frame_q.put_nowait(buf)
+            except queue.Full:
+                pass
+    stop.set()
+    thread.join()
+    return captured, written, dropped
+
+
+class RingWriter:
+    """
+    The publisher's hand-off, shared by the benches: the capture loop fills
+    `ring` slots, a writer thread writes the newest one to `stdin` in
+    `pix_fmt`. Without `stdin` a SINK process is started, and `stop()`
+    closes it too.
+    """
+
+    def __init__(self, shape, stdin=None, pix_fmt="bgr24"):
+        self.sink = None
+        if stdin is None:
+            self.sink = subprocess.Popen(SINK, stdin=subprocess.PIPE, bufsize=0)
+            stdin = self.sink.stdin
+        self.stdin = stdin
+        self.ring = FrameRing(shape)
+        self.formatter = PipeFormatter(pix_fmt, shape[1], shape[0])
+        self.written = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            slot = self.ring.take(timeout=0.5)
+            if slot is None:
+                continue
+            try:
+                write_frame(self.stdin, self.formatter.convert(self.ring.buffers[slot]))
+                self.written += 1
+            finally:
+                self.ring.release(slot)
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        if self.sink is not None:
+            self.sink.stdin.close()
+            self.sink.wait()
+
+
+def run_ring(cap, stdin, deadline, pix_fmt="bgr24"):
+    """New path: read into preallocated buffers, write from them, latest wins."""
+    writer = RingWriter((HEIGHT, WIDTH, 3), stdin, pix_fmt)
+    ring = writer.ring
+    captured = dropped = 0
+    slot = ring.acquire()
+    while time.monotonic() < deadline:
+        ret, frame = cap.read(ring.buffers[slot])
+        captured += 1
+        if ring.publish(slot):
+            dropped += 1
+        slot = ring.acquire()
+    writer.stop()
+    return captured, writer.written, dropped
+
+
+def child_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(name, run, bufsize, fps, duration, sink_command=SINK, pix_fmt="bgr24"):
+    sink = subprocess.Popen(sink_command, stdin=subprocess.PIPE, bufsize=bufsize)
+    cap = SyntheticCapture(WIDTH, HEIGHT, fps)
+    faults_before = resource.getrusage(resource.RUSAGE_SELF).ru_minflt if resource else 0
+    sink_cpu_before = child_cpu()
+    cpu_before, wall_before = time.process_time(), time.monotonic()
+    if pix_fmt == "bgr24":
+        captured, written, dropped = run(cap, sink.stdin, wall_before + duration)
+    else:
+        captured, written, dropped = run(cap, sink.stdin, wall_before + duration, pix_fmt)
+    cpu = time.process_time() - cpu_before
+    wall = time.monotonic() - wall_before
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults_before if resource else 0
+    sink.stdin.close()
+    sink.wait()
+    # Children's CPU is only reported once they have been waited for
+    sink_cpu = child_cpu() - sink_cpu_before
+    pipe_mb = written * WIDTH * HEIGHT * PIPE_FORMATS[pix_fmt] / wall / 1e6
+    fault_text = f"{faults / max(captured, 1):>11.0f}" if resource else f"{'-':>11}"
+    sink_text = f"{100 * sink_cpu / wall:>6.1f}" if resource else f"{'-':>6}"
+    print(f"{name:>7} | {captured / wall:>7.1f} | {written / wall:>6.1f} | {dropped:>7} | "
+          f"{100 * cpu / wall:>6.1f} | {1000 * cpu / max(captured, 1):>9.2f} | {fault_text} | "
+          f"{pipe_mb:>7.0f} | {sink_text}", flush=True)
+
+
+def main():
+    """
+    Compares the SRT publisher's frame hand-off before and after the
+    preallocated frame ring, using a synthetic capture source and a sink
+    process in place of FFmpeg. With --formats, compares the pipe pixel
+    formats instead (bgr24 vs. YUV converted in Python).
+    Usage: python pipe_bench.py [--fps N] [--duration SECONDS] [--res WxH] [--formats] [--encode]
+    Use --fps 0 for unpaced capture: the write rate is then the maximum
+    sustainable FPS. --encode feeds a real libx264 FFmpeg (the publisher's
+    settings, output discarded) so "sink CPU" is the end-to-end encoder cost.
+    """
+    global WIDTH, HEIGHT
+    args = sys.argv[1:]
+    if args and args[0] in ['-h', '--help']:
+        print(main.__doc__)
+        return
+    fps, duration = FPS, DURATION_S
+    compare_formats = "--formats" in args
+    encode = "--encode" in args
+    if "--res" in args:
+        i = args.index("--res")
+        WIDTH, HEIGHT = (int(v) for v in args[i + 1].split("x"))
+        del args[i:i + 2]
+    if "--fps" in args:
+        i = args.index("--fps")
+        fps = float(args[i + 1])
+        del args[i:i + 2]
+    if "--duration" in args:
+        i = args.index("--duration")
+        duration = float(args[i + 1])
+        del args[i:i + 2]
+
+    if encode and shutil.which("ffmpeg") is None:
+        print("--encode needs ffmpeg in PATH")
+        return
+
+    rate_text = "unpaced" if fps <= 0 else f"{fps:.0f} FPS"
+    sink_text = "libx264 sink" if encode else "drain sink"
+    print(f"{WIDTH}x{HEIGHT}, {rate_text}, {sink_text}, {duration:.0f} s per mode")
+    print(f"{'mode':>7} | {'capture':>7} | {'write':>6} | {'dropped':>7} | {'CPU %':>6} | "
+          f"{'CPU ms/fr':>9} | {'faults/fr':>11} | {'pipe MB/s':>7} | {'sink CPU %':>6}")
+    fps = fps if fps > 0 else 1e9
+    if compare_formats:
+        for pix_fmt in PIPE_FORMATS:
+            sink = encoder_sink(pix_fmt) if encode else SINK
+            measure(pix_fmt, run_ring, 0, fps, duration, sink, pix_fmt)
+        return
+    # The original path wrote through Popen's default buffered stdin
+    sink = encoder_sink("bgr24") if encode else SINK
+    for name, run, bufsize in (("queue", run_queue, -1), ("ring", run_ring, 0)):
+        measure(name, run, bufsize, fps, duration, sink)
+
+
+if __name__ == '__main__':
+    main()
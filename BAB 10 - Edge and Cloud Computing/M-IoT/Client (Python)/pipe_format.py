@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+# Pixel formats the publisher can put on FFmpeg's stdin, with bytes per pixel.
+# The YUV 4:2:0 formats are half the size of bgr24 and are what libx264
+# encodes natively, so FFmpeg skips its own (single-threaded) swscale pass.
+PIPE_FORMATS = {
+    "bgr24": 3.0,
+    "yuv420p": 1.5,  # I420: Y plane, then U, then V
+    "nv12": 1.5,     # Y plane, then interleaved UV
+}
+
+# Pixel format libx264 encodes for each pipe format. libx264 takes nv12 as
+# well as yuv420p directly; asking for yuv420p on an nv12 pipe would make
+# FFmpeg insert swscale just to deinterleave the chroma.
+ENCODER_PIX_FMTS = {
+    "bgr24": "yuv420p",
+    "yuv420p": "yuv420p",
+    "nv12": "nv12",
+}
+
+
+class PipeFormatter:
+    """
+    Converts BGR frames to the pipe's pixel format into a buffer allocated
+    once up front. `convert()` returns the array to write; for bgr24 that is
+    the frame itself, for the YUV formats the same preallocated buffer every
+    time, so it must be written before the next call.
+
+    The BGR -> I420 conversion is OpenCV's vectorised cvtColor (BT.601,
+    limited range, the same as FFmpeg's default for bgr24 input). NV12 is
+    built from it by interleaving the chroma planes with NumPy.
+    """
+
+    def __init__(self, pix_fmt, width, height):
+        if pix_fmt not in PIPE_FORMATS:
+            raise ValueError(f"unsupported pipe pixel format: {pix_fmt}")
+        if pix_fmt != "bgr24" and (width % 2 or height % 2):
+            raise ValueError("YUV 4:2:0 needs an even frame width and height")
+        self.pix_fmt = pix_fmt
+        self.width = width
+        self.height = height
+        self.frame_bytes = int(width * height * PIPE_FORMATS[pix_fmt])
+        self.buffer = None
+        self.chroma = None
+        if pix_fmt != "bgr24":
+            self.buffer = np.empty((height * 3 // 2, width), np.uint8)
+        if pix_fmt == "nv12":
+            self.chroma = np.empty(width * height // 2, np.uint8)
+
+    def convert(self, frame):
+        if self.buffer is None:
+            return frame
+        cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420, dst=self.buffer)
+        if self.chroma is not None:
+            # I420 -> NV12: U and V planes become one interleaved UV plane
+            quarter = self.width * self.height // 4
+            planar = self.buffer[self.height:].reshape(-1)
+            np.copyto(self.chroma, planar)
+            interleaved = planar.reshape(quarter, 2)
+            interleaved[:, 0] = self.chroma[:quarter]
+            interleaved[:, 1] = self.chroma[quarter:]
+        return self.buffer
@@ -0,0 +1,86 @@
+import threading
+import cv2
+import numpy as np
+
+# --- CONFIGURATION ---
+PREVIEW_FPS = 10.0              # the preview window refreshes at most this often
+PREVIEW_SCALE = 0.5             # preview size relative to the streamed frame
+
+
+class PreviewWindow:
+    """
+    Local preview on its own thread. The capture loop only `offer()`s
+    frames: at most `fps` times per second one is downscaled into a
+    preallocated staging buffer, every other call returns after a clock
+    check. All HighGUI calls (imshow, waitKey, destroyWindow) happen on the
+    preview thread, so the capture loop never waits on window events,
+    redraws or waitKey's timer. Pressing 'q' in the window sets
+    `quit_requested`.
+
+    OpenCV builds without GUI support (opencv-python-headless) raise on
+    the first imshow; the thread then reports it and exits, and the
+    publisher carries on as if headless.
+    """
+
+    def __init__(self, title, frame_size, fps=PREVIEW_FPS, scale=PREVIEW_SCALE):
+        width, height = frame_size
+        self.title = title
+        self.interval = 1.0 / fps
+        self.size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        self.staging = np.empty((self.size[1], self.size[0], 3), np.uint8)
+        self.display = np.empty_like(self.staging)
+        self.fresh = False
+        self.last_offer = 0.0
+        self.shown = 0
+        self.lock = threading.Lock()
+        self.quit_requested = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def offer(self, frame, now):
+        """Called for every captured frame; copies one only when the preview is due."""
+        if now - self.last_offer < self.interval:
+            return
+        self.last_offer = now
+        with self.lock:
+            cv2.resize(frame, self.size, dst=self.staging, interpolation=cv2.INTER_AREA)
+            self.fresh = True
+
+    def _run(self):
+        window_open = False
+        try:
+            while not self.stopping.is_set():
+                show = False
+                with self.lock:
+                    if self.fresh:
+                        np.copyto(self.display, self.staging)
+                        self.fresh = False
+                        show = True
+                if show:
+                    cv2.imshow(self.title, self.display)
+                    window_open = True
+                    self.shown += 1
+                if not window_open:
+                    # waitKey returns at once while there is no window
+                    self.stopping.wait(self.interval)
+                    continue
+                # Pumps window events and paces this thread at the preview rate
+                if cv2.waitKey(max(1, int(self.interval * 1000))) & 0xFF == ord('q'):
+                    self.quit_requested.set()
+            if window_open:
+                cv2.destroyWindow(self.title)
+                cv2.waitKey(1)
+        except cv2.error:
+            print("[preview] this OpenCV build has no GUI support — continuing without preview "
+                  "(use --headless to skip it)", flush=True)
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+
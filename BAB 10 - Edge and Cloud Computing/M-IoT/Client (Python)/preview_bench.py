@@ -0,0 +1,107 @@
+import sys
+import time
+import cv2
+from capture_stats import interval_stats
+from pipe_bench import RingWriter, SyntheticCapture
+from preview import PREVIEW_FPS, PREVIEW_SCALE, PreviewWindow
+
+# --- CONFIGURATION ---
+WIDTH = 1280
+HEIGHT = 720
+FPS = 30
+DURATION_S = 10.0
+MODES = ["inline", "thread", "headless"]
+
+
+def gui_available():
+    try:
+        cv2.namedWindow("probe")
+        cv2.destroyWindow("probe")
+        return True
+    except cv2.error:
+        return False
+
+
+def run(mode, duration):
+    """
+    Capture -> overlay -> preview -> frame ring -> writer -> sink, like the
+    publisher. `inline` is the old loop (full-size imshow and waitKey(1)
+    on every frame), `thread` uses PreviewWindow, `headless` has no preview.
+    """
+    writer = RingWriter((HEIGHT, WIDTH, 3))
+    ring = writer.ring
+    preview = None
+    if mode == "thread":
+        preview = PreviewWindow("preview_bench", (WIDTH, HEIGHT), PREVIEW_FPS, PREVIEW_SCALE).start()
+
+    cap = SyntheticCapture(WIDTH, HEIGHT, FPS)
+    captured = 0
+    gaps = []
+    slot = ring.acquire()
+    start = last_t = time.monotonic()
+    while time.monotonic() - start < duration:
+        ret, frame = cap.read(ring.buffers[slot])
+        now = time.monotonic()
+        gaps.append(now - last_t)
+        last_t = now
+        captured += 1
+        cv2.putText(frame, "M-IoT Live Stream", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        if mode == "inline":
+            cv2.imshow("preview_bench", frame)
+        elif preview is not None:
+            preview.offer(frame, now)
+        ring.publish(slot)
+        slot = ring.acquire()
+        if mode == "inline":
+            cv2.waitKey(1)
+    wall = time.monotonic() - start
+    writer.stop()
+    shown = captured if mode == "inline" else 0
+    if preview is not None:
+        preview.stop()
+        shown = preview.shown
+    if mode == "inline":
+        cv2.destroyWindow("preview_bench")
+        cv2.waitKey(1)
+
+    p50, p99, worst = interval_stats(gaps[1:])
+    print(f"{mode:>8} | {captured / wall:>7.1f} | {shown / wall:>7.1f} | "
+          f"{p50:>7.1f} | {p99:>7.1f} | {worst:>7.1f}", flush=True)
+
+
+def main():
+    """
+    Measures capture-loop jitter (gap between frames at a fixed camera
+    rate) with the old inline preview, the threaded rate-limited preview
+    and no preview. Needs an OpenCV build with GUI support (not
+    opencv-python-headless) and a display for the first two modes.
+    Usage: python preview_bench.py [--duration SECONDS] [--modes inline,thread,headless]
+    """
+    args = sys.argv[1:]
+    if args and args[0] in ['-h', '--help']:
+        print(main.__doc__)
+        return
+    duration, modes = DURATION_S, MODES
+    if "--duration" in args:
+        i = args.index("--duration")
+        duration = float(args[i + 1])
+        del args[i:i + 2]
+    if "--modes" in args:
+        i = args.index("--modes")
+        modes = args[i + 1].split(",")
+        del args[i:i + 2]
+    if not gui_available():
+        skipped = [m for m in modes if m != "headless"]
+        modes = [m for m in modes if m == "headless"]
+        if skipped:
+            print(f"No GUI support in this OpenCV build: skipping {', '.join(skipped)}")
+
+    print(f"{WIDTH}x{HEIGHT} @ {FPS} FPS (ideal gap {1000 / FPS:.1f} ms), preview "
+          f"{PREVIEW_SCALE:g}x at {PREVIEW_FPS:g} fps in thread mode, {duration:.0f} s per run")
+    print(f"{'mode':>8} | {'capture':>7} | {'shown':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'max ms':>7}")
+    for mode in modes:
+        run(mode, duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,47 @@ from aiocoap import Message, GET, PUT
 from aiocoap.error import ResourceChanged, LibraryShutdown
 from typing import Optional
 
+# --- Konfigurasi re-registrasi Observe ---
+RESTART_BACKOFF_BASE = 0.05  # Detik, jeda pertama jika restart berturut-turut gagal
+RESTART_BACKOFF_MAX = 2.0    # Detik, batas atas jeda backoff eksponensial
+
+class GapHistogram:
+    """Histogram bucket tetap (milidetik) untuk durasi jeda stream."""
+    BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float):
+        """Mencatat satu sampel durasi (dalam detik)."""
+        ms = seconds * 1000.0
+        index = len(self.BOUNDS_MS)
+        for i, bound in enumerate(self.BOUNDS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def report(self):
+        """Mencetak ringkasan histogram ke terminal."""
+        if self.total == 0:
+            print(f"   {self.name}: tidak ada sampel")
+            return
+        print(f"   {self.name}: n={self.total}, rata-rata={self.sum_ms / self.total:.1f} ms, maks={self.max_ms:.1f} ms")
+        lower = 0
+        for bound, count in zip(self.BOUNDS_MS + (None,), self.counts):
+            label = f"{lower}-{bound} ms" if bound is not None else f">{lower} ms"
+            if count:
+                print(f"      {label:>14}: {count}")
+            lower = bound
+
 class CoapCameraClient:
     """Mengelola koneksi dan stream CoAP ke ESP32-CAM."""
     def __init__(self, esp32_ip: str):
@@ -20,6 +61,14 @@ class CoapCameraClient:
         self.skipped_sessions = 0
         self.start_time = None
         self.context = None
+        # Status re-registrasi Observe setelah ResourceChanged
+        self.consecutive_failures = 0
+        self.session_frames = 0
+        self.last_frame_time = None
+        self.gap_start = None
+        self.restart_time = None
+        self.gap_histogram = GapHistogram("Durasi jeda antar frame")
+        self.ttff_histogram = GapHistogram("Waktu ke frame pertama")
 
     async def create_context(self):
         """Membuat dan mengembalikan konteks CoAP baru."""
@@ -110,6 +159,7 @@ class CoapCameraClient:
         self.is_streaming = True
         self.frame_count = 0
         self.skipped_sessions = 0
+        self.consecutive_failures = 0
         self.start_time = time.time()
         
         if display:
@@ -121,6 +171,9 @@ class CoapCameraClient:
             while self.is_streaming:
                 try:
                     print(f"Memulai (atau memulai ulang) sesi Observe...")
+                    self.session_frames = 0
+                    if self.gap_start is not None:
+                        self.restart_time = time.time()
                     request = Message(code=GET, uri=f"{self.base_uri}/stream", observe=0)
                     request_handle = self.context.request(request)
 
@@ -136,8 +189,16 @@ class CoapCameraClient:
 
                 except ResourceChanged:
                     self.skipped_sessions += 1
-                    print(f"ResourceChanged terdeteksi. Sesi observasi akan dimulai ulang ({self.skipped_sessions} kali)...")
-                    await asyncio.sleep(0.5)
+                    if self.gap_start is None:
+                        self.gap_start = self.last_frame_time or time.time()
+                    # Restart langsung; backoff hanya jika sesi sebelumnya gagal tanpa frame
+                    if self.session_frames == 0:
+                        self.consecutive_failures += 1
+                    else:
+                        self.consecutive_failures = 0
+                    delay = self._restart_delay()
+                    print(f"ResourceChanged terdeteksi. Sesi observasi dimulai ulang ({self.skipped_sessions} kali, jeda {delay:.2f}s)...")
+                    await self._hold_last_frame(delay, display)
                     continue
 
                 except (Exception, LibraryShutdown) as e:
@@ -155,6 +216,24 @@ class CoapCameraClient:
         finally:
             await self._cleanup(display, auto_start)
 
+    def _restart_delay(self) -> float:
+        """Menghitung jeda backoff eksponensial (dibatasi) untuk restart berturut-turut yang gagal."""
+        if self.consecutive_failures <= 1:
+            return 0.0
+        return min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * (2 ** (self.consecutive_failures - 2)))
+
+    async def _hold_last_frame(self, delay: float, display: bool):
+        """Menunggu selama jeda sambil tetap menampilkan frame terakhir di jendela."""
+        deadline = time.time() + delay
+        while True:
+            if display and cv2.waitKey(1) & 0xFF == ord('q'):
+                self.is_streaming = False
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, 0.02))
+
     async def _process_frame(self, response, display: bool):
         """Memproses setiap frame yang diterima."""
         try:
@@ -168,7 +247,17 @@ class CoapCameraClient:
             if frame is None:
                 return
 
+            now = time.time()
             self.frame_count += 1
+            self.session_frames += 1
+            self.last_frame_time = now
+            if self.gap_start is not None:
+                # Frame pertama setelah sesi dimulai ulang
+                self.gap_histogram.record(now - self.gap_start)
+                if self.restart_time is not None:
+                    self.ttff_histogram.record(now - self.restart_time)
+                self.gap_start = None
+                self.restart_time = None
             
             info_text = f"Frame: {self.frame_count} | Sesi Gagal: {self.skipped_sessions}"
             cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
@@ -202,6 +291,8 @@ class CoapCameraClient:
             print(f"   Sesi dimulai ulang: {self.skipped_sessions}")
             print(f"   Durasi: {elapsed:.1f}s")
             print(f"   Rata-rata FPS (efektif): {avg_fps:.1f}")
+            self.gap_histogram.report()
+            self.ttff_histogram.report()
         else:
             print("   Tidak ada frame yang berhasil diterima.")
 
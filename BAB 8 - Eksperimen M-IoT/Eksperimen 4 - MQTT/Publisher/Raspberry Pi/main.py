@@ -1,4 +1,10 @@
 import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+import collections
+import itertools
+import queue
+import struct
 import time
 import logging
 import threading
@@ -6,6 +12,7 @@ import cv2
 import numpy as np
 from picamera2 import Picamera2
 from libcamera import controls
+from rate_control import JpegRateController
 
 # --- KONFIGURASI ---
 MQTT_BROKER = "172.20.10.5"  # Ganti dengan IP Broker MQTT Anda
@@ -13,11 +20,43 @@ MQTT_PORT = 1883
 IMAGE_TOPIC = "camera/image"
 STATUS_TOPIC = "camera/status"
 COMMAND_TOPIC = "camera/command"
+LATEST_TOPIC = "camera/latest" # Frame terbaru (retained) untuk subscriber yang baru terhubung
+IMAGE_CHUNK_TOPIC = "camera/image/chunk" # Dipakai saat CHUNKED_MODE aktif
+CAMERA_SIZE = (640, 480) # Resolusi capture, misal (1920, 1080) bersama CHUNKED_MODE
 FRAME_INTERVAL = 0.05 # Detik (0.05 = target 20 FPS)
+JPEG_QUALITY = 85 # Kualitas tetap jika RATE_CONTROL nonaktif, atau kualitas awal
+# Rate control: kualitas JPEG diatur per frame agar mengikuti anggaran bitrate
+RATE_CONTROL = True
+TARGET_KBPS = 4000
+RATE_CONTROL_RESIZE = False # Izinkan penurunan resolusi jika kualitas minimum belum cukup
+STATS_INTERVAL = 5.0 # Detik antar laporan statistik pipeline
+# MQTT v5: metadata frame (user properties), topic alias, dan message expiry
+USE_MQTT_V5 = True
+FRAME_EXPIRY_S = 1 # Detik; broker membuang frame yang antre lebih lama dari ini
+IMAGE_TOPIC_ALIAS = 1
+IMAGE_CHUNK_TOPIC_ALIAS = 2
+LATEST_INTERVAL = 5.0 # Detik antar pembaruan frame retained di LATEST_TOPIC
+CAPTURE_MAX_AGE = 0.5 # Detik; frame stream lebih tua dari ini tidak dipakai untuk capture
+# Backpressure: batas frame yang belum terkirim di buffer keluar paho. Frame
+# dikirim dengan QoS 0, sedangkan max_queued_messages_set paho hanya membatasi
+# QoS > 0, jadi satu-satunya batas adalah reservasi OutgoingTracker ini
+MAX_PENDING_FRAMES = 10
+MAX_PENDING_BYTES = 2 * 1024 * 1024
+# Mode chunk: frame besar dipecah menjadi potongan berukuran tetap dengan header
+# (frame_id, indeks, total) agar lolos dari batas message_size_limit broker
+CHUNKED_MODE = False
+CHUNK_SIZE = 64 * 1024 # Byte payload per potongan (tanpa header)
+CHUNK_HEADER = struct.Struct(">IHH") # frame_id (uint32), indeks (uint16), total (uint16)
+# Motion gating: lewati encode/publish jika adegan tidak berubah
+MOTION_GATING = True
+MOTION_DOWNSCALE = 8 # Ambil setiap piksel ke-N (baris & kolom) untuk deteksi
+MOTION_PIXEL_THRESHOLD = 25 # Selisih level abu-abu agar piksel dianggap berubah
+MOTION_THRESHOLD = 0.01 # Fraksi piksel berubah minimum agar frame dikirim
+KEYFRAME_INTERVAL = 5.0 # Detik; frame tetap dikirim sebagai heartbeat meski tidak ada gerakan
 
 # --- Inisialisasi Kamera ---
 picam2 = Picamera2()
-video_config = picam2.create_video_configuration(main={"size": (640, 480)})
+video_config = picam2.create_video_configuration(main={"size": CAMERA_SIZE})
 picam2.configure(video_config)
 picam2.set_controls({"AfMode": controls.AfModeEnum.Continuous, "AwbEnable": True})
 picam2.start()
@@ -27,32 +66,421 @@ logging.info("Kamera Picamera2 berhasil diinisialisasi.")
 # Gunakan threading.Event untuk kontrol yang aman antar thread
 stream_active = threading.Event()
 client = mqtt.Client()
+# Nomor urut frame yang benar-benar dipublikasikan ke IMAGE_TOPIC (diberikan saat
+# publish, jadi frame yang dilewati motion gating atau tertimpa di slot tidak
+# terhitung hilang oleh subscriber)
+frame_sequence = itertools.count(1)
+# Status topic alias per koneksi (direset setiap kali terhubung ulang)
+topic_alias_lock = threading.Lock()
+topic_alias_maximum = 0
+topic_aliases_established = set()
+# Frame JPEG terbaru (ts, shape, jpeg) dari stream, dipakai untuk capture & retained
+latest_frame_lock = threading.Lock()
+latest_encoded = None
+# Antrean perintah capture: (waktu diterima, response topic, correlation data)
+capture_requests = queue.Queue()
+# Kamera dan rate controller dipakai bersama oleh pipeline stream, worker capture,
+# dan frame retained: capture_array dan pasangan baca kualitas -> encode -> update
+# tidak boleh berjalan bersamaan dari beberapa thread
+camera_lock = threading.Lock()
+encode_lock = threading.Lock()
 
-def publish_single_image():
-    """Mengambil satu frame, meng-encode, dan mempublikasikannya."""
-    try:
-        # Ambil frame sebagai array NumPy (format RGB)
+class LatestSlot:
+    """
+    Antrean berukuran satu dengan semantik 'latest-wins' untuk menghubungkan
+    tahap pipeline. Item lama yang belum diambil akan ditimpa (dan dihitung
+    sebagai drop) sehingga tahap yang lambat tidak menumpuk latensi.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Mengambil item terbaru, atau None jika timeout."""
+        with self.condition:
+            if self.item is None:
+                self.condition.wait(timeout)
+            item, self.item = self.item, None
+            return item
+
+class OutgoingTracker:
+    """
+    Melacak frame yang sudah diserahkan ke paho tetapi belum ditulis ke socket
+    (via MQTTMessageInfo.is_published), agar frame baru bisa dilewati saat
+    broker/jaringan melambat alih-alih menumpuk di memori.
+    """
+    def __init__(self, max_frames, max_bytes):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.pending_bytes = 0
+        self.dropped = 0
+        self.peak_frames = 0
+        self.peak_bytes = 0
+
+    def _prune(self):
+        while self.pending and all(info.is_published() for info in self.pending[0][0]):
+            _, size = self.pending.popleft()
+            self.pending_bytes -= size
+
+    def try_reserve(self, size):
+        """Mengembalikan True jika frame berukuran `size` masih muat dalam anggaran."""
+        with self.lock:
+            self._prune()
+            if len(self.pending) >= self.max_frames or self.pending_bytes + size > self.max_bytes:
+                self.dropped += 1
+                return False
+            return True
+
+    def track(self, infos, size):
+        """
+        Mencatat hasil client.publish() untuk satu frame (satu atau beberapa
+        potongan) sebagai frame yang sedang dalam perjalanan.
+        """
+        with self.lock:
+            infos = [info for info in infos if info.rc == mqtt.MQTT_ERR_SUCCESS]
+            if not infos:
+                # Misalnya MQTT_ERR_NO_CONN: paho tidak menyimpan pesan, hitung sebagai drop
+                self.dropped += 1
+                return
+            self.pending.append((infos, size))
+            self.pending_bytes += size
+            self.peak_frames = max(self.peak_frames, len(self.pending))
+            self.peak_bytes = max(self.peak_bytes, self.pending_bytes)
+
+    def clear(self):
+        """Melupakan pesan yang tertunda (misalnya setelah koneksi terputus)."""
+        with self.lock:
+            self.pending.clear()
+            self.pending_bytes = 0
+
+    def snapshot(self):
+        with self.lock:
+            self._prune()
+            return len(self.pending), self.pending_bytes, self.dropped
+
+class MotionGate:
+    """
+    Deteksi perubahan murah sebelum encode JPEG: frame diperkecil dengan
+    striding, dijadikan abu-abu, lalu dibandingkan (vektorisasi NumPy) dengan
+    frame terakhir yang dikirim. Frame tanpa perubahan dilewati, kecuali
+    sudah KEYFRAME_INTERVAL sejak frame terakhir dikirim (heartbeat).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reference = None
+        self.last_sent = 0.0
+        self.checked = 0
+        self.skipped = 0
+        self.detect_time = 0.0
+
+    def should_send(self, frame_rgb):
+        """Mengembalikan True jika frame perlu di-encode dan dikirim."""
+        started = time.monotonic()
+        small = frame_rgb[::MOTION_DOWNSCALE, ::MOTION_DOWNSCALE, :3]
+        # Jumlah kanal RGB (0..765) sebagai pengganti luma, tanpa konversi warna penuh
+        gray = small.sum(axis=2, dtype=np.int16)
+        reference = self.reference
+        if reference is None or reference.shape != gray.shape:
+            changed = True
+        else:
+            diff = np.abs(gray - reference)
+            changed_ratio = np.count_nonzero(diff > MOTION_PIXEL_THRESHOLD * 3) / diff.size
+            changed = changed_ratio >= MOTION_THRESHOLD
+        now = time.monotonic()
+        send = changed or now - self.last_sent >= KEYFRAME_INTERVAL
+        if send:
+            # Referensi = frame terakhir yang dikirim, agar perubahan lambat tetap terakumulasi
+            self.reference = gray
+            self.last_sent = now
+        with self.lock:
+            self.checked += 1
+            self.detect_time += now - started
+            if not send:
+                self.skipped += 1
+        return send
+
+    def snapshot_and_reset(self):
+        with self.lock:
+            checked, skipped, detect_time = self.checked, self.skipped, self.detect_time
+            self.checked, self.skipped, self.detect_time = 0, 0, 0.0
+        return checked, skipped, detect_time
+
+class StageStats:
+    """Mencatat jumlah item dan total waktu kerja satu tahap pipeline (thread-safe)."""
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.busy_time = 0.0
+
+    def add(self, duration):
+        with self.lock:
+            self.count += 1
+            self.busy_time += duration
+
+    def snapshot_and_reset(self):
+        with self.lock:
+            count, busy_time = self.count, self.busy_time
+            self.count, self.busy_time = 0, 0.0
+        return count, busy_time
+
+# Slot antar tahap: capture -> encode -> publish
+capture_slot = LatestSlot()
+encode_slot = LatestSlot()
+capture_stats = StageStats("capture")
+encode_stats = StageStats("encode")
+publish_stats = StageStats("publish")
+outgoing = OutgoingTracker(MAX_PENDING_FRAMES, MAX_PENDING_BYTES)
+rate_controller = JpegRateController(
+    target_kbps=TARGET_KBPS, fps=1 / FRAME_INTERVAL,
+    initial_quality=JPEG_QUALITY, allow_resize=RATE_CONTROL_RESIZE,
+)
+motion_gate = MotionGate()
+
+def capture_frame():
+    """
+    Mengambil satu frame sebagai array NumPy (format RGB).
+    Mengembalikan tuple (timestamp capture, frame).
+    """
+    with camera_lock:
         frame_rgb = picam2.capture_array("main")
-        # Konversi ke BGR untuk OpenCV
-        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+    return time.time(), frame_rgb
 
-        # Encode frame ke format JPEG dengan kualitas 85
-        ret, buffer = cv2.imencode('.jpg', frame_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+def encode_frame(frame_rgb):
+    """
+    Mengonversi frame RGB ke BGR dan meng-encode ke JPEG. Mengembalikan (bytes, shape
+    frame yang di-encode) atau None. Jika RATE_CONTROL aktif, kualitas (dan skala)
+    diambil dari rate_controller, jadi shape bisa lebih kecil dari frame capture.
+    """
+    frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+    quality = JPEG_QUALITY
+    with encode_lock:
+        if RATE_CONTROL:
+            quality = rate_controller.quality
+            scale = rate_controller.scale
+            if scale != 1.0:
+                frame_bgr = cv2.resize(frame_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
         if not ret:
-            logging.warning("Gagal meng-encode frame.")
-            return
+            return None
+        if RATE_CONTROL:
+            rate_controller.update(len(buffer))
+    return buffer.tobytes(), frame_bgr.shape
+
+def build_frame_properties(seq, capture_ts, frame_shape, expiry=True):
+    """
+    Membuat properti PUBLISH MQTT v5 berisi metadata frame dan (opsional) masa
+    berlaku pesan. `seq` None untuk pesan di luar stream (jawaban capture, retained).
+    """
+    height, width = frame_shape[:2]
+    user_properties = [("seq", str(seq))] if seq is not None else []
+    user_properties += [
+        ("ts", f"{capture_ts:.6f}"),
+        ("res", f"{width}x{height}"),
+    ]
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.UserProperty = user_properties
+    if expiry:
+        properties.MessageExpiryInterval = FRAME_EXPIRY_S
+    return properties
 
-        # Publikasikan frame ke topik MQTT
-        client.publish(IMAGE_TOPIC, buffer.tobytes())
-        logging.info(f"Frame terkirim ({len(buffer)} bytes)")
+def set_latest_frame(encoded):
+    """Menyimpan frame JPEG terbaru (ts, shape, jpeg) secara thread-safe."""
+    global latest_encoded
+    with latest_frame_lock:
+        latest_encoded = encoded
+
+def get_latest_frame():
+    """Mengembalikan frame JPEG terbaru (ts, shape, jpeg) atau None."""
+    with latest_frame_lock:
+        return latest_encoded
+
+def split_into_chunks(jpeg_bytes, frame_id):
+    """Memecah frame JPEG menjadi potongan CHUNK_SIZE dengan header (frame_id, indeks, total)."""
+    view = memoryview(jpeg_bytes)
+    total = (len(view) + CHUNK_SIZE - 1) // CHUNK_SIZE
+    frame_id &= 0xFFFFFFFF
+    return [
+        CHUNK_HEADER.pack(frame_id, index, total) + view[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+        for index in range(total)
+    ]
+
+def aliased_topic(topic, alias, properties):
+    """
+    Mengembalikan nama topik yang dikirim untuk publish berikutnya. Setelah alias
+    terdaftar di broker, nama topik dikosongkan dan hanya alias yang dikirim.
+    Harus dipanggil dengan topic_alias_lock dipegang.
+    """
+    if alias > topic_alias_maximum:
+        return topic
+    properties.TopicAlias = alias
+    return "" if alias in topic_aliases_established else topic
+
+def mark_alias_established(alias, sent_topic, info):
+    """
+    Mencatat alias sebagai terdaftar setelah publish pertama yang membawa nama
+    topik lengkap berhasil diserahkan ke paho. Jika publish gagal (misalnya
+    NO_CONN), broker belum mengenal alias dan publish berikutnya harus tetap
+    membawa nama topik. Harus dipanggil dengan topic_alias_lock dipegang.
+    """
+    if sent_topic and alias <= topic_alias_maximum and info.rc == mqtt.MQTT_ERR_SUCCESS:
+        topic_aliases_established.add(alias)
+
+def publish_frame(jpeg_bytes, capture_ts, frame_shape):
+    """
+    Mempublikasikan satu frame JPEG ke topik MQTT (dengan metadata jika MQTT v5),
+    utuh atau sebagai potongan jika CHUNKED_MODE aktif. Potongan dipublikasikan
+    beruntun tanpa menunggu satu per satu (pipelining di buffer keluar paho).
+    Nomor urut diberikan di sini, hanya untuk frame yang benar-benar dikirim.
+    Mengembalikan False jika frame dilewati karena buffer keluar sudah penuh.
+    """
+    if not outgoing.try_reserve(len(jpeg_bytes)):
+        return False
+    if CHUNKED_MODE:
+        topic, alias = IMAGE_CHUNK_TOPIC, IMAGE_CHUNK_TOPIC_ALIAS
+    else:
+        topic, alias = IMAGE_TOPIC, IMAGE_TOPIC_ALIAS
+
+    infos = []
+    # Lock yang sama dengan alias: nomor urut dan urutan publish selalu sejalan,
+    # walau pipeline stream dan worker capture mempublikasikan bersamaan
+    with topic_alias_lock:
+        seq = next(frame_sequence)
+        payloads = split_into_chunks(jpeg_bytes, seq) if CHUNKED_MODE else [jpeg_bytes]
+        if not USE_MQTT_V5:
+            infos = [client.publish(topic, payload) for payload in payloads]
+        else:
+            properties = build_frame_properties(seq, capture_ts, frame_shape)
+            for payload in payloads:
+                sent_topic = aliased_topic(topic, alias, properties)
+                info = client.publish(sent_topic, payload, properties=properties)
+                mark_alias_established(alias, sent_topic, info)
+                infos.append(info)
+    outgoing.track(infos, len(jpeg_bytes))
+    return True
+
+def capture_and_encode():
+    """Mengambil dan meng-encode satu frame baru. Mengembalikan (ts, shape, jpeg) atau None."""
+    capture_ts, frame_rgb = capture_frame()
+    result = encode_frame(frame_rgb)
+    if result is None:
+        logging.warning("Gagal meng-encode frame.")
+        return None
+    jpeg_bytes, frame_shape = result
+    encoded = (capture_ts, frame_shape, jpeg_bytes)
+    set_latest_frame(encoded)
+    return encoded
+
+def publish_single_image():
+    """Mengambil satu frame, meng-encode, dan mempublikasikannya."""
+    try:
+        encoded = capture_and_encode()
+        if encoded is None:
+            return
+        capture_ts, frame_shape, jpeg_bytes = encoded
+        if not publish_frame(jpeg_bytes, capture_ts, frame_shape):
+            logging.warning("Frame dilewati: buffer keluar MQTT penuh.")
+            return
+        logging.info(f"Frame terkirim ({len(jpeg_bytes)} bytes)")
 
     except Exception as e:
         logging.error(f"Error saat mengambil/mengirim gambar: {e}")
 
+def publish_capture_reply(encoded, response_topic, correlation_data):
+    """Mengirim frame hasil capture ke response topic milik peminta (MQTT v5)."""
+    capture_ts, frame_shape, jpeg_bytes = encoded
+    properties = build_frame_properties(None, capture_ts, frame_shape, expiry=False)
+    if correlation_data is not None:
+        properties.CorrelationData = correlation_data
+    client.publish(response_topic, jpeg_bytes, qos=1, properties=properties)
+
+def capture_worker():
+    """
+    Worker berumur panjang yang melayani perintah capture. Semua permintaan yang
+    sedang antre dilayani bersama dengan satu frame: frame stream terbaru jika
+    masih segar, atau satu capture baru. Permintaan dengan response topic (MQTT v5)
+    dibalas ke topik pribadinya beserta correlation data; permintaan lama tanpa
+    response topic dipublikasikan ke IMAGE_TOPIC seperti sebelumnya.
+    """
+    while True:
+        batch = [capture_requests.get()]
+        try:
+            while True:
+                batch.append(capture_requests.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            latest = get_latest_frame()
+            if latest is not None and time.time() - latest[0] <= CAPTURE_MAX_AGE:
+                encoded, source = latest, "frame stream"
+            else:
+                encoded, source = capture_and_encode(), "capture baru"
+            if encoded is None:
+                continue
+            capture_ts, frame_shape, jpeg_bytes = encoded
+            legacy_sent = False
+            for requested_at, response_topic, correlation_data in batch:
+                if response_topic:
+                    publish_capture_reply(encoded, response_topic, correlation_data)
+                elif not legacy_sent:
+                    if not publish_frame(jpeg_bytes, capture_ts, frame_shape):
+                        logging.warning("Capture dilewati: buffer keluar MQTT penuh.")
+                        continue
+                    legacy_sent = True
+                latency_ms = (time.monotonic() - requested_at) * 1000
+                target = response_topic or IMAGE_TOPIC
+                logging.info(f"📸 Capture dilayani dari {source} ke '{target}' dalam {latency_ms:.1f} ms")
+        except Exception as e:
+            logging.error(f"Error di dalam worker capture: {e}")
+
+def retained_latest_publisher():
+    """
+    Mempublikasikan frame terbaru sebagai pesan retained di LATEST_TOPIC dengan
+    laju rendah, agar subscriber baru langsung mendapat gambar dari broker.
+    Jika frame terbaru lebih tua dari LATEST_INTERVAL (stream mati), satu frame
+    baru diambil, sehingga frame retained tidak pernah lebih tua dari sekitar
+    dua kali LATEST_INTERVAL.
+    """
+    last_published_ts = None
+    while True:
+        time.sleep(LATEST_INTERVAL)
+        try:
+            latest = get_latest_frame()
+            if latest is None or time.time() - latest[0] > LATEST_INTERVAL:
+                latest = capture_and_encode()
+            if latest is None or latest[0] == last_published_ts:
+                continue
+            capture_ts, frame_shape, jpeg_bytes = latest
+            if USE_MQTT_V5:
+                # Tanpa message expiry agar frame retained tetap tersedia
+                properties = build_frame_properties(None, capture_ts, frame_shape, expiry=False)
+                client.publish(LATEST_TOPIC, jpeg_bytes, retain=True, properties=properties)
+            else:
+                client.publish(LATEST_TOPIC, jpeg_bytes, retain=True)
+            last_published_ts = capture_ts
+        except Exception as e:
+            logging.error(f"Error saat mempublikasikan frame retained: {e}")
+
 def on_connect(client, userdata, flags, rc, properties=None):
     """Callback yang dipanggil saat berhasil terhubung ke broker."""
+    global topic_alias_maximum
     if rc == 0:
         logging.info("Berhasil terhubung ke Broker MQTT!")
+        # Alias topik hanya berlaku per koneksi, dan dibatasi oleh broker
+        with topic_alias_lock:
+            topic_alias_maximum = getattr(properties, "TopicAliasMaximum", 0) if properties else 0
+            topic_aliases_established.clear()
+        outgoing.clear()
         # Berlangganan ke topik perintah
         client.subscribe(COMMAND_TOPIC)
         logging.info(f"Berlangganan ke topik: '{COMMAND_TOPIC}'")
@@ -76,30 +504,131 @@ def on_message(client, userdata, msg):
             logging.info("⏹️  Streaming dinonaktifkan.")
             client.publish(STATUS_TOPIC, "Streaming OFF")
     elif command == "capture":
-        logging.info("📸 Perintah capture diterima, mengambil gambar di thread terpisah...")
+        logging.info("📸 Perintah capture diterima, diteruskan ke worker capture...")
         client.publish(STATUS_TOPIC, "Capture requested")
-        # Jalankan publish_single_image di thread terpisah untuk menghindari deadlock
-        capture_thread = threading.Thread(target=publish_single_image)
-        capture_thread.start()
+        # Response topic & correlation data (MQTT v5) menentukan ke mana jawaban dikirim
+        properties = getattr(msg, "properties", None)
+        response_topic = getattr(properties, "ResponseTopic", None) if properties else None
+        correlation_data = getattr(properties, "CorrelationData", None) if properties else None
+        # Diproses oleh capture_worker agar tidak memblokir thread jaringan MQTT
+        capture_requests.put((time.monotonic(), response_topic, correlation_data))
 
-def stream_video():
+def capture_stage():
     """
-    Fungsi yang berjalan di thread terpisah untuk mengirim stream video
-    secara terus-menerus jika streaming aktif.
+    Tahap 1: mengambil frame dari kamera dengan pacing berbasis deadline
+    (bebas drift) agar laju capture mendekati 1/FRAME_INTERVAL.
     """
     while True:
         try:
             # Tunggu sampai flag stream_active diaktifkan
-            stream_active.wait() 
-            
-            # Selama flag aktif, terus kirim frame
+            stream_active.wait()
+            next_deadline = time.monotonic()
+
             while stream_active.is_set():
-                publish_single_image()
-                time.sleep(FRAME_INTERVAL) # Kontrol FPS
+                started = time.monotonic()
+                captured = capture_frame()
+                capture_stats.add(time.monotonic() - started)
+                capture_slot.put(captured)
+
+                # Jadwalkan deadline berikutnya dari deadline sebelumnya, bukan dari 'sekarang'
+                next_deadline += FRAME_INTERVAL
+                delay = next_deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                elif delay < -FRAME_INTERVAL:
+                    # Tertinggal lebih dari satu interval: lompati deadline yang terlewat
+                    next_deadline = time.monotonic()
         except Exception as e:
-            logging.error(f"Error di dalam thread streaming: {e}")
+            logging.error(f"Error di dalam tahap capture: {e}")
             time.sleep(2) # Jeda sebelum mencoba lagi
 
+def encode_stage():
+    """
+    Tahap 2: meng-encode frame terbaru dari tahap capture ke JPEG. Jika
+    MOTION_GATING aktif, frame tanpa perubahan dilewati sebelum encode.
+    """
+    while True:
+        captured = capture_slot.get(timeout=0.5)
+        if captured is None:
+            continue
+        capture_ts, frame_rgb = captured
+        try:
+            if MOTION_GATING and not motion_gate.should_send(frame_rgb):
+                continue
+            started = time.monotonic()
+            result = encode_frame(frame_rgb)
+            encode_stats.add(time.monotonic() - started)
+            if result is None:
+                logging.warning("Gagal meng-encode frame.")
+                continue
+            jpeg_bytes, frame_shape = result
+            encoded = (capture_ts, frame_shape, jpeg_bytes)
+            set_latest_frame(encoded)
+            encode_slot.put(encoded)
+        except Exception as e:
+            logging.error(f"Error di dalam tahap encode: {e}")
+
+def publish_stage():
+    """Tahap 3: mempublikasikan frame JPEG terbaru ke broker MQTT."""
+    while True:
+        encoded = encode_slot.get(timeout=0.5)
+        if encoded is None or not stream_active.is_set():
+            continue
+        capture_ts, frame_shape, jpeg_bytes = encoded
+        try:
+            started = time.monotonic()
+            if not publish_frame(jpeg_bytes, capture_ts, frame_shape):
+                continue
+            publish_stats.add(time.monotonic() - started)
+            logging.debug(f"Frame terkirim ({len(jpeg_bytes)} bytes)")
+        except Exception as e:
+            logging.error(f"Error di dalam tahap publish: {e}")
+
+def report_stats():
+    """Mencetak FPS tercapai dan waktu rata-rata per tahap secara berkala."""
+    while True:
+        time.sleep(STATS_INTERVAL)
+        if not stream_active.is_set():
+            continue
+        parts = []
+        published = 0
+        for stats in (capture_stats, encode_stats, publish_stats):
+            count, busy_time = stats.snapshot_and_reset()
+            avg_ms = (busy_time / count * 1000) if count else 0.0
+            parts.append(f"{stats.name} {avg_ms:.1f} ms")
+            if stats is publish_stats:
+                published = count
+        pending_frames, pending_bytes, backpressure_drops = outgoing.snapshot()
+        checked, skipped, detect_time = motion_gate.snapshot_and_reset()
+        if checked:
+            parts.append(
+                f"motion skip {skipped / checked * 100:.0f}% "
+                f"(deteksi {detect_time / checked * 1000:.2f} ms)"
+            )
+        if RATE_CONTROL:
+            achieved_kbps, avg_bytes = rate_controller.snapshot_and_reset()
+            parts.append(
+                f"bitrate {achieved_kbps:.0f}/{TARGET_KBPS} kbps "
+                f"(q={rate_controller.quality}, skala={rate_controller.scale}, {avg_bytes / 1024:.1f} KB/frame)"
+            )
+        logging.info(
+            f"[stats] FPS tercapai: {published / STATS_INTERVAL:.1f} "
+            f"(target {1 / FRAME_INTERVAL:.0f}) | " + " | ".join(parts) +
+            f" | drop capture->encode: {capture_slot.dropped}, encode->publish: {encode_slot.dropped}"
+            f" | antrean keluar: {pending_frames} frame / {pending_bytes / 1024:.0f} KB"
+            f" (puncak {outgoing.peak_frames} / {outgoing.peak_bytes / 1024:.0f} KB)"
+            f", drop backpressure: {backpressure_drops}"
+        )
+
+def stream_video():
+    """
+    Menjalankan pipeline streaming capture -> encode -> publish, masing-masing
+    di thread terpisah dan dihubungkan oleh slot 'latest-wins', sehingga encode
+    frame N dapat berjalan bersamaan dengan capture frame N+1.
+    """
+    for stage in (capture_stage, encode_stage, publish_stage, report_stats):
+        threading.Thread(target=stage, daemon=True).start()
+
 def main():
     """Fungsi utama untuk menjalankan publisher."""
     global client
@@ -107,7 +636,8 @@ def main():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     
     # Menggunakan Client v2 untuk menghindari DeprecationWarning
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    protocol = mqtt.MQTTv5 if USE_MQTT_V5 else mqtt.MQTTv311
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, protocol=protocol)
     client.on_connect = on_connect
     client.on_message = on_message
 
@@ -115,9 +645,11 @@ def main():
         logging.info(f"Menghubungkan ke broker MQTT di {MQTT_BROKER}...")
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
         
-        # Mulai thread untuk streaming di latar belakang
-        streaming_thread = threading.Thread(target=stream_video, daemon=True)
-        streaming_thread.start()
+        # Mulai thread pipeline streaming, worker capture, dan frame retained di latar belakang
+        stream_video()
+        # Satu worker cukup: permintaan yang antre bersamaan dilayani dengan satu frame
+        threading.Thread(target=capture_worker, daemon=True).start()
+        threading.Thread(target=retained_latest_publisher, daemon=True).start()
         
         # Jalankan loop MQTT di thread utama (blocking)
         client.loop_forever()
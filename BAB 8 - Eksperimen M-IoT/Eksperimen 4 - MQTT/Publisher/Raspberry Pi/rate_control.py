@@ -0,0 +1,144 @@
+import sys
+import threading
+import time
+
+class JpegRateController:
+    """
+    Pengendali loop tertutup untuk kualitas JPEG (dan opsional skala resolusi)
+    agar ukuran frame mengikuti anggaran bitrate/byte per frame.
+
+    Ukuran frame dihaluskan dengan EMA, lalu kualitas hanya diubah jika
+    galat berada di luar deadband, dengan langkah yang dibatasi agar tidak
+    berosilasi. Jika kualitas sudah di batas bawah dan frame masih terlalu
+    besar, resolusi diturunkan satu tingkat (dan dinaikkan kembali saat
+    kualitas sudah di batas atas dengan sisa anggaran).
+
+    Modul ini hanya bergantung pada pustaka standar sehingga bisa disalin ke
+    server Pi lain (CoAP, HTTP) dan dipakai dengan cara yang sama:
+    `quality`/`scale` dibaca sebelum encode, `update(ukuran)` dipanggil sesudahnya.
+    """
+    SCALES = (1.0, 0.75, 0.5)
+
+    def __init__(self, target_kbps=None, fps=20.0, bytes_per_frame=None,
+                 initial_quality=85, min_quality=30, max_quality=90,
+                 smoothing=0.2, deadband=0.1, max_step=5, allow_resize=False,
+                 resize_patience=10):
+        if bytes_per_frame is None:
+            if target_kbps is None:
+                raise ValueError("target_kbps atau bytes_per_frame harus diisi")
+            bytes_per_frame = target_kbps * 1000 / 8 / fps
+        self.target_bytes = float(bytes_per_frame)
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.smoothing = smoothing
+        self.deadband = deadband
+        self.max_step = max_step
+        self.allow_resize = allow_resize
+        self.resize_patience = resize_patience
+        self.lock = threading.Lock()
+        self.quality = max(min_quality, min(max_quality, initial_quality))
+        self.scale_index = 0
+        self.smoothed_size = None
+        self.saturated_frames = 0
+        # Statistik bitrate tercapai sejak snapshot terakhir
+        self.window_bytes = 0
+        self.window_frames = 0
+        self.window_start = time.monotonic()
+
+    @property
+    def scale(self):
+        return self.SCALES[self.scale_index]
+
+    def update(self, frame_size):
+        """Memperbarui kualitas/skala berdasarkan ukuran frame JPEG terakhir (byte)."""
+        with self.lock:
+            self.window_bytes += frame_size
+            self.window_frames += 1
+            if self.smoothed_size is None:
+                self.smoothed_size = float(frame_size)
+            else:
+                self.smoothed_size += self.smoothing * (frame_size - self.smoothed_size)
+
+            error = (self.target_bytes - self.smoothed_size) / self.target_bytes
+            if abs(error) > self.deadband:
+                step = max(-self.max_step, min(self.max_step, round(error * 10)))
+                if step == 0:
+                    step = 1 if error > 0 else -1
+                self.quality = max(self.min_quality, min(self.max_quality, self.quality + step))
+            if self.allow_resize:
+                self._update_scale(error)
+
+    def _update_scale(self, error):
+        """Mengubah skala resolusi jika kualitas sudah jenuh terlalu lama."""
+        too_big = error < -self.deadband and self.quality == self.min_quality
+        too_small = error > self.deadband and self.quality == self.max_quality
+        if too_big or too_small:
+            self.saturated_frames += 1
+        else:
+            self.saturated_frames = 0
+        if self.saturated_frames < self.resize_patience:
+            return
+        self.saturated_frames = 0
+        if too_big and self.scale_index < len(self.SCALES) - 1:
+            self.scale_index += 1
+            self.smoothed_size = None
+        elif too_small and self.scale_index > 0:
+            self.scale_index -= 1
+            self.smoothed_size = None
+
+    def snapshot_and_reset(self):
+        """Mengembalikan (kbps tercapai, byte rata-rata per frame) sejak panggilan terakhir."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.window_start
+            kbps = self.window_bytes * 8 / 1000 / elapsed if elapsed > 0 else 0.0
+            avg_bytes = self.window_bytes / self.window_frames if self.window_frames else 0.0
+            self.window_bytes, self.window_frames, self.window_start = 0, 0, now
+        return kbps, avg_bytes
+
+def main():
+    """
+    Menguji pengendali pada rekaman video: setiap frame di-encode dengan
+    kualitas dari pengendali, lalu bitrate tercapai dibandingkan dengan target.
+    """
+    import cv2
+
+    if len(sys.argv) < 3:
+        print("Penggunaan: python rate_control.py [FILE_VIDEO] [TARGET_KBPS] [FPS]")
+        return
+    path = sys.argv[1]
+    target_kbps = float(sys.argv[2])
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"Gagal membuka video: {path}")
+        return
+    controller = JpegRateController(target_kbps=target_kbps, fps=fps, allow_resize=True)
+    sizes = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if controller.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=controller.scale, fy=controller.scale,
+                               interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), controller.quality])
+        if not ret:
+            continue
+        sizes.append(len(buffer))
+        controller.update(len(buffer))
+    cap.release()
+
+    if not sizes:
+        print("Tidak ada frame yang di-encode.")
+        return
+    achieved_kbps = sum(sizes) * 8 / 1000 / (len(sizes) / fps)
+    print(f"Frame: {len(sizes)}")
+    print(f"Target bitrate: {target_kbps:.0f} kbps ({controller.target_bytes:.0f} byte/frame)")
+    print(f"Bitrate tercapai: {achieved_kbps:.0f} kbps ({sum(sizes) / len(sizes):.0f} byte/frame)")
+    print(f"Ukuran frame min/maks: {min(sizes)} / {max(sizes)} byte")
+    print(f"Kualitas akhir: {controller.quality}, skala akhir: {controller.scale}")
+
+if __name__ == '__main__':
+    main()
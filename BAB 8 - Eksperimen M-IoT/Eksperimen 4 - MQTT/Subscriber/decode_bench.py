@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from decode_pool import DecodePool
+
+def make_synthetic_jpegs(width, height, count, quality=85):
+    """Membuat beberapa frame JPEG sintetis (gradien + noise) agar ukuran mirip frame kamera."""
+    rng = np.random.default_rng(0)
+    base = np.zeros((height, width, 3), np.uint8)
+    base[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)
+    base[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    frames = []
+    for i in range(count):
+        noise = rng.integers(0, 40, (height, width, 3), dtype=np.uint8)
+        img = cv2.add(base, noise)
+        cv2.putText(img, f"CAM {i}", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        ret, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        frames.append(buffer.tobytes())
+    return frames
+
+def run(workers, payloads, shape, duration):
+    """Mengukur frame terdecode per detik untuk jumlah worker tertentu."""
+    pool = DecodePool(workers, slots=workers * 2, max_shape=shape)
+    try:
+        decoded = 0
+        i = 0
+        started = time.monotonic()
+        while time.monotonic() - started < duration:
+            # Isi semua slot kosong, lalu kumpulkan hasil (meniru 50+ kamera yang selalu punya frame baru)
+            while pool.submit(i % len(payloads), payloads[i % len(payloads)]):
+                i += 1
+            for _, frame, slot in pool.poll(timeout=0.05):
+                decoded += 1
+                del frame
+                pool.release(slot)
+        elapsed = time.monotonic() - started
+    finally:
+        pool.close()
+    return decoded / elapsed
+
+def main():
+    """
+    Benchmark skala decode: frame terdecode/detik untuk 1..N worker.
+    Penggunaan: python decode_bench.py [LEBAR] [TINGGI] [DURASI_DETIK]
+    """
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 640
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 480
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    payloads = make_synthetic_jpegs(width, height, 16)
+    shape = (height, width, 3)
+    print(f"Resolusi {width}x{height}, rata-rata JPEG {sum(map(len, payloads)) / len(payloads) / 1024:.1f} KB")
+    print(f"{'worker':>6} | {'frame/s':>8} | {'skala':>5}")
+    baseline = None
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        fps = run(workers, payloads, shape, duration)
+        baseline = baseline or fps
+        print(f"{workers:>6} | {fps:>8.1f} | {fps / baseline:>5.2f}x")
+
+if __name__ == '__main__':
+    main()
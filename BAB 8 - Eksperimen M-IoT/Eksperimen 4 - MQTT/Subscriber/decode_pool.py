@@ -0,0 +1,100 @@
+import multiprocessing as mp
+import queue
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+
+def _attach_shared_memory(name):
+    """Membuka blok shared memory yang sudah ada tanpa didaftarkan ulang ke resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 belum mendukung argumen track
+        return shared_memory.SharedMemory(name=name)
+
+def _decode_worker(shm_name, slot_bytes, tasks, results):
+    """Proses worker: decode JPEG lalu tulis hasilnya langsung ke slot shared memory."""
+    cv2.setNumThreads(1) # Paralelisme berasal dari jumlah proses, bukan thread OpenCV
+    shm = _attach_shared_memory(shm_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, key, payload = task
+            img = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+            if img is None or img.nbytes > slot_bytes:
+                results.put((slot, key, None))
+                continue
+            dst = np.ndarray(img.shape, np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            dst[...] = img
+            del dst
+            results.put((slot, key, img.shape))
+    finally:
+        shm.close()
+
+class DecodePool:
+    """
+    Decode JPEG paralel di beberapa proses. Payload JPEG (kecil) dikirim lewat
+    antrean, sedangkan hasil decode (besar) ditulis ke slot shared memory
+    sehingga tidak perlu disalin melalui pipe. Slot dipinjam saat `submit()`
+    dan harus dikembalikan dengan `release()` setelah frame selesai dipakai.
+    """
+    def __init__(self, workers, slots, max_shape):
+        self.slot_bytes = int(np.prod(max_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        self.free_slots = list(range(slots))
+        self.failed = 0
+        self.tasks = mp.Queue()
+        self.results = mp.Queue()
+        self.processes = [
+            mp.Process(target=_decode_worker,
+                       args=(self.shm.name, self.slot_bytes, self.tasks, self.results),
+                       daemon=True)
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def submit(self, key, payload):
+        """Mengirim satu payload JPEG untuk di-decode. False jika semua slot sedang dipakai."""
+        if not self.free_slots:
+            return False
+        slot = self.free_slots.pop()
+        self.tasks.put((slot, key, payload))
+        return True
+
+    def poll(self, timeout=0.0):
+        """
+        Mengambil hasil decode yang sudah selesai sebagai list (key, frame, slot).
+        `frame` adalah view NumPy ke shared memory (tanpa salinan).
+        """
+        done = []
+        block = timeout > 0
+        while True:
+            try:
+                slot, key, shape = self.results.get(block, timeout) if block else self.results.get_nowait()
+            except queue.Empty:
+                return done
+            block = False
+            if shape is None:
+                self.failed += 1
+                self.release(slot)
+                continue
+            frame = np.ndarray(shape, np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+            done.append((key, frame, slot))
+
+    def release(self, slot):
+        """Mengembalikan slot ke pool setelah frame tidak dipakai lagi."""
+        self.free_slots.append(slot)
+
+    def close(self):
+        """Menghentikan worker dan membebaskan shared memory."""
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.shm.close()
+        self.shm.unlink()
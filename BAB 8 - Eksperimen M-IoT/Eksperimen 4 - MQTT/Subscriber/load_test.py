@@ -0,0 +1,429 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import cv2
+import threading
+import numpy as np
+import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+from decode_pool import DecodePool
+
+# --- KONFIGURASI (bisa ditimpa lewat argumen, nilai berkoma = sweep) ---
+BROKER_HOST = "127.0.0.1"
+BROKER_PORT = 18830 # Port mosquitto lokal yang dijalankan harness
+PUBLISHERS = [1, 2, 4] # Jumlah publisher sintetis (kamera)
+SUBSCRIBERS = [1] # Jumlah subscriber
+FPS = [20.0] # Target FPS per publisher (0 = secepat mungkin)
+QOS = [0] # QoS publish dan subscribe
+RESOLUTION = (640, 480)
+JPEG_QUALITY = 85
+DURATION = 10.0 # Detik pengukuran per konfigurasi
+DRAIN_TIME = 1.0 # Detik menunggu pesan yang masih di jalan setelah publisher berhenti
+DECODE = False # Subscriber ikut decode JPEG (meniru beban subscriber sungguhan)
+# Worker DecodePool di subscriber (seperti --workers di main.py); 0 = decode di
+# thread subscriber itu sendiri. Nilai > 0 otomatis mengaktifkan decode.
+WORKERS = [0]
+MAX_QUEUED_MESSAGES = 50 # Batas antrean paho; hanya berlaku untuk QoS > 0
+TOPIC_PREFIX = "bench"
+
+class SyntheticCamera:
+    """
+    Pengganti Picamera2: frame RGB dengan latar noise tetap dan kotak yang
+    bergerak, sehingga ukuran JPEG dan biaya encode mirip frame kamera.
+    """
+    def __init__(self, width, height, camera_index):
+        rng = np.random.default_rng(camera_index)
+        self.frame = np.zeros((height, width, 3), np.uint8)
+        self.frame[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)
+        self.frame[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+        self.frame = cv2.add(self.frame, rng.integers(0, 40, (height, width, 3), dtype=np.uint8))
+        self.background = self.frame.copy()
+        self.box = max(16, height // 6)
+        self.position = 0
+
+    def capture_array(self):
+        """Mengembalikan frame berikutnya (kotak bergeser setiap panggilan)."""
+        height, width = self.frame.shape[:2]
+        x = self.position % max(1, width - self.box)
+        self.position += 8
+        np.copyto(self.frame, self.background)
+        self.frame[height // 3:height // 3 + self.box, x:x + self.box] = 255
+        return self.frame
+
+def build_frame_properties(seq, capture_ts, frame_shape):
+    """Metadata frame dengan format yang sama seperti publisher Raspberry Pi (seq, ts, res)."""
+    height, width = frame_shape[:2]
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.UserProperty = [
+        ("seq", str(seq)),
+        ("ts", f"{capture_ts:.6f}"),
+        ("res", f"{width}x{height}"),
+    ]
+    return properties
+
+def make_client(role):
+    """Client MQTT v5 dengan client ID unik per proses."""
+    return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"bench-{role}-{os.getpid()}",
+                       protocol=mqtt.MQTTv5)
+
+def publisher_process(index, config, start, stop, results):
+    """
+    Satu kamera sintetis, meniru `publish_single_image`: ambil frame, encode
+    JPEG, lalu publish ke topiknya sendiri dengan pacing berbasis deadline.
+    """
+    cv2.setNumThreads(1)
+    width, height = config["resolution"]
+    camera = SyntheticCamera(width, height, index)
+    topic = f"{TOPIC_PREFIX}/cam{index}/image"
+    client = make_client("pub")
+    client.max_queued_messages_set(MAX_QUEUED_MESSAGES)
+    client.connect(config["host"], config["port"], 60)
+    client.loop_start()
+
+    sent = rejected = sent_bytes = 0
+    interval = 1.0 / config["fps"] if config["fps"] > 0 else 0.0
+    start.wait()
+    next_deadline = time.monotonic()
+    for seq in itertools.count(1):
+        if stop.is_set():
+            break
+        capture_ts = time.time()
+        frame_rgb = camera.capture_array()
+        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+        ret, buffer = cv2.imencode('.jpg', frame_bgr, [int(cv2.IMWRITE_JPEG_QUALITY), config["quality"]])
+        if ret:
+            info = client.publish(topic, buffer.tobytes(), qos=config["qos"],
+                                  properties=build_frame_properties(seq, capture_ts, frame_rgb.shape))
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                sent += 1
+                sent_bytes += len(buffer)
+            else:
+                # Antrean paho penuh (backpressure) atau koneksi terputus
+                rejected += 1
+        if interval:
+            next_deadline += interval
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                next_deadline = time.monotonic()
+
+    client.loop_stop()
+    client.disconnect()
+    results.put(("pub", {"sent": sent, "rejected": rejected, "bytes": sent_bytes}))
+
+def decode_loop(config, pending, pending_lock, counters, latencies, stop):
+    """
+    Meniru display_loop di main.py (tanpa tampilan): payload terbaru per kamera
+    diambil dari `pending` (latest-wins), didekode langsung atau lewat DecodePool,
+    dan latensi dicatat saat frame selesai didekode.
+    """
+    workers = config["workers"]
+    pool = DecodePool(workers, slots=workers * 2, max_shape=(*config["resolution"][::-1], 3)) if workers else None
+    backlog = {}
+    try:
+        while not stop.is_set():
+            with pending_lock:
+                items = list(pending.items())
+                pending.clear()
+            if not items and not pool:
+                time.sleep(0.002)
+            for topic, (capture_ts, payload) in items:
+                if pool:
+                    if backlog.pop(topic, None) is not None:
+                        counters["overwritten"] += 1
+                    backlog[topic] = (capture_ts, payload)
+                    continue
+                if cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR) is not None:
+                    counters["decoded"] += 1
+                    if capture_ts is not None:
+                        latencies.append((time.time() - capture_ts) * 1000)
+            if not pool:
+                continue
+            while backlog:
+                topic = next(iter(backlog))
+                capture_ts, payload = backlog[topic]
+                if not pool.submit(capture_ts, payload):
+                    break
+                del backlog[topic]
+            for capture_ts, img, slot in pool.poll(timeout=0.002):
+                counters["decoded"] += 1
+                if capture_ts is not None:
+                    latencies.append((time.time() - capture_ts) * 1000)
+                del img
+                pool.release(slot)
+    finally:
+        if pool:
+            pool.close()
+
+def subscriber_process(config, ready, stop, results):
+    """
+    Subscriber yang mencatat jumlah frame diterima dan latensi end-to-end (saat
+    diterima, atau saat selesai didekode jika decode aktif).
+    """
+    latencies = []
+    counters = {"received": 0, "decoded": 0, "overwritten": 0}
+    # Payload terbaru per topik yang menunggu decode: topik -> (ts capture, payload)
+    pending = {}
+    pending_lock = threading.Lock()
+
+    def on_connect(client, userdata, flags, reason_code, properties):
+        client.subscribe(f"{TOPIC_PREFIX}/+/image", qos=config["qos"])
+
+    def on_subscribe(client, userdata, mid, reason_codes, properties):
+        ready.set()
+
+    def on_message(client, userdata, msg):
+        now = time.time()
+        properties = getattr(msg, "properties", None)
+        metadata = dict(getattr(properties, "UserProperty", None) or [])
+        counters["received"] += 1
+        # Publisher dan subscriber berjalan di mesin yang sama: jam identik
+        capture_ts = float(metadata["ts"]) if "ts" in metadata else None
+        if config["decode"]:
+            with pending_lock:
+                if msg.topic in pending:
+                    counters["overwritten"] += 1
+                pending[msg.topic] = (capture_ts, msg.payload)
+        elif capture_ts is not None:
+            latencies.append((now - capture_ts) * 1000)
+
+    cv2.setNumThreads(1)
+    client = make_client("sub")
+    client.on_connect = on_connect
+    client.on_subscribe = on_subscribe
+    client.on_message = on_message
+    client.connect(config["host"], config["port"], 60)
+    client.loop_start()
+    if config["decode"]:
+        decode_loop(config, pending, pending_lock, counters, latencies, stop)
+    else:
+        stop.wait()
+    client.loop_stop()
+    client.disconnect()
+    results.put(("sub", {**counters, "latencies": latencies}))
+
+class BrokerProcess:
+    """Menjalankan mosquitto lokal dan mengukur pemakaian CPU-nya dari /proc."""
+    def __init__(self, port):
+        executable = shutil.which("mosquitto")
+        if executable is None:
+            raise RuntimeError("mosquitto tidak ditemukan. Pasang dengan: sudo apt install mosquitto")
+        self.config_dir = tempfile.TemporaryDirectory()
+        config_path = os.path.join(self.config_dir.name, "mosquitto.conf")
+        with open(config_path, "w") as f:
+            f.write(f"listener {port} 127.0.0.1\n")
+            f.write("allow_anonymous true\n")
+            f.write("persistence false\n")
+        self.process = subprocess.Popen([executable, "-c", config_path],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._wait_until_listening(port)
+        self.cpu_start = None
+        self.wall_start = None
+
+    def _wait_until_listening(self, port, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("mosquitto berhenti saat dijalankan (port sudah dipakai?)")
+            try:
+                with socket.create_connection((BROKER_HOST, port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"mosquitto tidak mendengarkan di port {port}")
+
+    def _cpu_seconds(self):
+        """Waktu CPU (user + system) proses broker, dalam detik."""
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            # Nama proses bisa berisi spasi; field sesudah ')' dimulai dari field ke-3
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def start_measurement(self):
+        self.cpu_start = self._cpu_seconds()
+        self.wall_start = time.monotonic()
+
+    def cpu_percent(self):
+        """CPU broker (% dari satu core) sejak start_measurement()."""
+        elapsed = time.monotonic() - self.wall_start
+        return (self._cpu_seconds() - self.cpu_start) / elapsed * 100 if elapsed > 0 else 0.0
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.config_dir.cleanup()
+
+def run_scenario(config, broker):
+    """Menjalankan satu konfigurasi dan mengembalikan satu baris hasil (dict)."""
+    start, stop_publishers, stop_subscribers = mp.Event(), mp.Event(), mp.Event()
+    results = mp.Queue()
+    subscribers = []
+    for _ in range(config["subscribers"]):
+        ready = mp.Event()
+        # Bukan daemon: subscriber dengan --workers menjalankan proses DecodePool sendiri
+        process = mp.Process(target=subscriber_process, args=(config, ready, stop_subscribers, results))
+        process.start()
+        subscribers.append((process, ready))
+    for process, ready in subscribers:
+        if not ready.wait(10):
+            raise RuntimeError("Subscriber tidak berhasil berlangganan ke broker")
+    publishers = [
+        mp.Process(target=publisher_process, args=(i, config, start, stop_publishers, results), daemon=True)
+        for i in range(config["publishers"])
+    ]
+    for process in publishers:
+        process.start()
+
+    # Beri waktu publisher terhubung, lalu mulai semua publisher bersamaan
+    time.sleep(0.5)
+    if broker:
+        broker.start_measurement()
+    start.set()
+    started = time.monotonic()
+    time.sleep(config["duration"])
+    stop_publishers.set()
+    elapsed = time.monotonic() - started
+    time.sleep(DRAIN_TIME)
+    broker_cpu = broker.cpu_percent() if broker else None
+    stop_subscribers.set()
+
+    pub_results, sub_results = [], []
+    for _ in range(len(publishers) + len(subscribers)):
+        try:
+            kind, data = results.get(timeout=10)
+        except queue.Empty:
+            break
+        (pub_results if kind == "pub" else sub_results).append(data)
+    for process in publishers + [p for p, _ in subscribers]:
+        process.join(timeout=2)
+        if process.is_alive():
+            process.terminate()
+
+    sent = sum(r["sent"] for r in pub_results)
+    rejected = sum(r["rejected"] for r in pub_results)
+    received = sum(r["received"] for r in sub_results)
+    decoded = sum(r["decoded"] for r in sub_results)
+    # Setiap frame yang dicoba dikirim seharusnya diterima oleh setiap subscriber
+    expected = (sent + rejected) * config["subscribers"]
+    latencies = np.array([x for r in sub_results for x in r["latencies"]])
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if latencies.size else (np.nan,) * 3
+    n_streams = config["publishers"] * max(1, config["subscribers"])
+    return {
+        **config,
+        "pub_fps": sent / elapsed / config["publishers"],
+        "delivered_fps": received / elapsed / n_streams,
+        "decoded_fps": decoded / elapsed / n_streams if config["decode"] else None,
+        "latency": (p50, p95, p99),
+        "broker_cpu": broker_cpu,
+        "drop": 1 - received / expected if expected else 0.0,
+        "rejected": rejected,
+        "size_kb": sum(r["bytes"] for r in pub_results) / sent / 1024 if sent else 0.0,
+    }
+
+def print_header():
+    print(f"{'pub':>4} {'sub':>4} {'qos':>3} {'target':>6} {'worker':>6} | {'pub fps':>7} {'terima fps':>10} "
+          f"{'dekode fps':>10} | {'latensi p50/p95/p99 (ms)':>24} | {'CPU broker':>10} | {'drop':>6} "
+          f"{'ditolak':>7} | {'KB/frame':>8}")
+    print("-" * 130)
+
+def print_row(row):
+    latency = "/".join(f"{x:.0f}" for x in row["latency"])
+    cpu = f"{row['broker_cpu']:.0f}%" if row["broker_cpu"] is not None else "n/a"
+    target = f"{row['fps']:.0f}" if row["fps"] > 0 else "maks"
+    workers = row["workers"] if row["decode"] else "-"
+    decoded = f"{row['decoded_fps']:.1f}" if row["decoded_fps"] is not None else "-"
+    print(f"{row['publishers']:>4} {row['subscribers']:>4} {row['qos']:>3} {target:>6} {workers:>6} | "
+          f"{row['pub_fps']:>7.1f} {row['delivered_fps']:>10.1f} {decoded:>10} | {latency:>24} | {cpu:>10} | "
+          f"{row['drop'] * 100:>5.1f}% {row['rejected']:>7} | {row['size_kb']:>8.1f}")
+
+def parse_list(value, cast):
+    return [cast(x) for x in value.split(",")]
+
+def main():
+    """
+    Uji beban eksperimen MQTT tanpa kamera: N publisher sintetis dan M subscriber
+    di broker mosquitto lokal. Setiap kombinasi nilai berkoma dijalankan sebagai
+    satu baris tabel.
+    """
+    args = sys.argv[1:]
+    if args and args[0] in ['-h', '--help']:
+        print("Penggunaan: python load_test.py [opsi]")
+        print("\nOpsi (nilai berkoma = sweep):")
+        print("  --publishers N[,N..]  Jumlah kamera sintetis (default 1,2,4).")
+        print("  --subscribers M[,M..] Jumlah subscriber (default 1).")
+        print("  --fps F[,F..]         Target FPS per kamera, 0 = secepat mungkin (default 20).")
+        print("  --qos Q[,Q..]         QoS 0/1/2 (default 0).")
+        print("  --res LEBARxTINGGI    Resolusi frame (default 640x480).")
+        print("  --quality Q           Kualitas JPEG (default 85).")
+        print("  --duration DETIK      Lama pengukuran per baris (default 10).")
+        print("  --decode              Subscriber ikut decode JPEG (latensi diukur setelah decode).")
+        print("  --workers W[,W..]     Proses DecodePool per subscriber, 0 = decode di subscriber")
+        print("                        (mengaktifkan --decode; default 0).")
+        print("  --broker HOST[:PORT]  Pakai broker yang sudah berjalan (CPU broker tidak diukur).")
+        print("\nContoh:")
+        print("  python load_test.py --publishers 1,4,8,16 --fps 20 --res 1280x720")
+        print("  python load_test.py --publishers 8 --fps 0 --workers 0,1,2,4")
+        return
+
+    options = {}
+    i = 0
+    while i < len(args):
+        if args[i] == "--decode":
+            options["decode"] = True
+            i += 1
+        else:
+            options[args[i].lstrip("-")] = args[i + 1]
+            i += 2
+
+    host, port, external = BROKER_HOST, BROKER_PORT, "broker" in options
+    if external:
+        host, _, port_text = options["broker"].partition(":")
+        port = int(port_text) if port_text else 1883
+    width, height = (int(x) for x in options.get("res", f"{RESOLUTION[0]}x{RESOLUTION[1]}").split("x"))
+    base = {
+        "host": host,
+        "port": port,
+        "resolution": (width, height),
+        "quality": int(options.get("quality", JPEG_QUALITY)),
+        "duration": float(options.get("duration", DURATION)),
+        "decode": options.get("decode", DECODE),
+    }
+    if "workers" in options:
+        base["decode"] = True
+    sweep = itertools.product(
+        parse_list(options["publishers"], int) if "publishers" in options else PUBLISHERS,
+        parse_list(options["subscribers"], int) if "subscribers" in options else SUBSCRIBERS,
+        parse_list(options["qos"], int) if "qos" in options else QOS,
+        parse_list(options["fps"], float) if "fps" in options else FPS,
+        parse_list(options["workers"], int) if "workers" in options else WORKERS,
+    )
+
+    broker = None if external else BrokerProcess(port)
+    try:
+        print(f"Resolusi {width}x{height}, kualitas JPEG {base['quality']}, "
+              f"{base['duration']:.0f} detik per baris, broker {host}:{port}")
+        print_header()
+        for publishers, subscribers, qos, fps, workers in sweep:
+            config = {**base, "publishers": publishers, "subscribers": subscribers, "qos": qos, "fps": fps,
+                      "workers": workers}
+            print_row(run_scenario(config, broker))
+    except KeyboardInterrupt:
+        print("\nUji beban dihentikan oleh pengguna.")
+    finally:
+        if broker:
+            broker.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,95 +1,449 @@
 import cv2
 import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
 import numpy as np
+import math
+import struct
+import threading
 import time
 import sys
+import uuid
 from datetime import datetime
+from stream_stats import RollingStats, StatsExporter, format_summary
+from decode_pool import DecodePool
 
 # --- KONFIGURASI ---
 MQTT_BROKER = "172.20.10.5"  # Ganti dengan IP Broker MQTT Anda
 MQTT_PORT = 1883
-IMAGE_TOPIC = "camera/image"
+IMAGE_TOPIC = "camera/image" # Boleh wildcard '+' untuk banyak kamera, misal camera/+/image (--topic)
 STATUS_TOPIC = "camera/status"
 COMMAND_TOPIC = "camera/command"
+CHUNK_SUFFIX = "/chunk" # Frame terpotong dari publisher (CHUNKED_MODE) ada di IMAGE_TOPIC + CHUNK_SUFFIX
+# MQTT v5 diperlukan untuk menerima metadata frame (seq, ts, res) dari publisher
+USE_MQTT_V5 = True
+# Penyusunan ulang frame terpotong
+CHUNK_HEADER = struct.Struct(">IHH") # frame_id (uint32), indeks (uint16), total (uint16)
+REASSEMBLY_MAX_FRAMES = 8 # Frame tidak lengkap yang disimpan bersamaan
+REASSEMBLY_TIMEOUT = 1.0 # Detik sebelum frame tidak lengkap dibuang
+HEADLESS = False # Tanpa jendela video (bisa diaktifkan dengan argumen --headless)
+STATS_INTERVAL = 5.0 # Detik antar laporan penghitung frame pada mode headless
+STATS_WINDOW = 120 # Jumlah sampel terakhir untuk statistik bergulir
+EXPORT_PATH = None # File ekspor statistik (.csv atau .jsonl), bisa diisi dengan --export
+EXPORT_INTERVAL = 5.0 # Detik antar baris ekspor statistik
+# Decode paralel (multi-kamera): 0 = decode di thread tampilan, >0 = jumlah proses worker (--workers)
+DECODE_WORKERS = 0
+DECODE_MAX_SHAPE = (1080, 1920, 3) # Ukuran maksimum frame terdecode per slot shared memory
+MOSAIC_TILE = (320, 240) # Ukuran satu petak tampilan multi-kamera (lebar, tinggi)
+MOSAIC_INTERVAL = 0.1 # Detik antar render mosaik multi-kamera
+# Capture request/response (MQTT v5): jawaban dikirim ke topik pribadi REPLY_TOPIC_PREFIX + <uuid>
+REPLY_TOPIC_PREFIX = "camera/reply/"
+CAPTURE_TIMEOUT = 15.0 # Detik menunggu semua jawaban capture
+CAPTURE_COUNT = 1 # Jumlah permintaan capture bersamaan (--count)
+# Dengan MQTT v5 hanya jawaban ber-correlation data yang diterima. Publisher lama (ESP32)
+# menjawab capture di IMAGE_TOPIC tanpa correlation data; aktifkan ini untuk menerimanya
+# sebagai jawaban permintaan tertua (--legacy-capture). Tanpa v5 selalu aktif.
+LEGACY_CAPTURE = False
 
 # --- VARIABEL GLOBAL ---
-frame_count = 0
+frames_displayed = 0
+# Payload yang tertimpa saat menunggu slot DecodePool kosong
+backlog_dropped = 0
+stop_display = threading.Event()
 start_time = 0
-last_frame_time = 0
-fps_samples = []
-# Variabel untuk menandakan bahwa gambar untuk capture sudah diterima
-image_for_capture_received = False 
-
-def calculate_fps():
-    """Menghitung FPS rata-rata dari beberapa sampel terakhir."""
-    global last_frame_time, fps_samples
-    current_time = time.time()
-    if last_frame_time > 0:
-        frame_interval = current_time - last_frame_time
-        if frame_interval > 0:
-            fps = 1.0 / frame_interval
-            fps_samples.append(fps)
-            if len(fps_samples) > 20:
-                fps_samples.pop(0)
-            last_frame_time = current_time
-            return sum(fps_samples) / len(fps_samples)
-    last_frame_time = current_time
-    return 0.0
-
-def on_connect(client, userdata, flags, rc):
+# Permintaan capture yang menunggu jawaban, dengan kunci correlation data
+capture_requests = {}
+# SUBACK yang sudah diterima (mid), agar perintah capture baru dikirim setelah reply topic aktif
+subscribed_mids = set()
+subscribe_condition = threading.Condition()
+# Status per kamera, dengan kunci ID kamera dari topik
+cameras = {}
+cameras_lock = threading.Lock()
+
+class FrameReassembler:
+    """
+    Menyusun kembali frame dari potongan (header frame_id, indeks, total).
+    Buffer dibatasi REASSEMBLY_MAX_FRAMES; frame yang tidak lengkap setelah
+    REASSEMBLY_TIMEOUT atau yang tergeser oleh frame baru dibuang.
+    """
+    def __init__(self, max_frames, timeout):
+        self.max_frames = max_frames
+        self.timeout = timeout
+        # frame_id -> [waktu potongan pertama, total, list potongan, jumlah diterima]
+        self.frames = {}
+        self.completed = 0
+        self.dropped_incomplete = 0
+
+    def _evict(self, now):
+        expired = [fid for fid, entry in self.frames.items() if now - entry[0] > self.timeout]
+        for fid in expired:
+            del self.frames[fid]
+        self.dropped_incomplete += len(expired)
+        while len(self.frames) >= self.max_frames:
+            # Dict mempertahankan urutan penyisipan: entri pertama adalah yang tertua
+            del self.frames[next(iter(self.frames))]
+            self.dropped_incomplete += 1
+
+    def add(self, chunk):
+        """Menambahkan satu potongan. Mengembalikan bytes frame jika sudah lengkap, atau None."""
+        if len(chunk) < CHUNK_HEADER.size:
+            return None
+        frame_id, index, total = CHUNK_HEADER.unpack_from(chunk)
+        if total == 0 or index >= total:
+            return None
+        now = time.time()
+        entry = self.frames.get(frame_id)
+        if entry is not None and entry[1] != total:
+            # frame_id dipakai ulang dengan total berbeda (misalnya publisher
+            # restart): potongan lama tidak akan pernah lengkap, buang
+            del self.frames[frame_id]
+            self.dropped_incomplete += 1
+            entry = None
+        if entry is None:
+            self._evict(now)
+            entry = [now, total, [None] * total, 0]
+            self.frames[frame_id] = entry
+        parts = entry[2]
+        if parts[index] is None:
+            parts[index] = chunk[CHUNK_HEADER.size:]
+            entry[3] += 1
+        if entry[3] < entry[1]:
+            return None
+        del self.frames[frame_id]
+        self.completed += 1
+        return b"".join(parts)
+
+class CameraState:
+    """Status dan statistik satu kamera (satu topik gambar)."""
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        # Statistik bergulir (antar-kedatangan, FPS, ukuran, latensi) dicatat saat frame tiba
+        self.stats = RollingStats(STATS_WINDOW)
+        self.reassembler = FrameReassembler(REASSEMBLY_MAX_FRAMES, REASSEMBLY_TIMEOUT)
+        self.frames_received = 0
+        self.frames_decoded = 0
+        self.decode_failures = 0
+        self.last_size = 0
+        # Statistik metadata frame (MQTT v5)
+        self.last_seq = None
+        self.sequence_gaps = 0
+        self.latency_total = 0.0
+        self.latency_count = 0
+
+    def update_metadata(self, metadata):
+        """
+        Menghitung latensi end-to-end dan celah nomor urut dari metadata frame.
+        Mengembalikan latensi frame ini (ms), atau None jika tidak ada timestamp.
+        Catatan: latensi akurat hanya jika jam publisher dan subscriber tersinkron (NTP).
+        """
+        if "seq" in metadata:
+            seq = int(metadata["seq"])
+            if self.last_seq is not None:
+                if seq > self.last_seq + 1:
+                    self.sequence_gaps += seq - self.last_seq - 1
+            self.last_seq = seq
+        if "ts" not in metadata:
+            return None
+        latency_ms = (time.time() - float(metadata["ts"])) * 1000
+        self.latency_total += latency_ms
+        self.latency_count += 1
+        return latency_ms
+
+class PendingFrames:
+    """
+    Payload terbaru per kamera (latest-wins) antara thread jaringan paho dan
+    thread decode/tampilan. Payload kamera yang belum sempat diproses akan
+    ditimpa dan dihitung sebagai drop, sehingga socket tetap dibaca tanpa
+    menunggu render.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.items = {}
+        self.dropped = 0
+
+    def put(self, camera_id, payload):
+        with self.condition:
+            if camera_id in self.items:
+                self.dropped += 1
+            self.items[camera_id] = payload
+            self.condition.notify()
+
+    def take_all(self, timeout=None):
+        """Mengambil semua payload yang tertunda sebagai list (camera_id, payload)."""
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            items, self.items = list(self.items.items()), {}
+            return items
+
+pending_frames = PendingFrames()
+
+def is_multi_camera():
+    return "+" in IMAGE_TOPIC
+
+def camera_id_from_topic(topic):
+    """
+    Mengembalikan ID kamera dari topik gambar: bagian yang cocok dengan '+'
+    pada IMAGE_TOPIC (misal 'cam1' untuk camera/cam1/image), atau topik itu sendiri.
+    """
+    if not is_multi_camera():
+        return topic
+    pattern = IMAGE_TOPIC.split("/")
+    parts = topic.split("/")
+    return "/".join(part for part, level in zip(parts, pattern) if level == "+")
+
+def get_camera(camera_id):
+    """Mengambil (atau membuat) CameraState untuk ID kamera."""
+    with cameras_lock:
+        camera = cameras.get(camera_id)
+        if camera is None:
+            camera = cameras[camera_id] = CameraState(camera_id)
+        return camera
+
+def extract_image_payload(msg):
+    """
+    Mengembalikan (CameraState, payload JPEG lengkap) dari pesan gambar (utuh
+    atau potongan), atau (None, None) jika bukan pesan gambar / belum lengkap.
+    """
+    topic = msg.topic
+    if mqtt.topic_matches_sub(IMAGE_TOPIC, topic):
+        camera = get_camera(camera_id_from_topic(topic))
+        return camera, msg.payload
+    if mqtt.topic_matches_sub(IMAGE_TOPIC + CHUNK_SUFFIX, topic):
+        camera = get_camera(camera_id_from_topic(topic[:-len(CHUNK_SUFFIX)]))
+        payload = camera.reassembler.add(msg.payload)
+        return (camera, payload) if payload is not None else (None, None)
+    return None, None
+
+def parse_frame_metadata(msg):
+    """Mengambil user properties (seq, ts, res) dari pesan MQTT v5, atau dict kosong."""
+    properties = getattr(msg, "properties", None)
+    user_properties = getattr(properties, "UserProperty", None) if properties else None
+    return dict(user_properties) if user_properties else {}
+
+def on_connect(client, userdata, flags, rc, properties=None):
     """Callback yang dipanggil saat berhasil terhubung ke broker."""
     if rc == 0:
         print("Berhasil terhubung ke Broker MQTT!")
         # Berlangganan ke semua topik yang relevan
+        chunk_topic = IMAGE_TOPIC + CHUNK_SUFFIX
         client.subscribe(IMAGE_TOPIC)
+        client.subscribe(chunk_topic)
         client.subscribe(STATUS_TOPIC)
-        print(f"Berlangganan ke topik '{IMAGE_TOPIC}' dan '{STATUS_TOPIC}'")
+        print(f"Berlangganan ke topik '{IMAGE_TOPIC}', '{chunk_topic}' dan '{STATUS_TOPIC}'")
     else:
         print(f"Gagal terhubung, return code {rc}\n")
 
 def on_message_stream(client, userdata, msg):
-    """Callback yang dipanggil saat dalam mode streaming."""
-    global frame_count, start_time
+    """
+    Callback yang dipanggil saat dalam mode streaming. Hanya menyerahkan payload
+    ke pending_frames; decode dan tampilan dilakukan oleh display_loop.
+    """
     if msg.topic == STATUS_TOPIC:
         print(f"[STATUS] {msg.payload.decode()}")
         return
-    if msg.topic == IMAGE_TOPIC:
-        try:
-            nparr = np.frombuffer(msg.payload, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if img is not None:
-                frame_count += 1
-                current_fps = calculate_fps()
-                
-                info1 = f"FPS: {current_fps:.1f}"
-                info2 = f"Frame: {frame_count} | Size: {len(msg.payload) / 1024:.1f} KB"
-                cv2.putText(img, info1, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(img, info2, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-                
-                cv2.imshow("ESP32-CAM MQTT Stream", img)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    print("Keluar diminta oleh pengguna.")
-                    client.disconnect()
-            else:
-                print("Gagal mendekode gambar JPEG.")
-        except Exception as e:
-            print(f"Error saat memproses gambar: {e}")
+    camera, payload = extract_image_payload(msg)
+    if payload is not None:
+        camera.frames_received += 1
+        camera.last_size = len(payload)
+        # Metadata dihitung saat tiba agar latensi tidak termasuk waktu antre tampilan
+        metadata = parse_frame_metadata(msg)
+        camera.stats.record(len(payload), camera.update_metadata(metadata))
+        pending_frames.put(camera.camera_id, payload)
+
+def show_single_frame(camera, img):
+    """Menampilkan frame kamera tunggal dengan overlay statistik."""
+    global frames_displayed
+    current_fps = camera.stats.fps()
+    current_latency = camera.stats.mean_latency()
+
+    info1 = f"FPS: {current_fps:.1f}"
+    info2 = f"Frame: {camera.frames_decoded} | Size: {camera.last_size / 1024:.1f} KB"
+    cv2.putText(img, info1, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(img, info2, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    if current_latency is not None:
+        info3 = f"Latency: {current_latency:.0f} ms | Seq: {camera.last_seq} | Gap: {camera.sequence_gaps}"
+        cv2.putText(img, info3, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+
+    cv2.imshow("ESP32-CAM MQTT Stream", img)
+    frames_displayed += 1
+
+class Mosaic:
+    """Kanvas petak untuk menampilkan banyak kamera dalam satu jendela."""
+    def __init__(self):
+        self.canvas = None
+        self.positions = {}
+        self.last_render = 0.0
+
+    def _layout(self, camera_ids):
+        cols = max(1, math.ceil(math.sqrt(len(camera_ids))))
+        rows = math.ceil(len(camera_ids) / cols)
+        tile_w, tile_h = MOSAIC_TILE
+        self.canvas = np.zeros((rows * tile_h, cols * tile_w, 3), np.uint8)
+        self.positions = {
+            camera_id: ((i // cols) * tile_h, (i % cols) * tile_w)
+            for i, camera_id in enumerate(sorted(camera_ids))
+        }
+
+    def update(self, camera, img):
+        """Menyalin frame (diperkecil) ke petak kamera, sehingga frame sumber bisa dilepas."""
+        if camera.camera_id not in self.positions:
+            with cameras_lock:
+                camera_ids = list(cameras)
+            self._layout(camera_ids)
+        y, x = self.positions[camera.camera_id]
+        tile_w, tile_h = MOSAIC_TILE
+        tile = self.canvas[y:y + tile_h, x:x + tile_w]
+        tile[...] = cv2.resize(img, (tile_w, tile_h), interpolation=cv2.INTER_AREA)
+        label = f"{camera.camera_id} | {camera.stats.fps():.1f} FPS"
+        cv2.putText(tile, label, (5, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+
+    def maybe_render(self):
+        """Menampilkan mosaik dengan laju tetap MOSAIC_INTERVAL."""
+        global frames_displayed
+        now = time.monotonic()
+        if self.canvas is None or now - self.last_render < MOSAIC_INTERVAL:
+            return
+        self.last_render = now
+        cv2.imshow("MQTT Multi-Camera Stream", self.canvas)
+        frames_displayed += 1
+
+def handle_decoded(camera, img, mosaic):
+    """Memproses satu frame yang sudah didekode (hitung, lalu tampilkan jika tidak headless)."""
+    camera.frames_decoded += 1
+    if HEADLESS:
+        return
+    if mosaic is not None:
+        mosaic.update(camera, img)
+    else:
+        show_single_frame(camera, img)
+
+def print_periodic_stats(pool):
+    """Mencetak penghitung frame dan statistik bergulir per kamera (mode headless)."""
+    with cameras_lock:
+        camera_list = list(cameras.values())
+    received = sum(c.frames_received for c in camera_list)
+    decoded = sum(c.frames_decoded for c in camera_list)
+    failures = sum(c.decode_failures for c in camera_list) + (pool.failed if pool else 0)
+    dropped = pending_frames.dropped + backlog_dropped
+    print(f"[stats] kamera: {len(camera_list)} | diterima: {received} | drop: {dropped} | "
+          f"didekode: {decoded} | gagal decode: {failures}")
+    for camera in camera_list:
+        print(f"[stats] {camera.camera_id}: {format_summary(camera.stats.summary())}")
+
+def display_loop(pool=None):
+    """
+    Thread decode/tampilan: mengambil payload terbaru per kamera dari
+    pending_frames, decode (langsung atau lewat DecodePool), lalu tampilkan.
+    Dengan DecodePool, payload menunggu di backlog (latest-wins per kamera)
+    sampai ada slot kosong; kamera dilayani bergiliran sesuai urutan antre.
+    """
+    global backlog_dropped
+    backlog = {}
+    exporter = StatsExporter(EXPORT_PATH, EXPORT_INTERVAL) if EXPORT_PATH else None
+    mosaic = Mosaic() if is_multi_camera() else None
+    last_report = time.time()
+    while not stop_display.is_set():
+        items = pending_frames.take_all(timeout=0.02 if pool else 0.1)
+        if exporter:
+            with cameras_lock:
+                stats_by_camera = {camera_id: c.stats for camera_id, c in cameras.items()}
+            exporter.maybe_export(stats_by_camera)
+        if HEADLESS and time.time() - last_report >= STATS_INTERVAL:
+            last_report = time.time()
+            print_periodic_stats(pool)
+
+        for camera_id, payload in items:
+            if pool:
+                if backlog.pop(camera_id, None) is not None:
+                    backlog_dropped += 1
+                backlog[camera_id] = payload
+                continue
+            camera = get_camera(camera_id)
+            try:
+                img = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                if img is None:
+                    camera.decode_failures += 1
+                    print("Gagal mendekode gambar JPEG.")
+                    continue
+                handle_decoded(camera, img, mosaic)
+            except Exception as e:
+                print(f"Error saat memproses gambar: {e}")
+
+        if pool:
+            while backlog:
+                camera_id = next(iter(backlog))
+                if not pool.submit(camera_id, backlog[camera_id]):
+                    break
+                del backlog[camera_id]
+            for camera_id, img, slot in pool.poll():
+                try:
+                    handle_decoded(get_camera(camera_id), img, mosaic)
+                except Exception as e:
+                    print(f"Error saat memproses gambar: {e}")
+                finally:
+                    # Lepas view shared memory sebelum slot dipakai ulang
+                    del img
+                    pool.release(slot)
+
+        if HEADLESS:
+            continue
+        if mosaic is not None:
+            mosaic.maybe_render()
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            print("Keluar diminta oleh pengguna.")
+            stop_display.set()
+
+class CaptureRequest:
+    """Satu permintaan capture yang menunggu gambarnya sendiri."""
+    def __init__(self, filename):
+        self.correlation_id = uuid.uuid4().bytes
+        self.filename = filename
+        self.sent_at = None
+        self.latency_ms = None
+        self.done = threading.Event()
+
+def on_subscribe_capture(client, userdata, mid, *args):
+    """Callback SUBACK: mencatat mid yang sudah dikonfirmasi broker."""
+    with subscribe_condition:
+        subscribed_mids.add(mid)
+        subscribe_condition.notify_all()
 
 def on_message_capture(client, userdata, msg):
-    """Callback yang dipanggil saat dalam mode capture."""
-    global image_for_capture_received
-    if msg.topic == IMAGE_TOPIC:
-        print(f"Menerima gambar untuk disimpan ({len(msg.payload)} bytes)...")
-        try:
-            # Simpan data gambar mentah ke file
-            filename = userdata['filename']
-            with open(filename, 'wb') as f:
-                f.write(msg.payload)
-            print(f"Gambar berhasil disimpan sebagai '{filename}'")
-            image_for_capture_received = True
-            client.disconnect() # Hentikan loop setelah gambar diterima
-        except Exception as e:
-            print(f"Gagal menyimpan gambar: {e}")
+    """
+    Callback yang dipanggil saat dalam mode capture. Dengan MQTT v5, gambar
+    dicocokkan ke permintaannya lewat correlation data; pesan lain (frame
+    stream, jawaban untuk klien lain) diabaikan. Tanpa v5 atau dengan
+    LEGACY_CAPTURE, gambar tanpa correlation data di IMAGE_TOPIC menjawab
+    permintaan tertua yang masih menunggu, kecuali frame stream (ber-`seq`)
+    dan pesan retained.
+    """
+    properties = getattr(msg, "properties", None) if USE_MQTT_V5 else None
+    correlation_data = getattr(properties, "CorrelationData", None) if properties else None
+    if correlation_data is not None:
+        request = capture_requests.get(bytes(correlation_data))
+        payload = msg.payload
+    else:
+        if USE_MQTT_V5 and not LEGACY_CAPTURE:
+            return
+        if msg.retain or "seq" in parse_frame_metadata(msg):
+            return
+        _, payload = extract_image_payload(msg)
+        # Hanya permintaan yang sudah dikirim: gambar stream sebelumnya bukan jawaban
+        request = next((r for r in capture_requests.values()
+                        if r.sent_at is not None and not r.done.is_set()), None)
+    if request is None or payload is None or request.done.is_set():
+        return
+    request.latency_ms = (time.monotonic() - request.sent_at) * 1000
+    print(f"Menerima gambar untuk disimpan ({len(payload)} bytes, {request.latency_ms:.1f} ms)...")
+    try:
+        # Simpan data gambar mentah ke file
+        with open(request.filename, 'wb') as f:
+            f.write(payload)
+        print(f"Gambar berhasil disimpan sebagai '{request.filename}'")
+    except Exception as e:
+        print(f"Gagal menyimpan gambar: {e}")
+    request.done.set()
 
 def run_stream(client):
     """Menjalankan mode streaming."""
@@ -98,28 +452,105 @@ def run_stream(client):
     print(f"Mengirim perintah 'stream_on'...")
     client.publish(COMMAND_TOPIC, "stream_on")
     start_time = time.time()
-    client.loop_forever()
+    # Jaringan MQTT berjalan di thread paho; decode/tampilan di thread utama
+    # (GUI OpenCV paling aman dijalankan dari thread utama)
+    pool = None
+    if DECODE_WORKERS > 0:
+        print(f"Decode paralel dengan {DECODE_WORKERS} proses worker.")
+        pool = DecodePool(DECODE_WORKERS, slots=DECODE_WORKERS * 2, max_shape=DECODE_MAX_SHAPE)
+    client.loop_start()
+    try:
+        display_loop(pool)
+    finally:
+        client.loop_stop()
+        if pool:
+            pool.close()
+        print_stream_summary(pool)
 
-def run_capture(client, filename):
-    """Menjalankan mode capture."""
-    # Simpan nama file di userdata agar bisa diakses oleh callback
-    userdata = {'filename': filename}
-    client.user_data_set(userdata)
+def print_stream_summary(pool=None):
+    """Mencetak ringkasan statistik stream (per kamera) setelah loop berhenti."""
+    print("\nStatistik Stream:")
+    print(f"   Frame di-drop (tertimpa sebelum diproses): {pending_frames.dropped + backlog_dropped}")
+    if pool:
+        print(f"   Gagal decode di pool: {pool.failed}")
+    print(f"   Frame ditampilkan: {frames_displayed}")
+    with cameras_lock:
+        camera_list = list(cameras.values())
+    for camera in camera_list:
+        print(f"   [{camera.camera_id}]")
+        print(f"      Frame diterima: {camera.frames_received}")
+        print(f"      Frame didekode: {camera.frames_decoded} (gagal: {camera.decode_failures})")
+        print(f"      {format_summary(camera.stats.summary())}")
+        reassembler = camera.reassembler
+        if reassembler.completed or reassembler.dropped_incomplete:
+            print(f"      Frame terpotong tersusun: {reassembler.completed}, dibuang (tidak lengkap): {reassembler.dropped_incomplete}")
+        if camera.latency_count > 0:
+            print(f"      Latensi end-to-end rata-rata: {camera.latency_total / camera.latency_count:.1f} ms")
+            print(f"      Frame hilang (celah nomor urut): {camera.sequence_gaps}")
+
+def capture_filenames(filename, count):
+    """Nama file untuk setiap permintaan: fotoku.jpg, atau fotoku_1.jpg, fotoku_2.jpg, ..."""
+    if count == 1:
+        return [filename]
+    stem, dot, ext = filename.rpartition(".")
+    if not dot:
+        stem, ext = filename, "jpg"
+    return [f"{stem}_{i}.{ext}" for i in range(1, count + 1)]
+
+def run_capture(client, filename, count=1):
+    """
+    Menjalankan mode capture. Dengan MQTT v5 setiap permintaan membawa
+    response topic pribadi dan correlation data, sehingga setiap permintaan
+    menerima tepat gambarnya sendiri walau beberapa dikirim bersamaan.
+    """
+    if not USE_MQTT_V5 and count > 1:
+        print("Tanpa MQTT v5 jawaban tidak bisa dicocokkan; hanya 1 permintaan yang dikirim.")
+        count = 1
+    requests = [CaptureRequest(name) for name in capture_filenames(filename, count)]
+    capture_requests.update((r.correlation_id, r) for r in requests)
     client.on_message = on_message_capture
-    
-    print(f"Mengirim perintah 'capture'...")
-    client.publish(COMMAND_TOPIC, "capture")
-    
-    # Jalankan loop dengan timeout
-    timeout = 15 # detik
+    client.on_subscribe = on_subscribe_capture
     client.loop_start()
-    start_wait = time.time()
-    while not image_for_capture_received and time.time() - start_wait < timeout:
-        time.sleep(0.1)
-    client.loop_stop()
+    deadline = time.monotonic() + CAPTURE_TIMEOUT
 
-    if not image_for_capture_received:
-        print("Timeout: Tidak menerima gambar dari ESP32.")
+    try:
+        properties = None
+        if USE_MQTT_V5:
+            # Berlangganan ke reply topic pribadi sebelum mengirim perintah
+            reply_topic = REPLY_TOPIC_PREFIX + uuid.uuid4().hex
+            _, mid = client.subscribe(reply_topic, qos=1)
+            with subscribe_condition:
+                if not subscribe_condition.wait_for(lambda: mid in subscribed_mids,
+                                                    deadline - time.monotonic()):
+                    print("Timeout: Broker tidak mengonfirmasi langganan reply topic.")
+                    return
+
+        print(f"Mengirim {count} perintah 'capture'...")
+        for request in requests:
+            if USE_MQTT_V5:
+                properties = Properties(PacketTypes.PUBLISH)
+                properties.ResponseTopic = reply_topic
+                properties.CorrelationData = request.correlation_id
+            request.sent_at = time.monotonic()
+            client.publish(COMMAND_TOPIC, "capture", qos=1, properties=properties)
+
+        # Menunggu berbasis event, tanpa polling
+        for request in requests:
+            request.done.wait(max(0.0, deadline - time.monotonic()))
+
+        latencies = [r.latency_ms for r in requests if r.latency_ms is not None]
+        if len(latencies) < len(requests):
+            print(f"Timeout: {len(requests) - len(latencies)} dari {len(requests)} permintaan tidak menerima gambar.")
+            if USE_MQTT_V5 and not LEGACY_CAPTURE:
+                print("   Publisher lama (ESP32) menjawab tanpa correlation data; coba --legacy-capture.")
+        if latencies:
+            print(f"Latensi capture (ms) min/rata-rata/maks: {min(latencies):.1f} / "
+                  f"{sum(latencies) / len(latencies):.1f} / {max(latencies):.1f}")
+    finally:
+        if USE_MQTT_V5:
+            client.unsubscribe(reply_topic)
+        client.disconnect()
+        client.loop_stop()
 
 def main():
     """Fungsi utama untuk parsing argumen dan menjalankan client."""
@@ -129,20 +560,55 @@ def main():
         print("  stream         (default) Memulai video stream.")
         print("  capture        Mengambil satu foto dan menyimpannya.")
         print("                 [argumen]: nama file opsional (misal: fotoku.jpg)")
+        print("\nOpsi:")
+        print("  --headless     Tanpa jendela video, hanya decode dan statistik.")
+        print("  --export FILE  Ekspor statistik berkala ke FILE (.csv atau .jsonl).")
+        print("  --topic TOPIK  Topik gambar, boleh wildcard '+' (misal camera/+/image).")
+        print("  --workers N    Decode JPEG di N proses worker (shared memory).")
+        print("  --count N      Kirim N permintaan capture bersamaan (MQTT v5).")
+        print("  --legacy-capture  Terima gambar capture tanpa correlation data (ESP32).")
         print("\nContoh:")
         print("  python main.py 192.168.1.25 stream")
+        print("  python main.py 192.168.1.25 stream --headless")
+        print("  python main.py 192.168.1.25 stream --topic camera/+/image --workers 4")
         print("  python main.py 192.168.1.25 capture fotoku.jpg")
+        print("  python main.py 192.168.1.25 capture fotoku.jpg --count 4")
         return
 
+    global MQTT_BROKER, HEADLESS, EXPORT_PATH, IMAGE_TOPIC, DECODE_WORKERS, CAPTURE_COUNT, LEGACY_CAPTURE
+    args = sys.argv[1:]
+    if "--headless" in args:
+        HEADLESS = True
+        args.remove("--headless")
+    if "--legacy-capture" in args:
+        LEGACY_CAPTURE = True
+        args.remove("--legacy-capture")
+    if "--export" in args:
+        i = args.index("--export")
+        EXPORT_PATH = args[i + 1]
+        del args[i:i + 2]
+    if "--topic" in args:
+        i = args.index("--topic")
+        IMAGE_TOPIC = args[i + 1]
+        del args[i:i + 2]
+    if "--workers" in args:
+        i = args.index("--workers")
+        DECODE_WORKERS = int(args[i + 1])
+        del args[i:i + 2]
+    if "--count" in args:
+        i = args.index("--count")
+        CAPTURE_COUNT = int(args[i + 1])
+        del args[i:i + 2]
+
     # Perbarui MQTT_BROKER jika diberikan sebagai argumen pertama
-    global MQTT_BROKER
-    MQTT_BROKER = sys.argv[1]
+    MQTT_BROKER = args[0]
 
     command = "stream" # Perintah default
-    if len(sys.argv) > 2:
-        command = sys.argv[2].lower()
+    if len(args) > 1:
+        command = args[1].lower()
 
-    client = mqtt.Client()
+    protocol = mqtt.MQTTv5 if USE_MQTT_V5 else mqtt.MQTTv311
+    client = mqtt.Client(protocol=protocol)
     client.on_connect = on_connect
 
     try:
@@ -153,9 +619,9 @@ def main():
             run_stream(client)
         elif command == "capture":
             filename = "capture.jpg" # Nama file default
-            if len(sys.argv) > 3:
-                filename = sys.argv[3]
-            run_capture(client, filename)
+            if len(args) > 2:
+                filename = args[2]
+            run_capture(client, filename, CAPTURE_COUNT)
         else:
             print(f"Perintah tidak dikenal: {command}")
 
@@ -169,7 +635,8 @@ def main():
             client.publish(COMMAND_TOPIC, "stream_off")
             time.sleep(1)
         
-        cv2.destroyAllWindows()
+        if not HEADLESS:
+            cv2.destroyAllWindows()
         print("Program ditutup.")
 
 if __name__ == '__main__':
@@ -0,0 +1,162 @@
+import csv
+import json
+import math
+import threading
+import time
+import numpy as np
+
+class RollingStats:
+    """
+    Statistik bergulir untuk klien stream: waktu antar-kedatangan, FPS, jitter,
+    ukuran payload, dan (opsional) latensi end-to-end dengan p50/p95/p99.
+
+    Sampel disimpan di ring buffer NumPy yang dialokasikan sekali di awal;
+    `record()` tidak mengalokasikan objek baru, dan persentil dihitung dengan
+    menyalin ke buffer kerja yang juga sudah dialokasikan lalu diurutkan
+    in-place. Aman dipanggil dari thread jaringan dan thread tampilan sekaligus.
+    """
+    FIELDS = (
+        "timestamp", "frames", "fps", "interarrival_ms_p50", "interarrival_ms_p95",
+        "interarrival_ms_p99", "jitter_ms", "size_kb_mean", "latency_ms_p50",
+        "latency_ms_p95", "latency_ms_p99",
+    )
+
+    def __init__(self, window=120):
+        self.window = window
+        self.lock = threading.Lock()
+        self.interarrival = np.zeros(window)
+        self.sizes = np.zeros(window)
+        self.latencies = np.zeros(window)
+        self.scratch = np.zeros(window)
+        self.index = 0
+        self.count = 0
+        self.latency_index = 0
+        self.latency_count = 0
+        self.interarrival_sum = 0.0
+        self.latency_sum = 0.0
+        self.last_arrival = None
+        self.total_frames = 0
+
+    def record(self, payload_size, latency_ms=None, now=None):
+        """Mencatat satu frame yang tiba (ukuran payload dalam byte, latensi dalam ms)."""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            self.total_frames += 1
+            if self.last_arrival is not None:
+                i = self.index
+                if self.count == self.window:
+                    self.interarrival_sum -= self.interarrival[i]
+                else:
+                    self.count += 1
+                delta = now - self.last_arrival
+                self.interarrival[i] = delta
+                self.sizes[i] = payload_size
+                self.interarrival_sum += delta
+                self.index = (i + 1) % self.window
+            self.last_arrival = now
+            if latency_ms is not None:
+                j = self.latency_index
+                if self.latency_count == self.window:
+                    self.latency_sum -= self.latencies[j]
+                else:
+                    self.latency_count += 1
+                self.latencies[j] = latency_ms
+                self.latency_sum += latency_ms
+                self.latency_index = (j + 1) % self.window
+
+    def fps(self):
+        """FPS rata-rata dalam jendela (O(1), cocok untuk overlay per frame)."""
+        with self.lock:
+            if self.count == 0 or self.interarrival_sum <= 0:
+                return 0.0
+            return self.count / self.interarrival_sum
+
+    def mean_latency(self):
+        """Latensi rata-rata dalam jendela (ms), atau None jika belum ada sampel."""
+        with self.lock:
+            if self.latency_count == 0:
+                return None
+            return self.latency_sum / self.latency_count
+
+    def _percentiles(self, values, n, scale=1.0):
+        """Menghitung p50/p95/p99 dari n sampel pertama tanpa alokasi array baru."""
+        if n == 0:
+            return (math.nan, math.nan, math.nan)
+        scratch = self.scratch[:n]
+        np.copyto(scratch, values[:n])
+        scratch.sort()
+        return tuple(float(scratch[min(n - 1, int(q * n))]) * scale for q in (0.50, 0.95, 0.99))
+
+    def summary(self):
+        """Mengembalikan ringkasan statistik jendela saat ini sebagai dict (kunci = FIELDS)."""
+        with self.lock:
+            n = self.count
+            fps = n / self.interarrival_sum if n and self.interarrival_sum > 0 else 0.0
+            ia = self._percentiles(self.interarrival, n, scale=1000.0)
+            jitter = float(self.interarrival[:n].std()) * 1000.0 if n else math.nan
+            size_mean = float(self.sizes[:n].mean()) / 1024 if n else math.nan
+            lat = self._percentiles(self.latencies, self.latency_count)
+            frames = self.total_frames
+        return {
+            "timestamp": time.time(),
+            "frames": frames,
+            "fps": fps,
+            "interarrival_ms_p50": ia[0],
+            "interarrival_ms_p95": ia[1],
+            "interarrival_ms_p99": ia[2],
+            "jitter_ms": jitter,
+            "size_kb_mean": size_mean,
+            "latency_ms_p50": lat[0],
+            "latency_ms_p95": lat[1],
+            "latency_ms_p99": lat[2],
+        }
+
+def format_summary(summary):
+    """Memformat ringkasan menjadi satu baris teks untuk terminal."""
+    text = (f"FPS {summary['fps']:.1f} | antar-kedatangan p50/p95/p99 "
+            f"{summary['interarrival_ms_p50']:.0f}/{summary['interarrival_ms_p95']:.0f}/"
+            f"{summary['interarrival_ms_p99']:.0f} ms | jitter {summary['jitter_ms']:.1f} ms | "
+            f"ukuran {summary['size_kb_mean']:.1f} KB")
+    if not math.isnan(summary["latency_ms_p50"]):
+        text += (f" | latensi p50/p95/p99 {summary['latency_ms_p50']:.0f}/"
+                 f"{summary['latency_ms_p95']:.0f}/{summary['latency_ms_p99']:.0f} ms")
+    return text
+
+class StatsExporter:
+    """
+    Menambahkan ringkasan RollingStats ke file secara berkala agar sesi panjang
+    bisa dibandingkan offline. Format ditentukan dari ekstensi: `.csv` untuk CSV,
+    selain itu JSON Lines (satu objek JSON per baris). Setiap baris diberi kolom
+    `camera` agar beberapa stream bisa diekspor ke file yang sama.
+    """
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self.is_csv = path.lower().endswith(".csv")
+        self.last_export = time.monotonic()
+        self.header_written = False
+
+    def maybe_export(self, stats_by_camera):
+        """Menulis satu baris ringkasan per kamera ({id: RollingStats}) jika interval sudah lewat."""
+        now = time.monotonic()
+        if now - self.last_export < self.interval:
+            return
+        self.last_export = now
+        for camera, stats in list(stats_by_camera.items()):
+            self.export(stats.summary(), camera)
+
+    def export(self, summary, camera=""):
+        """Menulis satu baris ringkasan ke file."""
+        row = {"camera": camera, **summary}
+        with open(self.path, "a", newline="") as f:
+            if self.is_csv:
+                writer = csv.DictWriter(f, fieldnames=("camera",) + RollingStats.FIELDS)
+                if not self.header_written and f.tell() == 0:
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                # NaN bukan JSON yang valid; tulis sebagai null
+                row = {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in row.items()}
+                f.write(json.dumps(row) + "\n")
+        self.header_written = True
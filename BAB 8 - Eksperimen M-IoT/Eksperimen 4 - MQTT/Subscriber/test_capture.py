@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import unittest
+import paho.mqtt.client as mqtt
+from paho.mqtt.properties import Properties
+from paho.mqtt.packettypes import PacketTypes
+import main
+
+def make_message(topic, payload, user_properties=None, correlation_data=None, retain=False):
+    """Pesan MQTT v5 seperti yang diterima callback paho."""
+    msg = mqtt.MQTTMessage(topic=topic.encode())
+    msg.payload = payload
+    msg.retain = retain
+    msg.properties = Properties(PacketTypes.PUBLISH)
+    if user_properties:
+        msg.properties.UserProperty = user_properties
+    if correlation_data is not None:
+        msg.properties.CorrelationData = correlation_data
+    return msg
+
+class CaptureReplyTest(unittest.TestCase):
+    """on_message_capture hanya menyimpan jawaban untuk permintaan klien ini."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.request = main.CaptureRequest(os.path.join(self.directory.name, "capture.jpg"))
+        self.request.sent_at = time.monotonic()
+        main.capture_requests.clear()
+        main.capture_requests[self.request.correlation_id] = self.request
+        self.saved = (main.USE_MQTT_V5, main.LEGACY_CAPTURE)
+
+    def tearDown(self):
+        main.USE_MQTT_V5, main.LEGACY_CAPTURE = self.saved
+        main.capture_requests.clear()
+        self.directory.cleanup()
+
+    def stream_frame(self):
+        return make_message(main.IMAGE_TOPIC, b"stream", [("seq", "41"), ("ts", "0"), ("res", "640x480")])
+
+    def test_stream_frame_is_not_a_capture_reply(self):
+        main.on_message_capture(None, None, self.stream_frame())
+        self.assertFalse(self.request.done.is_set())
+        main.on_message_capture(None, None, make_message(
+            main.REPLY_TOPIC_PREFIX + "x", b"reply", correlation_data=self.request.correlation_id))
+        self.assertTrue(self.request.done.is_set())
+        with open(self.request.filename, "rb") as f:
+            self.assertEqual(f.read(), b"reply")
+
+    def test_uncorrelated_reply_is_ignored_in_v5(self):
+        main.on_message_capture(None, None, make_message(main.IMAGE_TOPIC, b"other client"))
+        self.assertFalse(self.request.done.is_set())
+
+    def test_reply_for_another_request_is_ignored(self):
+        main.on_message_capture(None, None, make_message(
+            main.REPLY_TOPIC_PREFIX + "x", b"other", correlation_data=b"not ours"))
+        self.assertFalse(self.request.done.is_set())
+
+    def test_legacy_reply_answers_oldest_request(self):
+        main.LEGACY_CAPTURE = True
+        main.on_message_capture(None, None, self.stream_frame())
+        main.on_message_capture(None, None, make_message(main.IMAGE_TOPIC, b"retained", retain=True))
+        self.assertFalse(self.request.done.is_set())
+        main.on_message_capture(None, None, make_message(main.IMAGE_TOPIC, b"esp32"))
+        self.assertTrue(self.request.done.is_set())
+        with open(self.request.filename, "rb") as f:
+            self.assertEqual(f.read(), b"esp32")
+
+if __name__ == '__main__':
+    unittest.main()
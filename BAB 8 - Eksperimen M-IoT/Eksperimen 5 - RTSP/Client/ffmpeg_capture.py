@@ -0,0 +1,112 @@
+import shutil
+import subprocess
+import numpy as np
+
+# Opsi FFmpeg latensi rendah: tanpa buffer demuxer dan decoder low_delay
+LOW_LATENCY_INPUT_FLAGS = [
+    "-fflags", "nobuffer",
+    "-flags", "low_delay",
+]
+# Jendela probe/analyze minimal agar frame pertama cepat keluar (default `probe_flags`)
+MINIMAL_PROBE_FLAGS = [
+    "-probesize", "32",
+    "-analyzeduration", "0",
+]
+
+def probe_frame_size(url, transport="tcp"):
+    """Membaca resolusi stream video pertama dengan ffprobe. Mengembalikan (lebar, tinggi)."""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-rtsp_transport", transport, "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "csv=p=0", url],
+        capture_output=True, text=True, timeout=10, check=True,
+    ).stdout
+    width, height = output.strip().splitlines()[0].split(",")[:2]
+    return int(width), int(height)
+
+class FfmpegCapture:
+    """
+    Backend alternatif untuk cv2.VideoCapture: ffmpeg berjalan sebagai subprocess
+    dengan opsi latensi rendah dan mengeluarkan rawvideo BGR ke pipe.
+
+    Frame dibaca dengan `readinto` langsung ke ring buffer NumPy yang dialokasikan
+    sekali di awal, jadi tidak ada alokasi per frame. Konsekuensinya, frame yang
+    dikembalikan `read()` akan ditimpa setelah `ring_size` pembacaan berikutnya;
+    salin frame jika perlu disimpan lebih lama. Atribut `reuses_buffers`
+    memberi tahu LatestFrameGrabber agar menyerahkan salinan ke konsumen.
+
+    `extra_outputs` menambahkan keluaran lain pada proses ffmpeg yang sama,
+    misalnya rekaman passthrough dari recorder.segment_output_args(); untuk itu
+    berikan juga `probe_flags=recorder.RECORD_PROBE_FLAGS` agar parameter
+    codec sempat terbaca sebelum segmen ditulis.
+
+    Antarmuka mengikuti VideoCapture (`isOpened`, `read`, `release`) sehingga
+    bisa dipakai langsung oleh LatestFrameGrabber.
+    """
+    reuses_buffers = True
+
+    def __init__(self, url, size=None, transport="tcp", ring_size=4, extra_input_flags=None,
+                 extra_outputs=None, probe_flags=MINIMAL_PROBE_FLAGS):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg tidak ditemukan di PATH")
+        if size is None:
+            size = probe_frame_size(url, transport)
+        self.width, self.height = size
+        self.frame_bytes = self.width * self.height * 3
+        self.ring = np.empty((ring_size, self.height, self.width, 3), np.uint8)
+        self.ring_index = 0
+        self.recording = bool(extra_outputs)
+        # -nostdin: tombol di terminal (misal 'q') tidak diartikan ffmpeg sebagai perintah
+        command = ["ffmpeg", "-hide_banner", "-nostdin", "-loglevel", "error",
+                   "-rtsp_transport", transport, *LOW_LATENCY_INPUT_FLAGS, *probe_flags,
+                   *(extra_input_flags or []),
+                   "-i", url, "-an",
+                   # Skala eksplisit menjamin ukuran keluaran sama dengan buffer
+                   "-vf", f"scale={self.width}:{self.height}",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1",
+                   *(extra_outputs or [])]
+        # bufsize=0: readinto langsung dari pipe tanpa salinan ke buffer Python
+        self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, bufsize=0)
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def read(self):
+        """Membaca satu frame utuh. Mengembalikan (True, frame) atau (False, None) saat stream berakhir."""
+        if self.process is None:
+            return False, None
+        frame = self.ring[self.ring_index]
+        view = memoryview(frame.reshape(-1))
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.process.stdout.readinto(view[filled:])
+            if not n:
+                return False, None
+            filled += n
+        self.ring_index = (self.ring_index + 1) % len(self.ring)
+        return True, frame
+
+    def set(self, prop, value):
+        """Disediakan agar kompatibel dengan VideoCapture; opsi diatur lewat konstruktor."""
+        return False
+
+    def interrupt(self):
+        """
+        Membangunkan `read()` yang sedang memblokir dari thread lain: ffmpeg
+        dihentikan sehingga pipe mencapai EOF. Pelepasan tetap lewat `release()`.
+        """
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+    def release(self):
+        if self.process is None:
+            return
+        # SIGTERM dulu agar keluaran tambahan (segmen rekaman) ditutup dengan rapi
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+        self.process = None
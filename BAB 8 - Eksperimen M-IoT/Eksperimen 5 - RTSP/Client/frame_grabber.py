@@ -0,0 +1,96 @@
+import threading
+import time
+
+class LatestFrameGrabber:
+    """
+    Thread latar yang terus membaca stream (`cap.read()`) dan hanya menyimpan
+    frame terbaru. Tampilan yang lebih lambat dari stream tidak lagi membuat
+    buffer OpenCV/FFmpeg menumpuk: frame lama dilewati dan dihitung sebagai
+    `skipped`, sehingga yang ditampilkan selalu mendekati siaran langsung.
+
+    `cap` boleh objek apa pun dengan `read()` -> (ret, frame) dan `release()`.
+    `release()` selalu dipanggil dari thread grab sendiri setelah `read()`
+    kembali, karena melepaskan VideoCapture yang sedang dibaca thread lain
+    tidak aman di OpenCV. Capture yang punya `interrupt()` (FfmpegCapture)
+    dibangunkan dengan itu saat dihentikan; VideoCapture kembali dari
+    `read()` paling lambat setelah timeout bacanya.
+    Jika `cap.reuses_buffers` bernilai True (FfmpegCapture), slot yang
+    dikembalikan `cap.read()` akan ditimpa thread grab, jadi `read()` di sini
+    menyerahkan salinan yang sepenuhnya milik konsumen.
+    """
+    def __init__(self, cap):
+        self.cap = cap
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_seq = 0
+        self.grab_time = 0.0
+        self.first_grab_time = None
+        self.last_read_seq = 0
+        self.grabbed = 0
+        self.skipped = 0
+        self.failed = False
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while self.running:
+                ret, frame = self.cap.read()
+                now = time.monotonic()
+                with self.condition:
+                    if not ret:
+                        # Stream terputus: bangunkan pembaca agar bisa menyambung ulang
+                        self.failed = True
+                        self.condition.notify_all()
+                        return
+                    self.frame = frame
+                    self.frame_seq += 1
+                    self.grab_time = now
+                    if self.first_grab_time is None:
+                        self.first_grab_time = now
+                    self.grabbed += 1
+                    self.condition.notify_all()
+        finally:
+            self.cap.release()
+
+    def read(self, timeout=1.0):
+        """
+        Menunggu frame yang belum pernah dibaca lalu mengembalikan
+        (frame, waktu grab monotonic), atau (None, None) jika timeout/terputus.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frame_seq > self.last_read_seq or self.failed,
+                                           timeout):
+                return None, None
+            if self.frame_seq == self.last_read_seq:
+                return None, None
+            # Frame di antara pembacaan sebelumnya dan frame ini tidak pernah ditampilkan
+            self.skipped += self.frame_seq - self.last_read_seq - 1
+            self.last_read_seq = self.frame_seq
+            if getattr(self.cap, "reuses_buffers", False):
+                # Slot ini baru ditimpa setelah beberapa pembacaan lagi, jadi
+                # salinan di bawah lock selalu utuh
+                return self.frame.copy(), self.grab_time
+            return self.frame, self.grab_time
+
+    def stop(self, wait=True):
+        """
+        Menghentikan thread grab; capture dilepas oleh thread itu sendiri setelah
+        `read()` yang sedang berjalan kembali. Dengan `wait=False` tidak menunggu
+        (misalnya saat stream macet dan koneksi ulang tidak boleh tertahan).
+        """
+        self.running = False
+        if self.thread is None:
+            self.cap.release()
+            return
+        interrupt = getattr(self.cap, "interrupt", None)
+        if interrupt:
+            interrupt()
+        if wait:
+            self.thread.join(timeout=2)
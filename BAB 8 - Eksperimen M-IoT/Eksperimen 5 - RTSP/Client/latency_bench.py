@@ -0,0 +1,93 @@
+import sys
+import time
+import cv2
+import numpy as np
+from ffmpeg_capture import FfmpegCapture
+from rtsp_test_source import TestStreamPublisher, decode_timestamp
+
+def open_backend(name, url, size):
+    """Membuka capture untuk backend yang dibandingkan."""
+    if name == "opencv":
+        return cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    transport = name.split("-", 1)[1]
+    return FfmpegCapture(url, size=size, transport=transport)
+
+def measure(name, url, size, duration):
+    """
+    Mengukur waktu startup (buka -> frame pertama) dan latensi steady-state
+    (jam dinding sekarang - timestamp di frame) untuk satu backend.
+    """
+    started = time.monotonic()
+    cap = open_backend(name, url, size)
+    try:
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        startup = time.monotonic() - started
+        latencies = []
+        frames = 0
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames += 1
+            stamp = decode_timestamp(frame)
+            if stamp is not None:
+                latencies.append((time.time() - stamp) * 1000)
+    finally:
+        cap.release()
+    latencies = np.array(latencies)
+    p50, p95 = np.percentile(latencies, (50, 95)) if latencies.size else (np.nan, np.nan)
+    return startup, frames / duration, p50, p95
+
+def main():
+    """
+    Membandingkan cv2.VideoCapture dengan backend FfmpegCapture (TCP/UDP) pada
+    server RTSP uji lokal. Frame sumber membawa timestamp yang dibaca kembali
+    setelah decode, sehingga latensi diukur end-to-end di mesin yang sama.
+
+    Penggunaan: python latency_bench.py [URL_RTSP] [--publish] [--duration DETIK]
+    --publish menjalankan TestStreamPublisher ke URL tersebut (perlu server RTSP
+    lokal seperti MediaMTX: rtsp://127.0.0.1:8554/bench).
+    """
+    args = sys.argv[1:]
+    if not args or args[0] in ['-h', '--help']:
+        print(main.__doc__)
+        return
+    duration = 10.0
+    if "--duration" in args:
+        i = args.index("--duration")
+        duration = float(args[i + 1])
+        del args[i:i + 2]
+    publish = "--publish" in args
+    if publish:
+        args.remove("--publish")
+    url = args[0]
+    size = (640, 480)
+
+    publisher = None
+    if publish:
+        publisher = TestStreamPublisher(url, size=size)
+        time.sleep(2) # Beri waktu server menerima stream sebelum klien membuka
+    try:
+        print(f"Stream: {url}, {duration:.0f} detik per backend")
+        print(f"{'backend':>11} | {'startup':>8} | {'FPS':>5} | {'latensi p50/p95 (ms)':>20}")
+        print("-" * 54)
+        for name in ("opencv", "ffmpeg-tcp", "ffmpeg-udp"):
+            try:
+                result = measure(name, url, size, duration)
+            except Exception as e:
+                print(f"{name:>11} | error: {e}")
+                continue
+            if result is None:
+                print(f"{name:>11} | gagal membaca frame pertama")
+                continue
+            startup, fps, p50, p95 = result
+            print(f"{name:>11} | {startup * 1000:>6.0f}ms | {fps:>5.1f} | {p50:>9.0f} / {p95:<8.0f}")
+    finally:
+        if publisher:
+            publisher.stop()
+
+if __name__ == '__main__':
+    main()
@@ -1,88 +1,219 @@
 import cv2
 import time
 import sys
+import os
+from ffmpeg_capture import MINIMAL_PROBE_FLAGS, FfmpegCapture
+from stream_supervisor import StreamSupervisor
+from recorder import RECORD_PROBE_FLAGS, SPACE_RECOVERED, SegmentIndex, SegmentRecorder, segment_output_args
+
+# --- KONFIGURASI ---
+# Jumlah frame yang boleh ditahan buffer internal VideoCapture (CAP_PROP_BUFFERSIZE).
+# Tidak semua backend menghormatinya; thread grab tetap menjamin hanya frame terbaru ditampilkan.
+BUFFER_SIZE = 1
+FRAME_WAIT = 0.1 # Detik menunggu frame baru sebelum memompa jendela lagi
+# Timeout buka/baca stream agar read() tidak memblokir selamanya saat ESP32 hilang
+OPEN_TIMEOUT_MS = 5000
+READ_TIMEOUT_MS = 3000
+STALL_TIMEOUT = 2.0 # Detik tanpa frame sebelum watchdog menganggap stream macet
+RECONNECT_BACKOFF_BASE = 0.5 # Percobaan pertama langsung, lalu 0.5, 1, 2, ... detik
+RECONNECT_BACKOFF_MAX = 10.0
+# Backend decode: "opencv" (cv2.VideoCapture) atau "ffmpeg" (subprocess latensi rendah)
+BACKEND = "opencv"
+RTSP_TRANSPORT = "tcp" # Transport RTSP untuk backend ffmpeg: "tcp" atau "udp"
+FRAME_SIZE = None # (lebar, tinggi) untuk backend ffmpeg; None = dibaca dengan ffprobe
+# Rekaman passthrough (tanpa transcode) ke direktori ini, None = tidak merekam (--record)
+RECORD_DIR = None
+
+def open_capture(rtsp_url, recording=None):
+    """Membuka stream dengan backend yang dipilih."""
+    if BACKEND == "ffmpeg":
+        # -timeout (mikrodetik) berlaku untuk koneksi dan setiap pembacaan socket RTSP
+        # Dengan --record, ffmpeg yang sama juga menulis segmen: satu koneksi RTSP saja.
+        # Selama disk penuh, koneksi dibuka tanpa keluaran rekaman.
+        record = recording is not None and not recording.disk_full
+        return FfmpegCapture(rtsp_url, size=FRAME_SIZE, transport=RTSP_TRANSPORT,
+                             extra_input_flags=["-timeout", str(READ_TIMEOUT_MS * 1000)],
+                             extra_outputs=segment_output_args(RECORD_DIR) if record else None,
+                             probe_flags=RECORD_PROBE_FLAGS if record else MINIMAL_PROBE_FLAGS)
+    cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG, [
+        cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+        cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS,
+    ])
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, BUFFER_SIZE)
+    return cap
 
 def main():
     """
     Fungsi utama untuk terhubung ke stream RTSP dari ESP32-CAM dan menampilkannya.
+    Koneksi, pembacaan, dan deteksi macet dikelola StreamSupervisor di thread
+    latar, sehingga tampilan selalu memakai frame terbaru dan tetap responsif
+    (frame terakhir + keterangan "menyambung ulang") selama gangguan.
     """
     # --- KONFIGURASI ---
     # Ambil alamat IP ESP32 dari argumen baris perintah
     if len(sys.argv) < 2:
         print("Kesalahan: Alamat IP ESP32 tidak diberikan.")
-        print("Penggunaan: python rtsp_camera_viewer.py [IP_ESP32_ANDA]")
+        print("Penggunaan: python rtsp_camera_viewer.py [IP_ESP32_ANDA] [--buffer N]")
+        print("            [--backend opencv|ffmpeg] [--transport tcp|udp] [--size LEBARxTINGGI]")
+        print("            [--record DIREKTORI]")
         return
-    
-    esp32_ip = sys.argv[1]
+
+    global BUFFER_SIZE, BACKEND, RTSP_TRANSPORT, FRAME_SIZE, RECORD_DIR
+    args = sys.argv[1:]
+    if "--buffer" in args:
+        i = args.index("--buffer")
+        BUFFER_SIZE = int(args[i + 1])
+        del args[i:i + 2]
+    if "--backend" in args:
+        i = args.index("--backend")
+        BACKEND = args[i + 1]
+        del args[i:i + 2]
+    if "--transport" in args:
+        i = args.index("--transport")
+        RTSP_TRANSPORT = args[i + 1]
+        del args[i:i + 2]
+    if "--size" in args:
+        i = args.index("--size")
+        FRAME_SIZE = tuple(int(x) for x in args[i + 1].split("x"))
+        del args[i:i + 2]
+    if "--record" in args:
+        i = args.index("--record")
+        RECORD_DIR = args[i + 1]
+        del args[i:i + 2]
+
+    esp32_ip = args[0]
     rtsp_url = f"rtsp://{esp32_ip}:554/mjpeg/1"
 
     print(f"\nKlien Stream RTSP untuk ESP32-CAM")
-    print(f"Mencoba terhubung ke: {rtsp_url}")
+    print(f"Mencoba terhubung ke: {rtsp_url} (backend {BACKEND})")
     print("   Tekan 'q' di jendela video untuk keluar.")
     print("-" * 50)
 
+    recording = None
+    if RECORD_DIR:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        if BACKEND == "ffmpeg":
+            recording = SegmentIndex(RECORD_DIR).start()
+        else:
+            # VideoCapture tidak bisa remux; rekam dengan ffmpeg terpisah (koneksi RTSP kedua)
+            recording = SegmentRecorder(rtsp_url, RECORD_DIR, transport=RTSP_TRANSPORT).start()
+        print(f"Merekam (tanpa transcode) ke '{RECORD_DIR}'")
+
+    supervisor = StreamSupervisor(lambda: open_capture(rtsp_url, recording if BACKEND == "ffmpeg" else None),
+                                  stall_timeout=STALL_TIMEOUT, backoff_base=RECONNECT_BACKOFF_BASE,
+                                  backoff_max=RECONNECT_BACKOFF_MAX).start()
+
+    def on_record_limit(reason):
+        # Segmen hanya bisa ditutup/dibuka dengan menghentikan ffmpeg; supervisor langsung
+        # menyambung ulang (tercatat sebagai gangguan singkat) dan open_capture memutuskan
+        # apakah koneksi baru ikut merekam
+        grabber = supervisor.grabber
+        cap = grabber.cap if grabber else None
+        if cap is None or not cap.isOpened():
+            return # Sedang menyambung ulang: open_capture sudah membaca disk_full terbaru
+        if reason == SPACE_RECOVERED:
+            if not cap.recording:
+                print("Ruang disk kembali cukup, rekaman dilanjutkan")
+                cap.interrupt()
+        elif cap.recording:
+            print(f"Segmen rekaman diputar lebih awal ({reason})")
+            cap.interrupt()
+
+    if RECORD_DIR and BACKEND == "ffmpeg":
+        recording.on_limit = on_record_limit
+
     # Variabel untuk perhitungan FPS
     frame_count = 0
     start_time = time.time()
     fps = 0
-
-    # Loop utama untuk mencoba kembali koneksi jika terputus
-    while True:
-        try:
-            # Buat objek VideoCapture untuk terhubung ke stream RTSP
-            cap = cv2.VideoCapture(rtsp_url)
-
-            if not cap.isOpened():
-                print("Gagal membuka stream RTSP. Memeriksa kembali dalam 5 detik...")
-                time.sleep(5)
+    was_connected = False
+    last_frame = None
+    last_overlay = 0.0
+    # Statistik keseluruhan sesi (lintas koneksi ulang)
+    total_displayed = 0
+    lag_total = 0.0
+    lag_max = 0.0
+
+    try:
+        while True:
+            # Ambil frame terbaru dari supervisor (frame lama sudah dilewati)
+            frame, grab_time = supervisor.read(FRAME_WAIT)
+
+            if supervisor.connected != was_connected:
+                was_connected = supervisor.connected
+                if was_connected:
+                    print("Berhasil terhubung ke stream! Menampilkan video...")
+                    start_time = time.time() # Reset timer saat koneksi berhasil
+                    frame_count = 0
+                else:
+                    print(f"Koneksi stream terganggu ({supervisor.last_error}). Mencoba menyambung kembali...")
+
+            if frame is None:
+                # Selama gangguan, frame terakhir tetap tampil dengan keterangan (diperbarui ~5x/detik)
+                now = time.monotonic()
+                if not supervisor.connected and last_frame is not None and now - last_overlay > 0.2:
+                    last_overlay = now
+                    elapsed = supervisor.outage_elapsed() or 0.0
+                    overlay = last_frame.copy()
+                    cv2.putText(overlay, f"Menyambung ulang... ({elapsed:.1f} s, percobaan {supervisor.attempt})",
+                                (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+                    cv2.imshow("ESP32-CAM RTSP Stream", overlay)
+                # Tetap pompa event jendela
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("Keluar diminta oleh pengguna.")
+                    break
                 continue
 
-            print("Berhasil terhubung ke stream! Menampilkan video...")
-            start_time = time.time() # Reset timer saat koneksi berhasil
-            frame_count = 0
+            frame_count += 1
 
-            while True:
-                # Baca satu frame dari stream
-                ret, frame = cap.read()
+            # Hitung FPS setiap 10 frame untuk stabilitas
+            if frame_count % 10 == 0:
+                elapsed_time = time.time() - start_time
+                fps = frame_count / elapsed_time if elapsed_time > 0 else 0
 
-                # Jika frame tidak berhasil dibaca, berarti koneksi terputus
-                if not ret:
-                    print("Koneksi stream terputus. Mencoba menyambung kembali...")
-                    break # Keluar dari loop dalam untuk mencoba koneksi ulang
+            # Lag tampilan: waktu sejak frame keluar dari decoder sampai ditampilkan
+            lag_ms = (time.monotonic() - grab_time) * 1000
+            total_displayed += 1
+            lag_total += lag_ms
+            lag_max = max(lag_max, lag_ms)
 
-                frame_count += 1
+            # Tambahkan teks FPS, lag, frame yang dilewati, dan jumlah gangguan ke frame
+            info_text = (f"FPS: {fps:.2f} | Lag: {lag_ms:.0f} ms | Dilewati: {supervisor.skipped}"
+                         f" | Gangguan: {supervisor.outages}")
+            cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+            last_frame = frame
 
-                # Hitung FPS setiap 10 frame untuk stabilitas
-                if frame_count % 10 == 0:
-                    elapsed_time = time.time() - start_time
-                    fps = frame_count / elapsed_time if elapsed_time > 0 else 0
+            # Tampilkan frame di jendela
+            cv2.imshow("ESP32-CAM RTSP Stream", frame)
 
-                # Tambahkan teks FPS ke frame
-                info_text = f"FPS: {fps:.2f}"
-                cv2.putText(frame, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+            # Tunggu tombol 'q' ditekan untuk keluar
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("Keluar diminta oleh pengguna.")
+                break
 
-                # Tampilkan frame di jendela
-                cv2.imshow("ESP32-CAM RTSP Stream", frame)
-
-                # Tunggu tombol 'q' ditekan untuk keluar
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    print("Keluar diminta oleh pengguna.")
-                    cap.release()
-                    cv2.destroyAllWindows()
-                    return # Keluar dari program sepenuhnya
-
-        except KeyboardInterrupt:
-            print("\nProgram dihentikan oleh pengguna (Ctrl+C).")
-            break
-        except Exception as e:
-            print(f"\nTerjadi error: {e}. Mencoba lagi...")
-            time.sleep(5)
+    except KeyboardInterrupt:
+        print("\nProgram dihentikan oleh pengguna (Ctrl+C).")
 
     # Pembersihan akhir
-    if 'cap' in locals() and cap.isOpened():
-        cap.release()
+    supervisor.stop()
+    if recording:
+        recording.stop()
     cv2.destroyAllWindows()
+    print_summary(supervisor, total_displayed, lag_total, lag_max)
     print("Program ditutup.")
 
+def print_summary(supervisor, total_displayed, lag_total, lag_max):
+    """Mencetak statistik tampilan dan gangguan stream."""
+    if total_displayed:
+        print(f"Frame ditampilkan: {total_displayed}, dilewati: {supervisor.skipped}")
+        print(f"Lag tampilan rata-rata/maks: {lag_total / total_displayed:.1f} / {lag_max:.1f} ms")
+    print(f"Gangguan stream: {supervisor.outages}")
+    if supervisor.detection_delays:
+        delays = supervisor.detection_delays
+        print(f"   Delay deteksi rata-rata/maks: {sum(delays) / len(delays):.2f} / {max(delays):.2f} s")
+    if supervisor.recovery_times:
+        times = supervisor.recovery_times
+        print(f"   Waktu pulih rata-rata/maks: {sum(times) / len(times):.2f} / {max(times):.2f} s")
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
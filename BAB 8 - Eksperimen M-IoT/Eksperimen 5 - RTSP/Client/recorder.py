@@ -0,0 +1,340 @@
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+# --- KONFIGURASI ---
+SEGMENT_SECONDS = 60 # Durasi satu segmen rekaman
+SEGMENT_FORMAT = "mkv" # Matroska tetap bisa diputar walau ffmpeg berhenti mendadak
+MAX_TOTAL_BYTES = 5 * 1024 ** 3 # Retensi: hapus segmen tertua jika total melebihi ini
+MAX_AGE_HOURS = 24.0 # Retensi: hapus segmen yang lebih tua dari ini (0 = tanpa batas umur)
+MAX_SEGMENT_BYTES = 512 * 1024 ** 2 # Segmen diputar lebih awal jika mencapai ukuran ini (0 = hanya waktu)
+MIN_FREE_BYTES = 1024 ** 3 # Sisa ruang disk minimum; segmen tertua dihapus dulu, lalu rekaman dijeda
+SEGMENT_LIST = "segments.csv" # Ditulis ffmpeg setiap segmen selesai
+INDEX_FILE = "index.jsonl" # Indeks timestamp: satu objek JSON per segmen
+NAME_FORMAT = "%Y%m%d-%H%M%S"
+# Dengan -c copy, header segmen butuh parameter codec (SPS/PPS untuk H.264) dari probe input.
+# -probesize 32 / -analyzeduration 0 milik tampilan latensi rendah bisa membuat ffmpeg mulai
+# menulis sebelum parameter itu terlihat, sehingga segmen mkv tidak bisa diputar.
+RECORD_PROBE_FLAGS = ["-probesize", "1000000", "-analyzeduration", "2000000"]
+# Alasan yang dikirim SegmentIndex ke `on_limit`
+LIMIT_SEGMENT_SIZE = "ukuran segmen"
+LIMIT_DISK_FULL = "ruang disk"
+SPACE_RECOVERED = "ruang disk pulih"
+
+def segment_output_args(directory, segment_seconds=SEGMENT_SECONDS, fmt=SEGMENT_FORMAT):
+    """
+    Argumen keluaran ffmpeg untuk rekaman passthrough: stream video disalin
+    apa adanya (-c copy, tanpa decode/encode) ke segmen berdurasi tetap
+    yang diberi nama waktu mulai. Bisa ditambahkan sebagai keluaran kedua
+    pada proses ffmpeg yang sama dengan tampilan (satu koneksi RTSP).
+    """
+    return ["-map", "0:v", "-c", "copy", "-f", "segment",
+            "-segment_time", str(segment_seconds), "-reset_timestamps", "1",
+            "-segment_list", os.path.join(directory, SEGMENT_LIST), "-segment_list_type", "csv",
+            "-strftime", "1", os.path.join(directory, f"{NAME_FORMAT}.{fmt}")]
+
+class SegmentIndex:
+    """
+    Mengikuti daftar segmen yang ditulis ffmpeg, membangun indeks timestamp
+    (file, waktu mulai/selesai dalam epoch, durasi, ukuran) di `index.jsonl`,
+    dan menegakkan retensi berdasarkan total ukuran, umur segmen, dan sisa
+    ruang disk.
+
+    ffmpeg hanya bisa memutar segmen berdasarkan waktu. Jika segmen yang
+    sedang ditulis melewati `max_segment_bytes`, atau ruang disk tetap di
+    bawah `min_free_bytes` setelah semua segmen lama dihapus, `on_limit`
+    dipanggil dengan alasannya; pemilik proses ffmpeg lalu menghentikannya
+    (segmen ditutup rapi) dan menjalankannya ulang, atau menunda rekaman
+    selama `disk_full`. Saat ruang disk kembali cukup, `on_limit` dipanggil
+    sekali dengan SPACE_RECOVERED agar rekaman bisa dilanjutkan.
+    """
+    def __init__(self, directory, max_bytes=MAX_TOTAL_BYTES, max_age_hours=MAX_AGE_HOURS, poll_interval=1.0,
+                 max_segment_bytes=MAX_SEGMENT_BYTES, min_free_bytes=MIN_FREE_BYTES, on_limit=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age_hours * 3600
+        self.max_segment_bytes = max_segment_bytes
+        self.min_free_bytes = min_free_bytes
+        self.on_limit = on_limit
+        self.disk_full = False
+        self.poll_interval = poll_interval
+        self.list_path = os.path.join(directory, SEGMENT_LIST)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.entries = self._load_index()
+        # Nama segmen yang sudah diindeks (termasuk yang sudah dihapus retensi)
+        self.seen = {entry["file"] for entry in self.entries}
+        self.deleted = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopping.wait(self.poll_interval):
+            self.poll()
+
+    def poll(self):
+        """Membaca segmen baru dari daftar ffmpeg lalu menegakkan retensi."""
+        if not os.path.exists(self.list_path):
+            return
+        # Daftar dibaca utuh setiap kali (kecil): ffmpeg menulis ulang daftar dari awal
+        # setiap kali dijalankan ulang, jadi segmen dikenali dari namanya, bukan posisinya
+        with open(self.list_path, newline="") as f:
+            # Baris terakhir bisa belum lengkap; proses hanya baris yang diakhiri newline
+            complete = [line for line in f if line.endswith("\n")]
+        for filename, start, end in csv.reader(complete):
+            if os.path.basename(filename) not in self.seen:
+                self._add(filename, float(start), float(end))
+        current = self._index_unlisted_segments()
+        was_full = self.disk_full
+        self._enforce_retention(current)
+        if self.on_limit is None:
+            return
+        if self.disk_full:
+            self.on_limit(LIMIT_DISK_FULL)
+        elif was_full:
+            self.on_limit(SPACE_RECOVERED)
+        elif self.max_segment_bytes > 0 and current > self.max_segment_bytes:
+            self.on_limit(LIMIT_SEGMENT_SIZE)
+
+    def _index_unlisted_segments(self):
+        """
+        Berkas segmen yang belum ada di daftar: yang terbaru sedang ditulis
+        ffmpeg, ukurannya dikembalikan. Yang lebih lama sudah ditutup tetapi
+        entrinya hilang karena ffmpeg mengosongkan daftar saat dijalankan
+        ulang (rotasi, restart) atau berhenti mendadak; segmen itu diindeks
+        dengan waktu selesai dari mtime berkas.
+        """
+        unlisted = []
+        for name in os.listdir(self.directory):
+            if name in self.seen:
+                continue
+            try:
+                datetime.strptime(os.path.splitext(name)[0], NAME_FORMAT)
+                unlisted.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except (ValueError, FileNotFoundError):
+                continue
+        if not unlisted:
+            return 0
+        unlisted.sort()
+        for mtime, name in unlisted[:-1]:
+            started = datetime.strptime(os.path.splitext(name)[0], NAME_FORMAT).timestamp()
+            self._add(name, 0.0, max(0.0, mtime - started))
+        try:
+            return os.path.getsize(os.path.join(self.directory, unlisted[-1][1]))
+        except FileNotFoundError:
+            return 0
+
+    def _free_bytes(self):
+        return shutil.disk_usage(self.directory).free
+
+    def _add(self, filename, start, end):
+        path = os.path.join(self.directory, os.path.basename(filename))
+        if not os.path.exists(path):
+            return
+        self.seen.add(os.path.basename(path))
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        try:
+            started = datetime.strptime(stem, NAME_FORMAT).timestamp()
+        except ValueError:
+            started = os.path.getmtime(path) - (end - start)
+        entry = {
+            "file": os.path.basename(path),
+            "start": started,
+            "end": started + (end - start),
+            "duration": round(end - start, 3),
+            "bytes": os.path.getsize(path),
+        }
+        self.entries.append(entry)
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _enforce_retention(self, current_bytes=0):
+        now = time.time()
+        # Segmen yang sedang ditulis ikut dihitung agar batas total tidak terlampaui satu segmen penuh
+        total = sum(e["bytes"] for e in self.entries) + current_bytes
+        low_space = self._free_bytes() < self.min_free_bytes
+        removed = False
+        while self.entries:
+            oldest = self.entries[0]
+            too_old = self.max_age > 0 and now - oldest["end"] > self.max_age
+            if not too_old and total <= self.max_bytes and not low_space:
+                break
+            try:
+                os.remove(os.path.join(self.directory, oldest["file"]))
+            except FileNotFoundError:
+                pass
+            total -= oldest["bytes"]
+            self.entries.pop(0)
+            self.deleted += 1
+            removed = True
+            low_space = self._free_bytes() < self.min_free_bytes
+        # Tidak ada lagi segmen lama yang bisa dihapus: rekaman harus dijeda
+        self.disk_full = low_space
+        if removed:
+            # Tulis ulang indeks tanpa segmen yang sudah dihapus
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for entry in self.entries:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.index_path)
+
+    def find(self, timestamp):
+        """Mengembalikan (file, offset detik) yang berisi waktu epoch tertentu, atau None."""
+        for entry in self.entries:
+            if entry["start"] <= timestamp < entry["end"]:
+                return entry["file"], timestamp - entry["start"]
+        return None
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.poll()
+
+class SegmentRecorder:
+    """
+    Perekam mandiri: ffmpeg menyalin stream RTSP ke segmen tanpa transcode
+    (CPU hampir nol berapa pun resolusinya) dan dijalankan ulang jika berhenti.
+    Segmen yang terlalu besar diputar dengan menjalankan ulang ffmpeg; selama
+    disk penuh ffmpeg tidak dijalankan.
+    """
+    def __init__(self, url, directory, transport="tcp", segment_seconds=SEGMENT_SECONDS,
+                 max_bytes=MAX_TOTAL_BYTES, max_age_hours=MAX_AGE_HOURS, restart_delay=2.0,
+                 max_segment_bytes=MAX_SEGMENT_BYTES, min_free_bytes=MIN_FREE_BYTES):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg tidak ditemukan di PATH")
+        os.makedirs(directory, exist_ok=True)
+        self.command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-rtsp_transport", transport,
+                        *RECORD_PROBE_FLAGS, "-i", url, *segment_output_args(directory, segment_seconds)]
+        self.index = SegmentIndex(directory, max_bytes, max_age_hours, max_segment_bytes=max_segment_bytes,
+                                  min_free_bytes=min_free_bytes, on_limit=self.rotate)
+        self.restart_delay = restart_delay
+        self.process = None
+        self.restarts = 0
+        self.rotations = 0
+        self.rotating = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.index.start()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        paused = False
+        while not self.stopping.is_set():
+            if self.index.disk_full:
+                if not paused:
+                    print("Ruang disk di bawah batas minimum, rekaman dijeda...")
+                    paused = True
+                self.stopping.wait(self.restart_delay)
+                continue
+            paused = False
+            self.process = subprocess.Popen(self.command, stdin=subprocess.DEVNULL)
+            self.process.wait()
+            if self.stopping.is_set():
+                break
+            if self.rotating:
+                # Dihentikan oleh rotate(): segmen baru langsung dimulai
+                self.rotating = False
+                continue
+            self.restarts += 1
+            print(f"ffmpeg perekam berhenti (kode {self.process.returncode}), dijalankan ulang...")
+            self.stopping.wait(self.restart_delay)
+
+    def rotate(self, reason):
+        """Dipanggil SegmentIndex: tutup segmen berjalan dengan menghentikan ffmpeg."""
+        if reason == SPACE_RECOVERED:
+            return # _run sudah menunggu disk_full hilang lalu menjalankan ffmpeg lagi
+        process = self.process
+        if process is None or process.poll() is not None or self.rotating:
+            return
+        self.rotating = True
+        self.rotations += 1
+        print(f"Segmen diputar lebih awal ({reason})")
+        process.terminate()
+
+    def stop(self):
+        self.stopping.set()
+        if self.process and self.process.poll() is None:
+            # 'q' di stdin tidak tersedia (DEVNULL); SIGTERM membuat ffmpeg menutup segmen dengan rapi
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.index.stop()
+
+def main():
+    """
+    Merekam stream RTSP ke disk tanpa transcode.
+    Penggunaan: python recorder.py [URL_ATAU_IP] [DIREKTORI] [--segment DETIK] [--max-gb GB] [--max-hours JAM]
+                [--segment-mb MB] [--min-free-gb GB]
+    """
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] in ['-h', '--help']:
+        print(main.__doc__)
+        return
+    segment_seconds, max_bytes, max_age_hours = SEGMENT_SECONDS, MAX_TOTAL_BYTES, MAX_AGE_HOURS
+    max_segment_bytes, min_free_bytes = MAX_SEGMENT_BYTES, MIN_FREE_BYTES
+    if "--segment" in args:
+        i = args.index("--segment")
+        segment_seconds = float(args[i + 1])
+        del args[i:i + 2]
+    if "--max-gb" in args:
+        i = args.index("--max-gb")
+        max_bytes = int(float(args[i + 1]) * 1024 ** 3)
+        del args[i:i + 2]
+    if "--max-hours" in args:
+        i = args.index("--max-hours")
+        max_age_hours = float(args[i + 1])
+        del args[i:i + 2]
+    if "--segment-mb" in args:
+        i = args.index("--segment-mb")
+        max_segment_bytes = int(float(args[i + 1]) * 1024 ** 2)
+        del args[i:i + 2]
+    if "--min-free-gb" in args:
+        i = args.index("--min-free-gb")
+        min_free_bytes = int(float(args[i + 1]) * 1024 ** 3)
+        del args[i:i + 2]
+    target, directory = args[0], args[1]
+    url = target if "://" in target else f"rtsp://{target}:554/mjpeg/1"
+
+    recorder = SegmentRecorder(url, directory, segment_seconds=segment_seconds,
+                               max_bytes=max_bytes, max_age_hours=max_age_hours,
+                               max_segment_bytes=max_segment_bytes, min_free_bytes=min_free_bytes).start()
+    print(f"Merekam {url} ke '{directory}' (segmen {segment_seconds:.0f} s). Tekan Ctrl+C untuk berhenti.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+        entries = recorder.index.entries
+        total_mb = sum(e["bytes"] for e in entries) / 1024 ** 2
+        print(f"Segmen tersimpan: {len(entries)} ({total_mb:.1f} MB), dihapus oleh retensi: {recorder.index.deleted}, "
+              f"restart ffmpeg: {recorder.restarts}, rotasi karena batas: {recorder.rotations}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+
+# Timestamp (ms sejak epoch) dikodekan sebagai blok hitam/putih di pojok kiri atas
+# frame, sehingga latensi end-to-end bisa diukur dari frame hasil decode klien
+STAMP_BITS = 48
+STAMP_BLOCK = 16 # Piksel per blok, selaras dengan grid DCT 8x8 agar tahan kompresi
+STAMP_COLUMNS = 24
+
+def encode_timestamp(frame, timestamp):
+    """Menulis timestamp (detik, float) ke frame BGR sebagai pola blok."""
+    value = int(timestamp * 1000)
+    for bit in range(STAMP_BITS):
+        row, col = divmod(bit, STAMP_COLUMNS)
+        y, x = row * STAMP_BLOCK, col * STAMP_BLOCK
+        frame[y:y + STAMP_BLOCK, x:x + STAMP_BLOCK] = 255 if (value >> bit) & 1 else 0
+
+def decode_timestamp(frame):
+    """Membaca timestamp dari frame BGR. Mengembalikan detik (float) atau None jika tidak valid."""
+    value = 0
+    quarter = STAMP_BLOCK // 4
+    for bit in range(STAMP_BITS):
+        row, col = divmod(bit, STAMP_COLUMNS)
+        y, x = row * STAMP_BLOCK + quarter, col * STAMP_BLOCK + quarter
+        # Rata-rata bagian tengah blok agar tidak terpengaruh artefak di tepi
+        if frame[y:y + 2 * quarter, x:x + 2 * quarter].mean() > 127:
+            value |= 1 << bit
+    timestamp = value / 1000
+    # Pola rusak/bukan frame uji menghasilkan nilai acak yang jauh dari waktu sekarang
+    return timestamp if abs(time.time() - timestamp) < 60 else None
+
+class TestStreamPublisher:
+    """
+    Sumber RTSP uji tanpa kamera: frame sintetis ber-timestamp dikirim ke
+    ffmpeg yang mempublikasikannya ke server RTSP lokal (misal MediaMTX).
+    Codec default MJPEG agar mirip stream /mjpeg/1 dari ESP32-CAM.
+    """
+    def __init__(self, url, size=(640, 480), fps=20, codec="mjpeg", label=None):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg tidak ditemukan di PATH")
+        self.url = url
+        self.width, self.height = size
+        self.fps = fps
+        self.frame = np.zeros((self.height, self.width, 3), np.uint8)
+        self.frame[..., 1] = np.linspace(40, 200, self.width, dtype=np.uint8)
+        cv2.putText(self.frame, label or url.rsplit("/", 1)[-1], (20, self.height - 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        self.background = self.frame.copy()
+        if codec == "h264":
+            codec_flags = ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-g", str(fps)]
+        else:
+            codec_flags = ["-c:v", "mjpeg", "-q:v", "5"]
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{self.width}x{self.height}",
+                   "-r", str(fps), "-i", "-", *codec_flags,
+                   "-f", "rtsp", "-rtsp_transport", "tcp", url]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_deadline = time.monotonic()
+        position = 0
+        while self.running:
+            np.copyto(self.frame, self.background)
+            x = position % (self.width - 40)
+            self.frame[self.height // 2:self.height // 2 + 40, x:x + 40] = 255
+            position += 8
+            encode_timestamp(self.frame, time.time())
+            try:
+                self.process.stdin.write(self.frame.data)
+            except (BrokenPipeError, ValueError):
+                break
+            next_deadline += interval
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                next_deadline = time.monotonic()
+
+    def stop(self):
+        self.running = False
+        self.thread.join(timeout=2)
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+def numbered_urls(base_url, count):
+    """
+    URL stream uji ke-0 .. count-1: base_url + indeks, juga untuk count = 1.
+    Dipakai juga oleh `wall.py --base URL --count N` agar namanya selalu cocok.
+    """
+    return [f"{base_url}{i}" for i in range(count)]
+
+def main():
+    """
+    Menjalankan satu atau beberapa sumber RTSP uji ke server lokal.
+    Penggunaan: python rtsp_test_source.py [URL_DASAR] [JUMLAH] [FPS]
+    Contoh (MediaMTX di port 8554): python rtsp_test_source.py rtsp://127.0.0.1:8554/cam 4 20
+    -> rtsp://127.0.0.1:8554/cam0 .. cam3 (satu stream: cam0)
+    """
+    if len(sys.argv) < 2:
+        print(main.__doc__)
+        return
+    base_url = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    urls = numbered_urls(base_url, count)
+    publishers = [TestStreamPublisher(url, fps=fps) for url in urls]
+    print(f"Mempublikasikan {len(urls)} stream uji: {', '.join(urls)}")
+    print("Tekan Ctrl+C untuk berhenti.")
+    try:
+        while all(p.process.poll() is None for p in publishers):
+            time.sleep(0.5)
+        print("ffmpeg berhenti. Pastikan server RTSP (misal MediaMTX) sudah berjalan.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for publisher in publishers:
+            publisher.stop()
+
+if __name__ == '__main__':
+    main()
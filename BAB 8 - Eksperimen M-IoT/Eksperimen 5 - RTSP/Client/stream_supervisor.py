@@ -0,0 +1,133 @@
+import threading
+import time
+from frame_grabber import LatestFrameGrabber
+
+class StreamSupervisor:
+    """
+    Mengelola siklus hidup koneksi stream di thread latar: membuka capture,
+    menjalankan LatestFrameGrabber, dan watchdog yang mendeteksi stream macet
+    (tidak ada frame selama `stall_timeout`) atau terputus (read gagal).
+
+    Koneksi ulang memakai backoff "cepat dulu": percobaan pertama langsung,
+    berikutnya base, 2*base, 4*base, ... hingga `backoff_max`. Setiap gangguan
+    dicatat: delay deteksi (frame terakhir -> gangguan terdeteksi) dan waktu
+    pulih (gangguan terdeteksi -> frame pertama koneksi baru).
+
+    `open_capture` adalah fungsi tanpa argumen yang mengembalikan objek capture
+    (VideoCapture atau FfmpegCapture) dengan timeout buka/baca sudah diatur.
+    """
+    WATCHDOG_INTERVAL = 0.1
+
+    def __init__(self, open_capture, stall_timeout=2.0, backoff_base=0.5, backoff_max=10.0):
+        self.open_capture = open_capture
+        self.stall_timeout = stall_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.grabber = None
+        self.connected = False
+        self.attempt = 0
+        self.last_error = ""
+        self.outage_detected_at = None
+        self.outages = 0
+        self.detection_delays = []
+        self.recovery_times = []
+        self.skipped_total = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def read(self, timeout=0.1):
+        """Frame terbaru yang belum dibaca sebagai (frame, waktu grab), atau (None, None)."""
+        grabber = self.grabber
+        if grabber is None:
+            self.stopping.wait(timeout)
+            return None, None
+        return grabber.read(timeout)
+
+    @property
+    def skipped(self):
+        """Total frame yang dilewati tampilan di semua sesi."""
+        grabber = self.grabber
+        return self.skipped_total + (grabber.skipped if grabber else 0)
+
+    def outage_elapsed(self):
+        """Detik sejak gangguan terakhir terdeteksi, atau None jika sedang terhubung."""
+        detected_at = self.outage_detected_at
+        return None if detected_at is None else time.monotonic() - detected_at
+
+    def _backoff_delay(self):
+        if self.attempt <= 1:
+            return 0.0
+        return min(self.backoff_base * 2 ** (self.attempt - 2), self.backoff_max)
+
+    def _open(self):
+        """Membuka capture. Mengembalikan objek capture atau None jika gagal."""
+        try:
+            cap = self.open_capture()
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+        if not cap.isOpened():
+            self.last_error = "gagal membuka stream"
+            cap.release()
+            return None
+        return cap
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.attempt += 1
+            if self.stopping.wait(self._backoff_delay()):
+                break
+            cap = self._open()
+            if cap is None:
+                continue
+            opened_at = time.monotonic()
+            grabber = LatestFrameGrabber(cap).start()
+            self.grabber = grabber
+            reason = self._watch(grabber, opened_at)
+            self.grabber = None
+            self.connected = False
+            self.skipped_total += grabber.skipped
+            # Saat macet, read() mungkin masih memblokir: jangan tunggu, thread grab
+            # melepaskan capture sendiri setelah read() kembali
+            grabber.stop(wait=reason != "stream macet")
+            if reason is None:
+                break
+            self.last_error = reason
+
+    def _watch(self, grabber, opened_at):
+        """
+        Watchdog satu sesi. Mengembalikan alasan gangguan, atau None jika
+        supervisor dihentikan.
+        """
+        while not self.stopping.wait(self.WATCHDOG_INTERVAL):
+            now = time.monotonic()
+            if grabber.grabbed and not self.connected:
+                # Frame pertama sesi ini: koneksi (kembali) sehat
+                self.connected = True
+                self.attempt = 0
+                if self.outage_detected_at is not None:
+                    self.recovery_times.append(grabber.first_grab_time - self.outage_detected_at)
+                    self.outage_detected_at = None
+            last_frame = grabber.grab_time if grabber.grabbed else opened_at
+            if grabber.failed:
+                reason = "stream terputus"
+            elif now - last_frame > self.stall_timeout:
+                reason = "stream macet"
+            else:
+                continue
+            if self.connected and self.outage_detected_at is None:
+                self.outages += 1
+                self.detection_delays.append(now - last_frame)
+                self.outage_detected_at = now
+            return reason
+        return None
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
@@ -0,0 +1,231 @@
+import math
+import multiprocessing as mp
+import sys
+import time
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+import main as viewer
+from rtsp_test_source import numbered_urls
+from stream_supervisor import StreamSupervisor
+
+# --- KONFIGURASI ---
+TILE_SIZE = (320, 240) # Ukuran satu petak (lebar, tinggi); stream diperkecil di proses worker
+DISPLAY_FPS = 15.0 # Laju render mosaik, tidak bergantung pada FPS stream
+STALE_AFTER = 2.0 # Detik tanpa frame baru sebelum petak ditandai basi
+STATS_INTERVAL = 5.0 # Detik antar laporan per stream pada mode headless
+HEADLESS = False
+
+# Kolom metadata per stream (float64 di shared memory)
+META_SEQ = 0 # Seqlock: ganjil = worker sedang menulis petak
+META_FRAMES = 1
+META_LAST_FRAME = 2 # time.monotonic() frame terakhir (jam monotonic sama untuk semua proses)
+META_FPS = 3
+META_CONNECTED = 4
+META_FIELDS = 5
+
+def _attach_shared_memory(name):
+    """Membuka blok shared memory yang sudah ada tanpa didaftarkan ulang ke resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 belum mendukung argumen track
+        return shared_memory.SharedMemory(name=name)
+
+def stream_url(target):
+    """URL RTSP lengkap, atau alamat IP ESP32-CAM yang diubah ke URL /mjpeg/1."""
+    return target if "://" in target else f"rtsp://{target}:554/mjpeg/1"
+
+def stream_worker(index, url, backend, frames_name, meta_name, count, stop):
+    """
+    Proses worker satu stream: decode (di prosesnya sendiri, tanpa berbagi GIL),
+    perkecil ke ukuran petak, lalu tulis langsung ke slot shared memory.
+    Reconnect dan deteksi macet ditangani StreamSupervisor.
+    """
+    cv2.setNumThreads(1) # Paralelisme berasal dari jumlah proses
+    viewer.BACKEND = backend
+    width, height = TILE_SIZE
+    frames_shm = _attach_shared_memory(frames_name)
+    meta_shm = _attach_shared_memory(meta_name)
+    tiles = np.ndarray((count, height, width, 3), np.uint8, buffer=frames_shm.buf)
+    meta = np.ndarray((count, META_FIELDS), np.float64, buffer=meta_shm.buf)
+    tile, row = tiles[index], meta[index]
+    supervisor = StreamSupervisor(lambda: viewer.open_capture(url)).start()
+    window_start, window_frames = time.monotonic(), 0
+    try:
+        while not stop.is_set():
+            frame, grab_time = supervisor.read(0.2)
+            row[META_CONNECTED] = 1.0 if supervisor.connected else 0.0
+            now = time.monotonic()
+            if frame is not None:
+                row[META_SEQ] += 1
+                cv2.resize(frame, (width, height), dst=tile, interpolation=cv2.INTER_AREA)
+                row[META_SEQ] += 1
+                row[META_FRAMES] += 1
+                row[META_LAST_FRAME] = grab_time
+                window_frames += 1
+            if now - window_start >= 1.0:
+                row[META_FPS] = window_frames / (now - window_start)
+                window_start, window_frames = now, 0
+    finally:
+        supervisor.stop()
+        del tile, row, tiles, meta
+        frames_shm.close()
+        meta_shm.close()
+
+class Compositor:
+    """
+    Menyusun petak dari shared memory menjadi satu mosaik. Petak hanya disalin
+    jika nomor seqlock berubah, dan salinan yang sobek (worker sedang menulis)
+    dibuang sehingga mosaik selalu berisi frame utuh.
+    """
+    def __init__(self, names, tiles, meta):
+        self.names = names
+        self.tiles = tiles
+        self.meta = meta
+        count = len(names)
+        self.cols = math.ceil(math.sqrt(count))
+        self.rows = math.ceil(count / self.cols)
+        height, width = tiles.shape[1:3]
+        self.mosaic = np.zeros((self.rows * height, self.cols * width, 3), np.uint8)
+        self.clean = self.mosaic.copy() # Petak tanpa overlay, agar teks tidak menumpuk
+        self.scratch = np.empty_like(tiles[0])
+        self.last_seq = np.full(count, -1.0)
+        self.torn = 0
+
+    def cell(self, image, index):
+        height, width = self.tiles.shape[1:3]
+        row, col = divmod(index, self.cols)
+        return image[row * height:(row + 1) * height, col * width:(col + 1) * width]
+
+    def render(self):
+        now = time.monotonic()
+        for i, name in enumerate(self.names):
+            seq = self.meta[i, META_SEQ]
+            if seq != self.last_seq[i] and seq % 2 == 0:
+                np.copyto(self.scratch, self.tiles[i])
+                if self.meta[i, META_SEQ] == seq:
+                    np.copyto(self.cell(self.clean, i), self.scratch)
+                    self.last_seq[i] = seq
+                else:
+                    self.torn += 1
+            cell = self.cell(self.mosaic, i)
+            np.copyto(cell, self.cell(self.clean, i))
+            age = now - self.meta[i, META_LAST_FRAME] if self.meta[i, META_FRAMES] else math.inf
+            stale = age > STALE_AFTER
+            color = (0, 0, 255) if stale else (0, 255, 0)
+            cv2.putText(cell, f"{name} {self.meta[i, META_FPS]:.1f} FPS", (6, 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+            if stale:
+                status = "menyambung ulang" if not self.meta[i, META_CONNECTED] else "macet"
+                age_text = "-" if math.isinf(age) else f"{age:.1f} s"
+                cv2.putText(cell, f"basi {age_text} ({status})", (6, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+                cv2.rectangle(cell, (0, 0), (cell.shape[1] - 1, cell.shape[0] - 1), color, 2)
+        return self.mosaic
+
+def print_stream_stats(names, meta):
+    now = time.monotonic()
+    print(f"{'stream':>24} | {'FPS':>5} | {'frame':>7} | {'basi (s)':>8} | status")
+    for i, name in enumerate(names):
+        age = now - meta[i, META_LAST_FRAME] if meta[i, META_FRAMES] else math.inf
+        status = "terhubung" if meta[i, META_CONNECTED] else "menyambung ulang"
+        print(f"{name[-24:]:>24} | {meta[i, META_FPS]:>5.1f} | {int(meta[i, META_FRAMES]):>7} | {age:>8.1f} | {status}")
+
+def main():
+    """
+    Dinding multi-kamera: setiap stream RTSP di-decode di proses worker-nya
+    sendiri, hasilnya ditulis ke slot shared memory, dan proses utama
+    (compositor) menyusun mosaik pada laju tetap tanpa menyalin frame lewat pipe.
+    """
+    global HEADLESS
+    args = sys.argv[1:]
+    if not args or args[0] in ['-h', '--help']:
+        print("Penggunaan: python wall.py [URL_ATAU_IP ...] [--base URL --count N] [--backend opencv|ffmpeg] [--headless]")
+        print("\nContoh:")
+        print("  python wall.py 192.168.1.20 192.168.1.21 192.168.1.22")
+        print("  python rtsp_test_source.py rtsp://127.0.0.1:8554/cam 16  # 16 stream uji lokal")
+        print("  python wall.py --base rtsp://127.0.0.1:8554/cam --count 16")
+        return
+    backend = "opencv"
+    if "--headless" in args:
+        HEADLESS = True
+        args.remove("--headless")
+    if "--backend" in args:
+        i = args.index("--backend")
+        backend = args[i + 1]
+        del args[i:i + 2]
+    if "--base" in args:
+        i = args.index("--base")
+        base = args[i + 1]
+        del args[i:i + 2]
+        count = 1
+        if "--count" in args:
+            i = args.index("--count")
+            count = int(args[i + 1])
+            del args[i:i + 2]
+        args += numbered_urls(base, count)
+    urls = [stream_url(target) for target in args]
+    count = len(urls)
+
+    width, height = TILE_SIZE
+    frames_shm = shared_memory.SharedMemory(create=True, size=count * height * width * 3)
+    meta_shm = shared_memory.SharedMemory(create=True, size=count * META_FIELDS * 8)
+    tiles = np.ndarray((count, height, width, 3), np.uint8, buffer=frames_shm.buf)
+    meta = np.ndarray((count, META_FIELDS), np.float64, buffer=meta_shm.buf)
+    tiles[...] = 0
+    meta[...] = 0
+    stop = mp.Event()
+    workers = [
+        mp.Process(target=stream_worker,
+                   args=(i, url, backend, frames_shm.name, meta_shm.name, count, stop), daemon=True)
+        for i, url in enumerate(urls)
+    ]
+    for worker in workers:
+        worker.start()
+    names = [url.split("://", 1)[-1] for url in urls]
+    compositor = Compositor(names, tiles, meta)
+    print(f"Dinding {count} stream ({compositor.cols}x{compositor.rows}), backend {backend}. Tekan 'q' untuk keluar.")
+
+    interval = 1.0 / DISPLAY_FPS
+    next_deadline = time.monotonic()
+    last_stats = time.monotonic()
+    try:
+        while True:
+            if HEADLESS:
+                if time.monotonic() - last_stats >= STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    print_stream_stats(names, meta)
+                time.sleep(0.2)
+                continue
+            cv2.imshow("RTSP Wall", compositor.render())
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            # Pacing berbasis deadline untuk laju render tetap
+            next_deadline += interval
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                next_deadline = time.monotonic()
+    except KeyboardInterrupt:
+        print("\nProgram dihentikan oleh pengguna.")
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        print_stream_stats(names, meta)
+        if compositor.torn:
+            print(f"Salinan petak sobek yang dibuang: {compositor.torn}")
+        del tiles, meta, compositor
+        frames_shm.close()
+        frames_shm.unlink()
+        meta_shm.close()
+        meta_shm.unlink()
+        if not HEADLESS:
+            cv2.destroyAllWindows()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+# --- KONFIGURASI ---
+RTSP_PORT = 8554
+MAIN_PATH = "stream1" # rtsp://<IP_RASPBERRY_PI>:8554/stream1
+SUB_PATH = "stream1_sub" # Sub-stream bitrate rendah dari capture yang sama
+# Stream utama: H.264 dari encoder hardware rpicam-vid, diteruskan tanpa transcode
+MAIN_SIZE = (1920, 1080)
+MAIN_FPS = 30
+MAIN_BITRATE = 4_000_000
+KEYFRAME_INTERVAL = 30 # Frame; klien baru dan sub-stream bisa mulai dari keyframe berikutnya
+# Sub-stream: di-decode, diperkecil, dan di-encode ulang oleh ffmpeg
+SUB_SIZE = (640, 360)
+SUB_FPS = 15
+SUB_BITRATE = 500_000
+SUB_ENCODER = "libx264" # Di Raspberry Pi 4 bisa diganti "h264_v4l2m2m" (encoder hardware)
+# Server RTSP (MediaMTX) dan API-nya untuk menghitung klien
+MEDIAMTX_PATH = "mediamtx"
+MEDIAMTX_API_PORT = 9997
+# Supervisi
+STATS_INTERVAL = 5.0 # Detik antar laporan per tahap
+STALL_TIMEOUT = 5.0 # Detik tanpa aktivitas sebelum proses tahap dimatikan dan dijalankan ulang
+RESTART_BACKOFF_BASE = 0.5 # Restart pertama langsung, lalu 0.5, 1, 2, ... detik
+RESTART_BACKOFF_MAX = 10.0
+RELAY_CHUNK = 64 * 1024 # Byte per pembacaan dari encoder
+RELAY_QUEUE = 64 # Frame (access unit) yang boleh antre per konsumen sebelum dibuang
+SYNTHETIC = False # Sumber uji ffmpeg (testsrc2) menggantikan kamera Pi (--synthetic)
+
+class StageStats:
+    """Penghitung byte/frame satu tahap, di-reset setiap laporan."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.frames = 0
+        self.window_start = time.monotonic()
+        self.last_activity = time.monotonic()
+
+    def add(self, nbytes, frames=0):
+        with self.lock:
+            self.bytes += nbytes
+            self.frames += frames
+            if nbytes or frames:
+                self.last_activity = time.monotonic()
+
+    def snapshot_and_reset(self):
+        """Mengembalikan (FPS, kbps) sejak panggilan terakhir."""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.window_start
+            fps = self.frames / elapsed if elapsed > 0 else 0.0
+            kbps = self.bytes * 8 / 1000 / elapsed if elapsed > 0 else 0.0
+            self.bytes, self.frames, self.window_start = 0, 0, now
+        return fps, kbps
+
+class ManagedProcess:
+    """
+    Satu proses tahap pipeline yang dijalankan ulang otomatis saat berhenti,
+    dengan backoff "cepat dulu". `reader(process)` (opsional) dijalankan di
+    thread supervisi selama proses hidup, misalnya untuk me-relay stdout
+    encoder atau membaca laporan -progress ffmpeg. Tahap dengan `feed=True`
+    menerima frame H.264 utuh lewat `feed()`; penulisan dilakukan thread
+    terpisah dengan antrean terbatas agar konsumen yang lambat tidak menahan
+    tahap lain.
+
+    Frame yang dibuang membuat frame P berikutnya merujuk data yang tidak
+    pernah sampai ke decoder, jadi setelah satu frame dibuang (antrean penuh)
+    atau proses dijalankan ulang, semua frame dilewati sampai keyframe (IDR)
+    berikutnya.
+    """
+    def __init__(self, name, command, reader=None, feed=False):
+        self.name = name
+        self.command = command
+        self.reader = reader
+        self.stats = StageStats()
+        self.process = None
+        self.restarts = 0
+        self.attempt = 0
+        self.dropped_frames = 0
+        self.waiting_for_keyframe = False
+        self.stopping = threading.Event()
+        self.queue = queue.Queue(RELAY_QUEUE) if feed else None
+        self.threads = []
+
+    def start(self):
+        self.threads.append(threading.Thread(target=self._supervise, daemon=True))
+        if self.queue is not None:
+            self.threads.append(threading.Thread(target=self._write_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _supervise(self):
+        while not self.stopping.is_set():
+            self.attempt += 1
+            delay = 0.0 if self.attempt <= 1 else min(RESTART_BACKOFF_BASE * 2 ** (self.attempt - 2),
+                                                      RESTART_BACKOFF_MAX)
+            if self.stopping.wait(delay):
+                break
+            started = time.monotonic()
+            try:
+                self.process = subprocess.Popen(
+                    self.command,
+                    stdin=subprocess.PIPE if self.queue is not None else subprocess.DEVNULL,
+                    stdout=subprocess.PIPE if self.reader else subprocess.DEVNULL,
+                )
+            except OSError as e:
+                logging.error(f"[{self.name}] gagal dijalankan: {e}")
+                continue
+            self.stats.last_activity = time.monotonic()
+            logging.info(f"[{self.name}] berjalan (pid {self.process.pid})")
+            if self.reader:
+                try:
+                    self.reader(self.process)
+                except Exception as e:
+                    logging.error(f"[{self.name}] error saat membaca keluaran: {e}")
+            self.process.wait()
+            if self.stopping.is_set():
+                break
+            if time.monotonic() - started > 30:
+                # Proses sempat berjalan stabil: restart berikutnya langsung lagi
+                self.attempt = 0
+            self.restarts += 1
+            logging.warning(f"[{self.name}] berhenti (kode {self.process.returncode}), dijalankan ulang...")
+
+    def _write_loop(self):
+        written_to = None
+        while not self.stopping.is_set():
+            item = self.queue.get()
+            process = self.process
+            if item is None or process is None or process.poll() is not None:
+                continue
+            unit, keyframe = item
+            if process is not written_to:
+                # Proses baru (restart): decoder-nya harus mulai dari keyframe
+                if not keyframe:
+                    continue
+                written_to = process
+            try:
+                process.stdin.write(unit)
+                process.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                # Proses sedang berhenti; thread supervisi akan menjalankannya ulang
+                pass
+
+    def feed(self, unit, keyframe):
+        """
+        Mengantrekan satu frame untuk stdin proses. Jika antrean penuh frame
+        dibuang, begitu juga frame berikutnya sampai keyframe.
+        """
+        if self.waiting_for_keyframe:
+            if not keyframe:
+                self.dropped_frames += 1
+                return
+            self.waiting_for_keyframe = False
+        try:
+            self.queue.put_nowait((unit, keyframe))
+        except queue.Full:
+            self.dropped_frames += 1
+            self.waiting_for_keyframe = True
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def kill(self):
+        """Mematikan proses saat ini (misal karena macet); supervisi akan menjalankannya ulang."""
+        if self.is_running():
+            self.process.kill()
+
+    def stop(self):
+        self.stopping.set()
+        if self.queue is not None:
+            self.queue.put(None)
+        if self.is_running():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+class AccessUnitSplitter:
+    """
+    Memotong stream H.264 Annex-B menjadi access unit (satu frame utuh)
+    sehingga relay hanya membuang frame utuh, bukan potongan byte sembarang.
+    Access unit baru dimulai pada NAL AUD/SEI/SPS/PPS (tipe 9/6/7/8) atau
+    slice (tipe 1/5) dengan first_mb_in_slice = 0, jika access unit yang
+    sedang dikumpulkan sudah berisi slice. Sebuah frame baru dikeluarkan
+    begitu awal frame berikutnya terlihat, seperti parser h264 ffmpeg.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scan = 0 # Posisi lanjutan pencarian start code di buffer
+        self.has_slice = False
+        self.keyframe = False
+
+    def feed(self, data):
+        """Menambahkan data dari encoder; mengembalikan daftar (bytes frame, keyframe) yang sudah lengkap."""
+        buf = self.buffer
+        buf += data
+        units = []
+        start = 0
+        i = buf.find(b"\x00\x00\x01", self.scan)
+        # Butuh byte header NAL dan satu byte sesudahnya (bit first_mb_in_slice)
+        while i != -1 and i + 4 < len(buf):
+            nal_type = buf[i + 3] & 0x1F
+            is_slice = nal_type in (1, 5)
+            if self.has_slice and (nal_type in (6, 7, 8, 9) or (is_slice and buf[i + 4] & 0x80)):
+                # Nol di depan start code 4 byte ikut ke frame berikutnya
+                cut = i - 1 if i > start and buf[i - 1] == 0 else i
+                units.append((bytes(buf[start:cut]), self.keyframe))
+                start = cut
+                self.has_slice = False
+                self.keyframe = False
+            if is_slice:
+                self.has_slice = True
+            if nal_type == 5:
+                self.keyframe = True
+            i = buf.find(b"\x00\x00\x01", i + 3)
+        # Start code bisa terbelah di akhir data; ulangi pencarian dari 2 byte terakhir
+        resume = i if i != -1 else max(start, len(buf) - 2)
+        del buf[:start]
+        self.scan = resume - start
+        return units
+
+def ffmpeg_progress_reader(stage):
+    """
+    Membuat reader yang menghitung frame keluaran dari `-progress pipe:1` ffmpeg.
+    (Byte keluaran dihitung dari API MediaMTX karena keluaran RTSP tidak
+    melaporkan total_size.)
+    """
+    def reader(process):
+        last_frame = 0
+        for raw in process.stdout:
+            key, _, value = raw.decode(errors="replace").strip().partition("=")
+            if key == "frame" and value.isdigit():
+                frame = int(value)
+                if frame > last_frame:
+                    stage.stats.add(0, frame - last_frame)
+                last_frame = frame
+    return reader
+
+def source_command():
+    """Perintah encoder: rpicam-vid (H.264 hardware) atau sumber uji ffmpeg."""
+    width, height = MAIN_SIZE
+    if SYNTHETIC:
+        return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-re",
+                "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={MAIN_FPS}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+                "-b:v", str(MAIN_BITRATE), "-g", str(KEYFRAME_INTERVAL),
+                "-bsf:v", "dump_extra", "-f", "h264", "-"]
+    # --inline: SPS/PPS diulang di setiap keyframe agar konsumen yang restart bisa langsung decode
+    return ["rpicam-vid", "-t", "0", "-n", "--width", str(width), "--height", str(height),
+            "--framerate", str(MAIN_FPS), "--bitrate", str(MAIN_BITRATE),
+            "--intra", str(KEYFRAME_INTERVAL), "--inline", "--codec", "h264", "-o", "-"]
+
+def publisher_command(path, transcode):
+    """Perintah ffmpeg yang membaca H.264 dari stdin dan mempublikasikannya ke MediaMTX."""
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+               "-fflags", "+genpts", "-f", "h264", "-framerate", str(MAIN_FPS), "-i", "pipe:0"]
+    if transcode:
+        width, height = SUB_SIZE
+        command += ["-vf", f"scale={width}:{height},fps={SUB_FPS}", "-c:v", SUB_ENCODER,
+                    "-b:v", str(SUB_BITRATE), "-maxrate", str(SUB_BITRATE),
+                    "-bufsize", str(SUB_BITRATE * 2), "-g", str(SUB_FPS)]
+        if SUB_ENCODER == "libx264":
+            command += ["-preset", "ultrafast", "-tune", "zerolatency"]
+    else:
+        command += ["-c", "copy"]
+    return command + ["-f", "rtsp", "-rtsp_transport", "tcp", f"rtsp://127.0.0.1:{RTSP_PORT}/{path}"]
+
+def write_mediamtx_config(directory):
+    path = os.path.join(directory, "mediamtx.yml")
+    with open(path, "w") as f:
+        f.write(f"rtspAddress: :{RTSP_PORT}\n")
+        f.write("api: yes\n")
+        f.write(f"apiAddress: 127.0.0.1:{MEDIAMTX_API_PORT}\n")
+        f.write("rtmp: no\nhls: no\nwebrtc: no\nsrt: no\n")
+        f.write("paths:\n  all_others:\n")
+    return path
+
+def fetch_paths():
+    """
+    Status path dari API MediaMTX: {nama: (jumlah klien, byte diterima)},
+    atau {} jika API tidak tersedia.
+    """
+    try:
+        url = f"http://127.0.0.1:{MEDIAMTX_API_PORT}/v3/paths/list"
+        with urllib.request.urlopen(url, timeout=1) as response:
+            items = json.load(response).get("items", [])
+        return {item["name"]: (len(item.get("readers", [])), item.get("bytesReceived", 0)) for item in items}
+    except Exception:
+        return {}
+
+def report(stages, paths, last_bytes):
+    """Mencetak status, FPS, bitrate, dan jumlah klien per tahap."""
+    lines = [f"{'tahap':>8} | {'status':>7} | {'restart':>7} | {'FPS':>5} | {'kbps':>7} | klien"]
+    for stage, path in stages:
+        client_text = "-"
+        if path in paths:
+            clients, received = paths[path]
+            # Byte yang diterima server dari publisher = bitrate keluaran tahap ini
+            stage.stats.add(max(0, received - last_bytes.get(path, received)))
+            last_bytes[path] = received
+            client_text = str(clients)
+        fps, kbps = stage.stats.snapshot_and_reset()
+        status = "jalan" if stage.is_running() else "mati"
+        lines.append(f"{stage.name:>8} | {status:>7} | {stage.restarts:>7} | {fps:>5.1f} | {kbps:>7.0f} | {client_text}")
+    logging.info("Statistik pipeline:\n" + "\n".join(lines))
+
+def main():
+    """
+    Supervisor pipeline RTSP pengganti stream.sh:
+      encoder (rpicam-vid, H.264) -> relay Python -> ffmpeg utama (copy) -> MediaMTX /stream1
+                                                 \\-> ffmpeg sub (scale + encode) -> MediaMTX /stream1_sub
+    Setiap proses dijalankan ulang jika berhenti atau macet.
+    """
+    global SYNTHETIC
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if "--synthetic" in sys.argv[1:]:
+        SYNTHETIC = True
+    required = [MEDIAMTX_PATH, "ffmpeg"] + ([] if SYNTHETIC else ["rpicam-vid"])
+    missing = [name for name in required if shutil.which(name) is None]
+    if missing:
+        logging.error(f"Program tidak ditemukan: {', '.join(missing)}")
+        return
+
+    config_dir = tempfile.TemporaryDirectory()
+    server = ManagedProcess("server", [MEDIAMTX_PATH, write_mediamtx_config(config_dir.name)])
+    main_stream = ManagedProcess("utama", publisher_command(MAIN_PATH, transcode=False), feed=True)
+    sub_stream = ManagedProcess("sub", publisher_command(SUB_PATH, transcode=True), feed=True)
+    main_stream.reader = ffmpeg_progress_reader(main_stream)
+    sub_stream.reader = ffmpeg_progress_reader(sub_stream)
+    consumers = (main_stream, sub_stream)
+
+    def relay(process):
+        """Satu capture, dua konsumen: frame H.264 dari encoder diteruskan ke kedua publisher."""
+        splitter = AccessUnitSplitter()
+        while True:
+            chunk = process.stdout.read1(RELAY_CHUNK)
+            if not chunk:
+                break
+            units = splitter.feed(chunk)
+            source.stats.add(len(chunk), len(units))
+            for unit, keyframe in units:
+                for consumer in consumers:
+                    consumer.feed(unit, keyframe)
+
+    source = ManagedProcess("encoder", source_command(), reader=relay)
+    stages = [(server, None), (source, None), (main_stream, MAIN_PATH), (sub_stream, SUB_PATH)]
+
+    logging.info("Memulai pipeline RTSP" + (" (sumber sintetis)" if SYNTHETIC else ""))
+    logging.info(f"Stream utama: rtsp://<IP_RASPBERRY_PI>:{RTSP_PORT}/{MAIN_PATH}")
+    logging.info(f"Sub-stream:   rtsp://<IP_RASPBERRY_PI>:{RTSP_PORT}/{SUB_PATH}")
+    server.start()
+    time.sleep(1) # Beri waktu server membuka port sebelum publisher terhubung
+    for consumer in consumers:
+        consumer.start()
+    source.start()
+
+    last_bytes = {}
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            # Watchdog: tahap yang hidup tetapi tidak ada aktivitas dianggap macet
+            now = time.monotonic()
+            for stage in (source, main_stream, sub_stream):
+                if stage.is_running() and now - stage.stats.last_activity > STALL_TIMEOUT:
+                    logging.warning(f"[{stage.name}] tidak ada aktivitas {STALL_TIMEOUT:.0f} s, dimatikan")
+                    stage.kill()
+            report(stages, fetch_paths(), last_bytes)
+    except KeyboardInterrupt:
+        logging.info("Dihentikan oleh pengguna.")
+    finally:
+        for stage in (source, main_stream, sub_stream, server):
+            stage.stop()
+        config_dir.cleanup()
+        for consumer in consumers:
+            if consumer.dropped_frames:
+                logging.info(f"[{consumer.name}] frame dibuang (konsumen lambat): {consumer.dropped_frames}")
+        logging.info("Pipeline ditutup.")
+
+if __name__ == '__main__':
+    main()
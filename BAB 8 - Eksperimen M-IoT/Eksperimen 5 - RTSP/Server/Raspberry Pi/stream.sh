@@ -2,11 +2,13 @@
 
 # Skrip untuk memulai streaming video dari kamera Pi ke RTSP
 # Pengguna: Jalankan skrip ini dari terminal dengan ./stream.sh
+# Pipeline (encoder, server RTSP MediaMTX, stream utama dan sub-stream) kini
+# dikelola main.py: setiap proses dijalankan ulang otomatis jika berhenti.
+# Tambahkan --synthetic untuk menguji di Linux tanpa kamera Pi.
 
 echo "Memulai streaming video RTSP..."
 echo "Akses stream di: rtsp://<IP_RASPBERRY_PI>:8554/stream1"
+echo "Sub-stream bitrate rendah: rtsp://<IP_RASPBERRY_PI>:8554/stream1_sub"
 echo "Tekan Ctrl+C untuk menghentikan."
 
-rpicam-vid -t 0 -n --width 1920 --height 1080 --framerate 30 --bitrate 4000000 \
---codec libav --libav-format mpegts -o - \
-| cvlc stream:///dev/stdin --sout '#rtp{sdp=rtsp://:8554/stream1}'
\ No newline at end of file
+exec python3 "$(dirname "$0")/main.py" "$@"